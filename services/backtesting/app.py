@@ -1,15 +1,27 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 import pandas as pd
 import numpy as np
 import influxdb_client
 from influxdb_client.client.write_api import SYNCHRONOUS
-import uuid
 import json
 import os
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import logging
 from typing import List, Dict, Any, Optional
+from pydantic import BaseModel
+from ledger import trade_ledger, downsample_equity, format_times
+from price_cache import PriceCache, parse_flux_time
+from jobs import JobCancelled, JobQueue
+from engine import STRATEGY_PARAMETERS, StreamingBacktest, returns_sharpe_ratio, rolling_mean, rolling_std, rsi
+from sweep import RANKING_METRICS, SharedSeries, expand_grid, run_sweep
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import threading
+import asyncio
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -34,6 +46,72 @@ influx_client = influxdb_client.InfluxDBClient(
 )
 query_api = influx_client.query_api()
 
+# Local per-symbol, per-day copy of the price history, so repeated backtests
+# only query InfluxDB for days not seen yet; 0 MB disables it
+PRICE_CACHE_DIR = os.getenv("PRICE_CACHE_DIR", "cache/prices")
+PRICE_CACHE_MB = int(os.getenv("PRICE_CACHE_MB", 2048))
+
+# Points returned for the equity curve (drawdown peak and trough are added)
+EQUITY_CURVE_POINTS = int(os.getenv("EQUITY_CURVE_POINTS", 100))
+
+# Rows per chunk for the streaming engine, which holds a few chunks at a time
+# instead of the whole history; results are identical to the in-memory engine
+BACKTEST_ENGINES = ("memory", "streaming")
+BACKTEST_CHUNK_ROWS = int(os.getenv("BACKTEST_CHUNK_ROWS", 100000))
+
+# Parameter sweeps: the price series is shared with the workers through shared
+# memory; each worker caches indicator columns (up to SWEEP_CACHE_MB) so
+# combinations sharing a window compute it once
+MAX_SWEEP_COMBINATIONS = int(os.getenv("MAX_SWEEP_COMBINATIONS", 5000))
+SWEEP_CHUNK_SIZE = int(os.getenv("SWEEP_CHUNK_SIZE", 8))
+SWEEP_CACHE_MB = int(os.getenv("SWEEP_CACHE_MB", 256))
+
+def new_sweep_pool() -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        int(os.getenv("SWEEP_WORKERS", 0)) or None,
+        mp_context=multiprocessing.get_context("spawn")
+    )
+
+sweep_pool = new_sweep_pool()
+# Guards replacing a pool that a dead worker broke, so only one replacement is made
+pool_lock = threading.Lock()
+
+def replace_sweep_pool(broken: ProcessPoolExecutor):
+    global sweep_pool
+    with pool_lock:
+        if sweep_pool is broken:
+            logger.error("A sweep process died; starting a new pool")
+            broken.shutdown(wait=False, cancel_futures=True)
+            sweep_pool = new_sweep_pool()
+
+# Backtests run as jobs from a durable SQLite queue on a pool of worker
+# processes, highest priority first; identical requests share one job
+BACKTEST_QUEUE_DB = os.getenv("BACKTEST_QUEUE_DB", "results/queue.db")
+BACKTEST_WORKERS = int(os.getenv("BACKTEST_WORKERS", 0)) or os.cpu_count() or 1
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", 1.0))
+# A job is failed once its worker process died this many times
+MAX_JOB_CRASHES = int(os.getenv("MAX_JOB_CRASHES", 3))
+job_queue = JobQueue(BACKTEST_QUEUE_DB)
+
+def new_backtest_pool() -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        BACKTEST_WORKERS,
+        mp_context=multiprocessing.get_context("spawn")
+    )
+
+backtest_pool = new_backtest_pool()
+
+def replace_backtest_pool(broken: ProcessPoolExecutor):
+    global backtest_pool
+    with pool_lock:
+        if backtest_pool is broken:
+            logger.error("A backtest process died; starting a new pool")
+            broken.shutdown(wait=False, cancel_futures=True)
+            backtest_pool = new_backtest_pool()
+
+job_wakeup: Optional[asyncio.Event] = None
+dispatcher: Optional[asyncio.Task] = None
+
 class TradingStrategy:
     def __init__(self, params):
         self.params = params
@@ -57,8 +135,9 @@ class TradingStrategy:
         long_window = self.params.get('long_window', 50)
         
         # Calculate moving averages
-        df['short_ma'] = df['close'].rolling(window=short_window).mean()
-        df['long_ma'] = df['close'].rolling(window=long_window).mean()
+        close = df['close'].to_numpy(dtype=np.float64)
+        df['short_ma'] = rolling_mean(close, int(short_window))
+        df['long_ma'] = rolling_mean(close, int(long_window))
         
         # Generate signals
         df['signal'] = 0
@@ -76,8 +155,9 @@ class TradingStrategy:
         num_std = self.params.get('num_std', 2)
         
         # Calculate rolling mean and standard deviation
-        df['rolling_mean'] = df['close'].rolling(window=window).mean()
-        df['rolling_std'] = df['close'].rolling(window=window).std()
+        close = df['close'].to_numpy(dtype=np.float64)
+        df['rolling_mean'] = rolling_mean(close, int(window))
+        df['rolling_std'] = rolling_std(close, int(window))
         
         # Calculate Bollinger Bands
         df['upper_band'] = df['rolling_mean'] + (df['rolling_std'] * num_std)
@@ -100,12 +180,7 @@ class TradingStrategy:
         overbought = self.params.get('overbought', 70)
         
         # Calculate RSI
-        delta = df['close'].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=window).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=window).mean()
-        
-        rs = gain / loss
-        df['rsi'] = 100 - (100 / (1 + rs))
+        df['rsi'] = rsi(df['close'].to_numpy(dtype=np.float64), int(window))
         
         # Generate signals
         df['signal'] = 0
@@ -123,11 +198,25 @@ class BacktestRequest(BaseModel):
     start_date: str
     end_date: str
     initial_capital: float = 10000.0
+    engine: str = "memory"  # or "streaming", for histories too long to hold in memory
+    priority: int = 0  # higher runs first
+
+class SweepRequest(BaseModel):
+    strategy_type: str = "sma_crossover"
+    parameters: Dict[str, List[float]]  # parameter -> values to try
+    symbol: str
+    start_date: str
+    end_date: str
+    metric: str = "sharpe_ratio"  # ranking, higher is better
+    top: int = 10
+    prune_fraction: float = 0.0  # score on this leading share of the bars first; 0 disables
+    prune_keep: float = 0.5  # share of combinations run in full after pruning
 
 class BacktestStatus(BaseModel):
     backtest_id: str
     status: str
     error: Optional[str] = None
+    progress: Optional[float] = None
     metrics: Optional[Dict[str, float]] = None
     trades: Optional[List[Dict[str, Any]]] = None
     equity_curve: Optional[List[Dict[str, Any]]] = None
@@ -137,37 +226,116 @@ async def root():
     return {"message": "Backtesting Service is running"}
 
 @app.post("/api/v1/backtest/run", response_model=BacktestStatus)
-async def run_backtest(
-    background_tasks: BackgroundTasks,
-    request: BacktestRequest
-):
-    """Run a backtest with the specified strategy configuration"""
-    # Generate a unique backtest ID
-    backtest_id = str(uuid.uuid4())
+async def run_backtest(request: BacktestRequest):
+    """Queue a backtest with the specified strategy configuration"""
+    if request.engine not in BACKTEST_ENGINES:
+        raise HTTPException(status_code=400, detail=f"engine must be one of {', '.join(BACKTEST_ENGINES)}")
     
-    # Start backtest in background
-    background_tasks.add_task(
-        perform_backtest,
-        backtest_id,
-        request.strategy_config,
-        request.symbol,
-        request.start_date,
-        request.end_date,
-        request.initial_capital
-    )
+    try:
+        # An identical queued or running backtest is joined instead of repeated
+        backtest_id, status = job_queue.submit(
+            request.dict(exclude={"priority"}),
+            priority=request.priority,
+            reusable=fixed_period(request.start_date, request.end_date)
+        )
+    except Exception as e:
+        logger.error(f"Error queueing backtest: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
     
-    return BacktestStatus(backtest_id=backtest_id, status="running")
+    if job_wakeup is not None:
+        job_wakeup.set()
+    return BacktestStatus(backtest_id=backtest_id, status=status)
 
 @app.get("/api/v1/backtest/status/{backtest_id}", response_model=BacktestStatus)
 async def get_backtest_status(backtest_id: str):
-    """Get the status of a running or completed backtest"""
+    """Get the status of a queued, running or completed backtest"""
+    # The queue decides: a job cancelled while its worker was saving may still leave a results file
+    job = job_queue.get(backtest_id)
+    if job is not None and job["status"] not in ("completed", "error"):
+        return BacktestStatus(backtest_id=backtest_id, status=job["status"], error=job["error"], progress=job["progress"])
+    
     # Check if results are available
     try:
         with open(f"results/{backtest_id}.json", "r") as f:
             results = json.load(f)
             return BacktestStatus(**results)
     except FileNotFoundError:
-        return BacktestStatus(backtest_id=backtest_id, status="running")
+        pass
+    
+    if job is None:
+        raise HTTPException(status_code=404, detail="Backtest not found")
+    return BacktestStatus(backtest_id=backtest_id, status=job["status"], error=job["error"], progress=job["progress"])
+
+@app.post("/api/v1/backtest/cancel/{backtest_id}", response_model=BacktestStatus)
+async def cancel_backtest(backtest_id: str):
+    """Cancel a queued backtest, or stop a running one at its next progress report"""
+    status = job_queue.cancel(backtest_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Backtest not found")
+    return BacktestStatus(backtest_id=backtest_id, status=status)
+
+@app.get("/api/v1/backtest/queue")
+async def get_queue_stats():
+    """Backtest jobs by status, and the worker count"""
+    return {"workers": BACKTEST_WORKERS, "jobs": job_queue.stats()}
+
+@app.post("/api/v1/backtest/sweep")
+async def sweep_parameters(request: SweepRequest):
+    """Backtest every combination of a parameter grid, streaming ranked results as NDJSON"""
+    if request.strategy_type not in STRATEGY_PARAMETERS or request.metric not in RANKING_METRICS:
+        raise HTTPException(status_code=400, detail="Unknown strategy type or ranking metric")
+    if not 0 <= request.prune_fraction < 1 or not 0 < request.prune_keep <= 1:
+        raise HTTPException(status_code=400, detail="prune_fraction must be in [0, 1) and prune_keep in (0, 1]")
+    try:
+        combos = expand_grid(request.strategy_type, request.parameters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(combos) > MAX_SWEEP_COMBINATIONS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_SWEEP_COMBINATIONS} combinations per sweep")
+    
+    try:
+        # One fetch for the whole grid
+        df = await asyncio.get_running_loop().run_in_executor(
+            None, fetch_prices, request.symbol, request.start_date, request.end_date
+        )
+    except Exception as e:
+        logger.error(f"Error fetching prices for sweep: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if len(df) < 3:
+        raise HTTPException(status_code=404, detail="No data found for the specified period")
+    
+    series = SharedSeries(df['close'].to_numpy(dtype=np.float64))
+    
+    async def events():
+        pool = sweep_pool
+        try:
+            async for event in run_sweep(
+                pool, series, combos,
+                metric=request.metric, top=request.top,
+                prune_fraction=request.prune_fraction, prune_keep=request.prune_keep,
+                chunk_size=SWEEP_CHUNK_SIZE, cache_bytes=SWEEP_CACHE_MB * 2 ** 20
+            ):
+                yield json.dumps(event) + "\n"
+        except BrokenProcessPool as e:
+            # This sweep is lost, later ones get a fresh pool
+            replace_sweep_pool(pool)
+            logger.error(f"Parameter sweep for {request.symbol} lost a worker: {e}")
+            yield json.dumps({"event": "error", "error": "a sweep worker died"}) + "\n"
+        except Exception as e:
+            logger.error(f"Error in parameter sweep for {request.symbol}: {e}")
+            yield json.dumps({"event": "error", "error": str(e)}) + "\n"
+        finally:
+            series.close()
+    
+    # Also runs when the client disconnects before the body is iterated
+    return StreamingResponse(events(), media_type="application/x-ndjson", background=BackgroundTask(series.close))
+
+@app.get("/api/v1/backtest/cache")
+async def get_cache_stats():
+    """Size and hit counters of the local price cache"""
+    if price_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **price_cache.stats()}
 
 @app.get("/api/v1/backtest/strategies")
 async def get_available_strategies():
@@ -205,44 +373,173 @@ async def get_available_strategies():
         ]
     }
 
+def query_prices(symbol: str, start_date: str, end_date: str) -> pd.DataFrame:
+    """Price history from InfluxDB as a time-sorted frame with ``time`` and ``close``"""
+    query = f'''
+    from(bucket: "market_data")
+        |> range(start: {start_date}, stop: {end_date})
+        |> filter(fn: (r) => r["_measurement"] == "price" and r["symbol"] == "{symbol}")
+        |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
+    '''
+    
+    result = query_api.query_data_frame(query)
+    if result.empty:
+        return result
+    
+    # Convert to dataframe
+    df = pd.DataFrame(result)
+    df = df.sort_values('_time')
+    return df.rename(columns={'_time': 'time', 'price': 'close'})
+
+def query_price_range(symbol: str, start: datetime, stop: datetime) -> pd.DataFrame:
+    return query_prices(symbol, start.isoformat().replace("+00:00", "Z"), stop.isoformat().replace("+00:00", "Z"))
+
+price_cache = PriceCache(
+    PRICE_CACHE_DIR, query_price_range, max_bytes=PRICE_CACHE_MB * 2 ** 20
+) if PRICE_CACHE_MB > 0 else None
+
+def fetch_prices(symbol: str, start_date: str, end_date: str) -> pd.DataFrame:
+    """Price history for a backtest, from the local cache where possible"""
+    start, stop = parse_flux_time(start_date), parse_flux_time(end_date)
+    if price_cache is None or start is None or stop is None or not symbol.isalnum():
+        return query_prices(symbol, start_date, end_date)
+    return price_cache.load(symbol, start, stop)
+
+def price_chunks(symbol: str, start_date: str, end_date: str, rows: int):
+    """fetch_prices in frames of at most ``rows``, as a function replaying the same frames"""
+    start, stop = parse_flux_time(start_date), parse_flux_time(end_date)
+    if price_cache is None or start is None or stop is None or not symbol.isalnum():
+        # Without the cache the history is queried once and held in memory
+        df = query_prices(symbol, start_date, end_date)
+        return lambda: (df.iloc[i:i + rows] for i in range(0, len(df), rows))
+    return price_cache.scan(symbol, start, stop, rows)
+
+def fixed_period(start_date: str, end_date: str) -> bool:
+    """Whether both bounds are absolute and past, so an earlier result still holds"""
+    now = datetime.now(timezone.utc)
+    for value in (start_date, end_date):
+        value = value.strip()
+        parsed = parse_flux_time(value, now)
+        if parsed is None or value == "now()" or value.startswith("-") or parsed > now:
+            return False
+    return True
+
+def execute_job(backtest_id: str, request: Dict[str, Any]) -> str:
+    """Run a queued backtest; called in a worker process, returns its final status"""
+    queue = JobQueue(BACKTEST_QUEUE_DB)
+    
+    def progress(fraction):
+        if queue.progress(backtest_id, fraction) == "cancelled":
+            raise JobCancelled(backtest_id)
+    
+    try:
+        return perform_backtest(
+            backtest_id,
+            request["strategy_config"],
+            request["symbol"],
+            request["start_date"],
+            request["end_date"],
+            request["initial_capital"],
+            request["engine"],
+            progress
+        )
+    except JobCancelled:
+        logger.info(f"Cancelled backtest {backtest_id}")
+        return "cancelled"
+
+async def run_job(backtest_id: str, request: Dict[str, Any]):
+    pool = backtest_pool
+    try:
+        status = await asyncio.get_running_loop().run_in_executor(pool, execute_job, backtest_id, request)
+        job_queue.finish(backtest_id, status)
+    except asyncio.CancelledError:
+        raise  # shutting down; the job is queued again on the next start
+    except BrokenProcessPool:
+        # A worker died, in this job or one beside it: run it again on a new pool
+        replace_backtest_pool(pool)
+        if job_queue.crashed(backtest_id, MAX_JOB_CRASHES) == "error":
+            logger.error(f"Backtest job {backtest_id} failed: its worker died {MAX_JOB_CRASHES} times")
+        else:
+            logger.warning(f"Requeued backtest job {backtest_id} after its worker died")
+    except Exception as e:
+        # The worker failed before recording a result
+        logger.error(f"Error running backtest job {backtest_id}: {e}")
+        job_queue.finish(backtest_id, "error", str(e) or type(e).__name__)
+
+async def dispatch_jobs():
+    """Keep every worker busy with the highest-priority queued jobs"""
+    running = set()
+    while True:
+        try:
+            while len(running) < BACKTEST_WORKERS:
+                job = job_queue.claim(idle=not running)
+                if job is None:
+                    break
+                task = asyncio.ensure_future(run_job(*job))
+                task.add_done_callback(lambda _: job_wakeup.set())
+                running.add(task)
+        except Exception as e:
+            logger.error(f"Error claiming backtest jobs: {e}")
+        
+        # Woken by a submission or a finished job; polling also picks up
+        # jobs queued by another process
+        try:
+            await asyncio.wait_for(job_wakeup.wait(), JOB_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        job_wakeup.clear()
+        running = {task for task in running if not task.done()}
+
 def perform_backtest(
     backtest_id: str,
     strategy_config: Dict[str, Any],
     symbol: str,
     start_date: str,
     end_date: str,
-    initial_capital: float
-):
-    """Perform the backtest in the background"""
+    initial_capital: float,
+    engine: str = "memory",
+    progress=None
+) -> str:
+    """Perform the backtest and save its result; returns the saved status.
+
+    ``progress`` is called with the completed fraction (None when unknown)
+    and may raise JobCancelled to stop the backtest.
+    """
+    report = progress or (lambda fraction: None)
     try:
-        logger.info(f"Starting backtest {backtest_id} for {symbol}")
+        logger.info(f"Starting backtest {backtest_id} for {symbol} ({engine} engine)")
         
-        # Fetch historical data from InfluxDB
-        query = f'''
-        from(bucket: "market_data")
-            |> range(start: {start_date}, stop: {end_date})
-            |> filter(fn: (r) => r["_measurement"] == "price" and r["symbol"] == "{symbol}")
-            |> pivot(rowKey:["_time"], columnKey: ["_field"], valueColumn: "_value")
-        '''
+        if engine == "streaming":
+            backtest = StreamingBacktest(strategy_config, initial_capital, EQUITY_CURVE_POINTS)
+            results = backtest.run(price_chunks(symbol, start_date, end_date, BACKTEST_CHUNK_ROWS), report)
+            if results is None:
+                save_result(backtest_id, {
+                    "backtest_id": backtest_id,
+                    "status": "error",
+                    "error": "No data found for the specified period"
+                })
+                return "error"
+            # Last chance for a cancel to stop a completed result from being saved
+            report(None)
+            save_result(backtest_id, {"backtest_id": backtest_id, "status": "completed", **results})
+            logger.info(f"Completed backtest {backtest_id} for {symbol}")
+            return "completed"
         
-        result = query_api.query_data_frame(query)
+        df = fetch_prices(symbol, start_date, end_date)
+        report(0.4)
         
-        if result.empty:
+        if df.empty:
             save_result(backtest_id, {
                 "backtest_id": backtest_id,
                 "status": "error",
                 "error": "No data found for the specified period"
             })
-            return
-        
-        # Convert to dataframe
-        df = pd.DataFrame(result)
-        df = df.sort_values('_time')
-        df = df.rename(columns={'_time': 'time', 'price': 'close'})
+            return "error"
         
         # Apply strategy
         strategy = TradingStrategy(strategy_config)
         df = strategy.generate_signals(df)
+        report(0.6)
         
         # Calculate returns
         df['returns'] = df['close'].pct_change()
@@ -256,9 +553,11 @@ def perform_backtest(
         # Performance metrics
         total_return = df['portfolio_value'].iloc[-1] / initial_capital - 1
         annual_return = (1 + total_return) ** (252 / len(df)) - 1
-        sharpe_ratio = np.sqrt(252) * df['strategy_returns'].mean() / df['strategy_returns'].std()
+        sharpe_ratio = returns_sharpe_ratio(df['strategy_returns'].to_numpy(dtype=np.float64))
         max_drawdown = (df['portfolio_value'] / df['portfolio_value'].cummax() - 1).min()
         
+        report(0.8)
+        
         # Count trades
         buy_signals = df[df['position'] == 1]
         sell_signals = df[df['position'] == -1]
@@ -279,9 +578,13 @@ def perform_backtest(
             "equity_curve": get_equity_curve(df)
         }
         
+        report(None)
         save_result(backtest_id, results)
         logger.info(f"Completed backtest {backtest_id} for {symbol}")
+        return "completed"
         
+    except JobCancelled:
+        raise
     except Exception as e:
         logger.error(f"Error in backtest {backtest_id}: {e}")
         save_result(backtest_id, {
@@ -289,43 +592,27 @@ def perform_backtest(
             "status": "error",
             "error": str(e)
         })
+        return "error"
 
 def get_trades(df):
     """Extract buy and sell signals from the dataframe"""
-    trades = []
-    position = 0
+    ledger = trade_ledger(df['position'].to_numpy())
+    times = format_times(df['time'], ledger['index'])
+    prices = df['close'].to_numpy()[ledger['index']].tolist()
     
-    for i, row in df.iterrows():
-        if row['position'] == 1:  # Buy signal
-            trades.append({
-                "type": "buy",
-                "time": row['time'].isoformat() if isinstance(row['time'], datetime) else row['time'],
-                "price": float(row['close']),
-            })
-            position = 1
-        elif row['position'] == -1 and position == 1:  # Sell signal
-            trades.append({
-                "type": "sell",
-                "time": row['time'].isoformat() if isinstance(row['time'], datetime) else row['time'],
-                "price": float(row['close']),
-            })
-            position = 0
-            
-    return trades
+    return [
+        {"type": "buy" if buy else "sell", "time": time, "price": float(price)}
+        for buy, time, price in zip(ledger['buy'].tolist(), times, prices)
+    ]
 
 def get_equity_curve(df):
     """Sample the equity curve (reduce data points for frontend)"""
-    # Sample the equity curve (reduce data points for frontend)
-    sample_size = min(100, len(df))
-    indices = np.linspace(0, len(df) - 1, sample_size, dtype=int)
-    sampled = df.iloc[indices]
+    values = df['portfolio_value'].to_numpy(dtype=np.float64)
+    indices = downsample_equity(values, EQUITY_CURVE_POINTS)
     
     return [
-        {
-            "time": row['time'].isoformat() if isinstance(row['time'], datetime) else row['time'],
-            "value": float(row['portfolio_value'])
-        }
-        for _, row in sampled.iterrows()
+        {"time": time, "value": float(value)}
+        for time, value in zip(format_times(df['time'], indices), values[indices].tolist())
     ]
 
 def save_result(backtest_id, result):
@@ -334,6 +621,22 @@ def save_result(backtest_id, result):
     with open(f"results/{backtest_id}.json", "w") as f:
         json.dump(result, f)
 
+@app.on_event("startup")
+async def startup_event():
+    global job_wakeup, dispatcher
+    requeued = job_queue.requeue_interrupted()
+    if requeued:
+        logger.info(f"Requeued {requeued} backtests interrupted by the last shutdown")
+    job_wakeup = asyncio.Event()
+    dispatcher = asyncio.ensure_future(dispatch_jobs())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if dispatcher is not None:
+        dispatcher.cancel()
+    backtest_pool.shutdown(wait=False, cancel_futures=True)
+    sweep_pool.shutdown(wait=False, cancel_futures=True)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
@@ -0,0 +1,113 @@
+"""Trade extraction and equity sampling: row loops vs the vectorized ledger.
+
+Builds a minute-bar random walk with a long/flat SMA crossover, then times the former
+``iterrows`` implementations against ``ledger`` and checks the trades match:
+
+    python bench_ledger.py --bars 1000000 --points 100
+"""
+import argparse
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from ledger import downsample_equity, format_times, trade_ledger
+
+
+def make_frame(bars: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, bars)))
+    df = pd.DataFrame({
+        "time": pd.date_range("2020-01-01", periods=bars, freq="min", tz="UTC"),
+        "close": close,
+    })
+    short_ma = df["close"].rolling(10).mean()
+    long_ma = df["close"].rolling(50).mean()
+    # Long/flat, so crossovers give the +1/-1 entries and exits the ledger acts on
+    df["signal"] = (short_ma > long_ma).astype(int)
+    df["position"] = df["signal"].diff()
+    returns = df["close"].pct_change()
+    df["portfolio_value"] = 10000 * (1 + df["position"].shift(1) * returns).cumprod()
+    return df
+
+
+def loop_trades(df):
+    trades = []
+    position = 0
+    for _, row in df.iterrows():
+        if row["position"] == 1:
+            trades.append({
+                "type": "buy",
+                "time": row["time"].isoformat() if isinstance(row["time"], datetime) else row["time"],
+                "price": float(row["close"]),
+            })
+            position = 1
+        elif row["position"] == -1 and position == 1:
+            trades.append({
+                "type": "sell",
+                "time": row["time"].isoformat() if isinstance(row["time"], datetime) else row["time"],
+                "price": float(row["close"]),
+            })
+            position = 0
+    return trades
+
+
+def loop_equity(df):
+    indices = np.linspace(0, len(df) - 1, min(100, len(df)), dtype=int)
+    return [
+        {"time": row["time"].isoformat() if isinstance(row["time"], datetime) else row["time"],
+         "value": float(row["portfolio_value"])}
+        for _, row in df.iloc[indices].iterrows()
+    ]
+
+
+def vector_trades(df):
+    ledger = trade_ledger(df["position"].to_numpy())
+    times = format_times(df["time"], ledger["index"])
+    prices = df["close"].to_numpy()[ledger["index"]].tolist()
+    return [
+        {"type": "buy" if buy else "sell", "time": t, "price": float(p)}
+        for buy, t, p in zip(ledger["buy"].tolist(), times, prices)
+    ]
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def main(args):
+    df = make_frame(args.bars)
+    values = df["portfolio_value"].to_numpy(dtype=np.float64)
+    print(f"{args.bars} bars")
+
+    vectorized, vector_s = timed(vector_trades, df)
+    print(f"{'trades (vectorized)':<24}{vector_s * 1000:>10.1f} ms  {len(vectorized)} trades")
+    if not args.skip_loop:
+        looped, loop_s = timed(loop_trades, df)
+        print(f"{'trades (iterrows)':<24}{loop_s * 1000:>10.1f} ms  x{loop_s / vector_s:.0f}")
+        assert looped == vectorized, "trade ledgers differ"
+
+    indices, sample_s = timed(downsample_equity, values, args.points)
+    print(f"{'equity (MinMax-LTTB)':<24}{sample_s * 1000:>10.1f} ms  {len(indices)} points")
+    _, loop_s = timed(loop_equity, df)
+    print(f"{'equity (linspace)':<24}{loop_s * 1000:>10.1f} ms")
+
+    # How much of the true drawdown each sampling keeps
+    def max_drawdown(v):
+        return float((v / np.maximum.accumulate(v) - 1).min())
+
+    finite = values[np.isfinite(values)]
+    even = finite[np.linspace(0, len(finite) - 1, args.points, dtype=int)]
+    print(f"max drawdown: full {max_drawdown(finite):.4f}, "
+          f"MinMax-LTTB {max_drawdown(values[indices]):.4f}, linspace {max_drawdown(even):.4f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bars", type=int, default=1_000_000)
+    parser.add_argument("--points", type=int, default=100)
+    parser.add_argument("--skip-loop", action="store_true", help="only time the vectorized ledger")
+    main(parser.parse_args())
@@ -0,0 +1,349 @@
+import math
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from ledger import EquitySampler, format_times, trade_ledger
+
+# Tunable parameters of each strategy with TradingStrategy's defaults, in the
+# order sweep combinations are sorted (and chunked) so neighbours share indicators
+STRATEGY_PARAMETERS: Dict[str, Dict[str, float]] = {
+    "sma_crossover": {"short_window": 10, "long_window": 50},
+    "bollinger_bands": {"window": 20, "num_std": 2},
+    "rsi": {"window": 14, "oversold": 30, "overbought": 70},
+}
+WINDOW_PARAMETERS = {"short_window", "long_window", "window"}
+
+
+# Indicator kernels. Each value depends only on the values in its own window,
+# always added in the same order, so computing a series in one piece or in
+# chunks (with the previous window carried over) gives bit-identical results.
+# Rolling pandas sums carry compensation state along the whole series instead.
+#
+# To stay O(n), the series is cut into blocks of ``window`` rows aligned to
+# absolute row numbers (``start`` is the row number of ``values[0]``). A window
+# is then either one whole block or the tail of one block plus the head of the
+# next, and each part is a running sum within its block, in a fixed order.
+
+def _blocks(values: np.ndarray, window: int, start: int) -> np.ndarray:
+    """``values`` as rows of whole blocks; the padding at either end is never read"""
+    phase = start % window
+    padded = np.zeros(-(-(phase + len(values)) // window) * window)
+    padded[phase:phase + len(values)] = values
+    return padded.reshape(-1, window)
+
+
+def _window_sums(tails: np.ndarray, heads: np.ndarray, window: int, start: int, n: int) -> np.ndarray:
+    """Sum of each trailing window of a blocked series, NaN until the window is full.
+
+    A window's part in its earlier block is summed from ``tails``, starting at
+    the block's end; its part in its later block from ``heads``, starting at
+    the block's beginning.
+    """
+    out = np.full(n, np.nan)
+    if n < window:
+        return out
+    phase = start % window
+    tail = np.cumsum(tails[:, ::-1], axis=1)[:, ::-1].ravel()
+    head = np.cumsum(heads, axis=1).ravel()
+    # Padded positions of every window's last and first row
+    ends = np.arange(phase + window - 1, phase + n)
+    firsts = ends - window + 1
+    split = firsts % window != 0
+    total = head[ends]
+    total[split] += tail[firsts[split]]
+    out[window - 1:] = total
+    return out
+
+
+def rolling_sum(values: np.ndarray, window: int, start: int = 0) -> np.ndarray:
+    """Sum of each trailing ``window``, NaN until the window is full"""
+    values = np.asarray(values, dtype=np.float64)
+    blocks = _blocks(values, window, start)
+    return _window_sums(blocks, blocks, window, start, len(values))
+
+
+def rolling_mean(values: np.ndarray, window: int, start: int = 0) -> np.ndarray:
+    return rolling_sum(values, window, start) / window
+
+
+def rolling_std(values: np.ndarray, window: int, start: int = 0) -> np.ndarray:
+    """Sample standard deviation of each trailing ``window``, like ``rolling().std()``.
+
+    Sums and sums of squares are taken about the first value of the window's
+    later block, which lies inside the window, so flat windows give exactly 0
+    and the cancellation is no worse than the window's own range.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if n < window or window < 2:
+        return np.full(n, np.nan)
+    blocks = _blocks(values, window, start)
+    # Head parts are taken about their own block's first value, tail parts about the next block's
+    head_offset = blocks[:, 0].copy()
+    if start % window:
+        head_offset[0] = np.nan  # a first partial block is never a head part
+    tail_offset = np.append(head_offset[1:], np.nan)
+    tails, heads = blocks - tail_offset[:, None], blocks - head_offset[:, None]
+    total = _window_sums(tails, heads, window, start, n)
+    squares = _window_sums(tails * tails, heads * heads, window, start, n)
+    with np.errstate(invalid="ignore"):
+        return np.sqrt(np.maximum(squares - total * total / window, 0.0) / (window - 1))
+
+
+def rsi(close: np.ndarray, window: int, start: int = 0) -> np.ndarray:
+    """RSI over simple averages of gains and losses, as TradingStrategy defines it"""
+    delta = np.empty(len(close))
+    delta[:1] = np.nan
+    delta[1:] = np.diff(close)
+    gain = rolling_mean(np.where(delta > 0, delta, 0.0), window, start)
+    loss = rolling_mean(np.where(delta < 0, -delta, 0.0), window, start)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return 100 - (100 / (1 + gain / loss))
+
+
+def indicator(close: np.ndarray, kind: str, window: int, start: int = 0) -> np.ndarray:
+    if kind == "mean":
+        return rolling_mean(close, window, start)
+    if kind == "std":
+        return rolling_std(close, window, start)
+    return rsi(close, window, start)
+
+
+def strategy_params(config: Dict[str, Any]) -> Dict[str, Any]:
+    """A strategy config with its defaults filled in; unknown types fall back to SMA crossover"""
+    strategy_type = config.get("strategy_type", "sma_crossover")
+    if strategy_type not in STRATEGY_PARAMETERS:
+        strategy_type = "sma_crossover"
+    return {**STRATEGY_PARAMETERS[strategy_type], **config, "strategy_type": strategy_type}
+
+
+def strategy_signal(params: Dict[str, Any], close: np.ndarray, indicator: Callable[[str, int], np.ndarray]) -> np.ndarray:
+    """The strategy's -1/0/1 signal, as TradingStrategy computes it"""
+    strategy_type = params["strategy_type"]
+    signal = np.zeros(len(close))
+    with np.errstate(invalid="ignore"):
+        if strategy_type == "sma_crossover":
+            short_ma = indicator("mean", int(params["short_window"]))
+            long_ma = indicator("mean", int(params["long_window"]))
+            signal[short_ma > long_ma] = 1
+            signal[short_ma < long_ma] = -1
+        elif strategy_type == "bollinger_bands":
+            window = int(params["window"])
+            rolling_mean, rolling_std = indicator("mean", window), indicator("std", window)
+            signal[close < rolling_mean - rolling_std * params["num_std"]] = 1
+            signal[close > rolling_mean + rolling_std * params["num_std"]] = -1
+        else:
+            values = indicator("rsi", int(params["window"]))
+            signal[values < params["oversold"]] = 1
+            signal[values > params["overbought"]] = -1
+    return signal
+
+
+class ExactSum:
+    """Running sum of floats with no rounding error until it is read.
+
+    The exact total is kept as a few non-overlapping partials (each is the
+    correctly rounded remainder of the ones before), so the result equals
+    ``math.fsum`` over all values however they were split into chunks.
+    """
+
+    __slots__ = ("_parts", "_special")
+
+    def __init__(self, values: Optional[np.ndarray] = None):
+        self._parts: List[float] = []
+        self._special = 0.0  # infinities and NaN, which fsum cannot carry
+        if values is not None:
+            self.add(values)
+
+    def add(self, values: np.ndarray):
+        values = np.asarray(values, dtype=np.float64)
+        finite = np.isfinite(values)
+        if not finite.all():
+            self._special += float(values[~finite].sum())
+            values = values[finite]
+        terms = values.tolist() + self._parts
+        parts: List[float] = []
+        while True:
+            rest = math.fsum(terms + [-part for part in parts])
+            if rest == 0.0:
+                break
+            parts.append(rest)
+        self._parts = parts
+
+    @property
+    def value(self) -> float:
+        return math.fsum(self._parts) + self._special
+
+
+def sharpe_ratio(total: float, squared_deviations: float, count: int) -> float:
+    """Annualized Sharpe ratio from exactly summed returns and squared deviations"""
+    mean = np.float64(total / count) if count else np.float64(np.nan)
+    std = np.float64(math.sqrt(squared_deviations / (count - 1))) if count > 1 else np.float64(np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return float(np.sqrt(252) * mean / std)
+
+
+def returns_sharpe_ratio(strategy_returns: np.ndarray) -> float:
+    """Sharpe ratio of a whole return series (NaN skipped), summed exactly"""
+    realized = strategy_returns[~np.isnan(strategy_returns)]
+    total = ExactSum(realized).value
+    mean = total / len(realized) if len(realized) else math.nan
+    return sharpe_ratio(total, ExactSum((realized - mean) ** 2).value, len(realized))
+
+
+class _Carry:
+    """What one chunk leaves for the next: trailing closes and the last values of
+    every column that looks one row back or accumulates"""
+
+    def __init__(self):
+        self.rows = 0  # rows before this chunk; indicator blocks are aligned to it
+        self.tail = np.empty(0)
+        self.signal: Optional[float] = None
+        self.position = np.nan
+        self.close = np.nan  # last close, forward-filled like pct_change
+        self.growth = 1.0
+        self.peak = -np.inf
+
+
+class StreamingBacktest:
+    """perform_backtest over a series delivered in chunks, in bounded memory.
+
+    Indicators are computed per chunk over the chunk plus the longest window
+    of the previous closes; signal differences, returns, the cumulative
+    product and the running maximum continue from the previous chunk's last
+    values. Two passes are made: the first yields the trades, the row count and
+    the mean return, the second the squared deviations for the Sharpe ratio and
+    the equity curve sample, whose slices need the final row count. Memory is
+    a few chunks plus the trades and the sample, whatever the history length,
+    and every result is identical to the in-memory mode.
+    """
+
+    def __init__(self, strategy_config: Dict[str, Any], initial_capital: float, equity_points: int = 100):
+        self.params = strategy_params(strategy_config)
+        self.initial_capital = initial_capital
+        self.equity_points = equity_points
+        self.lookback = max(int(self.params[name]) for name in WINDOW_PARAMETERS if name in self.params) + 1
+
+    def _step(self, close: np.ndarray, carry: _Carry):
+        """Position, strategy returns and portfolio value of one chunk"""
+        extended = np.concatenate([carry.tail, close])
+        offset = len(carry.tail)
+        start = carry.rows - offset
+        carry.tail = extended[-self.lookback:]
+        carry.rows += len(close)
+        signal = strategy_signal(
+            self.params, close, lambda kind, window: indicator(extended, kind, window, start)[offset:]
+        )
+
+        position = np.empty(len(close))
+        position[0] = signal[0] - carry.signal if carry.signal is not None else np.nan
+        position[1:] = np.diff(signal)
+        carry.signal = float(signal[-1])
+
+        filled = pd.Series(np.concatenate([[carry.close], close])).ffill().to_numpy()
+        carry.close = filled[-1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            returns = filled[1:] / filled[:-1] - 1
+
+        previous = np.concatenate([[carry.position], position[:-1]])
+        carry.position = position[-1]
+        strategy_returns = previous * returns
+
+        missing = np.isnan(strategy_returns)
+        growth = np.cumprod(np.concatenate([[carry.growth], np.where(missing, 1.0, 1 + strategy_returns)]))[1:]
+        carry.growth = growth[-1]
+        growth[missing] = np.nan
+        return position, strategy_returns, self.initial_capital * growth
+
+    def run(self, chunks: Callable[[], Iterable[pd.DataFrame]],
+            progress: Optional[Callable[[Optional[float]], None]] = None) -> Optional[Dict[str, Any]]:
+        """Metrics, trades and equity curve; ``chunks`` is called once per pass and must
+        yield the same ``time``/``close`` frames each time. None when there is no data.
+
+        ``progress`` is called after every chunk with the completed fraction,
+        None during the first pass, when the length is not known yet.
+        """
+        report = progress or (lambda fraction: None)
+        carry = _Carry()
+        rows = 0
+        finite_values = 0
+        trades: List[Dict[str, Any]] = []
+        long = False
+        buys = sells = 0
+        returns_total = ExactSum()
+        returns_count = 0
+        last_value = np.nan
+        max_drawdown = np.nan
+
+        for chunk in chunks():
+            if chunk.empty:
+                continue
+            position, strategy_returns, portfolio_value = self._step(chunk["close"].to_numpy(dtype=np.float64), carry)
+            rows += len(chunk)
+            buys += int(np.count_nonzero(position == 1))
+            sells += int(np.count_nonzero(position == -1))
+
+            ledger = trade_ledger(position, long)
+            if len(ledger):
+                long = bool(ledger["buy"][-1])
+                times = format_times(chunk["time"], ledger["index"])
+                prices = chunk["close"].to_numpy()[ledger["index"]].tolist()
+                trades.extend(
+                    {"type": "buy" if buy else "sell", "time": time, "price": float(price)}
+                    for buy, time, price in zip(ledger["buy"].tolist(), times, prices)
+                )
+
+            realized = strategy_returns[~np.isnan(strategy_returns)]
+            returns_total.add(realized)
+            returns_count += len(realized)
+
+            missing = np.isnan(portfolio_value)
+            peaks = np.maximum.accumulate(np.concatenate([[carry.peak], np.where(missing, -np.inf, portfolio_value)]))[1:]
+            carry.peak = peaks[-1]
+            if not missing.all():
+                drawdown = np.nanmin(portfolio_value[~missing] / peaks[~missing] - 1)
+                max_drawdown = drawdown if np.isnan(max_drawdown) else min(max_drawdown, drawdown)
+            finite_values += int(np.count_nonzero(np.isfinite(portfolio_value)))
+            last_value = portfolio_value[-1]
+            report(None)
+
+        if rows == 0:
+            return None
+
+        # Second pass: deviations from the now known mean, and the equity sample
+        total = returns_total.value
+        mean = total / returns_count if returns_count else math.nan
+        squared_deviations = ExactSum()
+        sampler = EquitySampler(finite_values, self.equity_points)
+        carry = _Carry()
+        done = 0
+        report(0.5)
+        for chunk in chunks():
+            if chunk.empty:
+                continue
+            _, strategy_returns, portfolio_value = self._step(chunk["close"].to_numpy(dtype=np.float64), carry)
+            realized = strategy_returns[~np.isnan(strategy_returns)]
+            squared_deviations.add((realized - mean) ** 2)
+            finite = np.isfinite(portfolio_value)
+            sampler.add(portfolio_value[finite], chunk["time"].array[finite])
+            done += len(chunk)
+            report(0.5 + 0.5 * done / rows)
+
+        total_return = last_value / self.initial_capital - 1
+        labels, values = sampler.result()
+        return {
+            "metrics": {
+                "total_return": total_return,
+                "annual_return": (1 + total_return) ** (252 / rows) - 1,
+                "sharpe_ratio": sharpe_ratio(total, squared_deviations.value, returns_count),
+                "max_drawdown": max_drawdown,
+                "total_trades": buys + sells,
+            },
+            "trades": trades,
+            "equity_curve": [
+                {"time": time, "value": float(value)}
+                for time, value in zip(format_times(pd.Series(labels), np.arange(len(labels))), values.tolist())
+            ],
+        }
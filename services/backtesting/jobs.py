@@ -0,0 +1,203 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+
+class JobCancelled(Exception):
+    """Raised in a worker, from its progress callback, once its job was cancelled"""
+
+
+def request_key(request: Dict[str, Any]) -> str:
+    """Identity of a backtest request, the same for identical requests"""
+    return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class JobQueue:
+    """Durable backtest queue in a local SQLite database.
+
+    Jobs go ``queued`` -> ``running`` -> ``completed``/``error``, or to
+    ``cancelled`` from either of the first two. The API process claims jobs
+    (highest priority first, then oldest) and workers in other processes
+    record progress in the same file, which is why every call opens its own
+    short-lived connection; WAL mode keeps readers off the writers' backs.
+    Jobs left ``running`` by a process that died are queued again by
+    ``requeue_interrupted`` on startup, and a job whose worker process died
+    is queued again by ``crashed`` until it has crashed too many of them.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+        # Workers open the queue too; the transaction keeps the migration single
+        with self._transaction() as db:
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    request_key TEXT NOT NULL,
+                    request TEXT NOT NULL,
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL,
+                    reusable INTEGER NOT NULL DEFAULT 0,
+                    progress REAL,
+                    error TEXT,
+                    created REAL NOT NULL,
+                    started REAL,
+                    finished REAL,
+                    crashes INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            columns = {row["name"] for row in db.execute("PRAGMA table_info(jobs)")}
+            if "crashes" not in columns:
+                db.execute("ALTER TABLE jobs ADD COLUMN crashes INTEGER NOT NULL DEFAULT 0")
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority DESC, created)")
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_request ON jobs (request_key)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        # IMMEDIATE takes the write lock up front, so check-then-write is atomic
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+    def submit(self, request: Dict[str, Any], priority: int = 0, reusable: bool = False) -> Tuple[str, str]:
+        """Queue a job, or return the id and status of an identical one.
+
+        An identical request that is queued or running is joined (its priority
+        raised to the higher of the two); a completed one is returned as is
+        when ``reusable``, i.e. when its result cannot have changed since.
+        """
+        key = request_key(request)
+        with self._transaction() as db:
+            row = db.execute(
+                "SELECT id, status, priority FROM jobs WHERE request_key = ? "
+                "AND (status IN ('queued', 'running') OR (status = 'completed' AND reusable = 1 AND ? = 1)) "
+                "ORDER BY created DESC LIMIT 1",
+                (key, int(reusable)),
+            ).fetchone()
+            if row is not None:
+                if priority > row["priority"]:
+                    db.execute("UPDATE jobs SET priority = ? WHERE id = ?", (priority, row["id"]))
+                return row["id"], row["status"]
+            job_id = str(uuid.uuid4())
+            db.execute(
+                "INSERT INTO jobs (id, request_key, request, priority, status, reusable, created) "
+                "VALUES (?, ?, ?, ?, 'queued', ?, ?)",
+                (job_id, key, json.dumps(request), priority, int(reusable), time.time()),
+            )
+            return job_id, "queued"
+
+    def claim(self, idle: bool = True) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Mark the next queued job running and return its id and request.
+
+        A job that crashed a worker before runs alone, so a repeated crash is
+        known to be its own: it is only claimed when ``idle``, i.e. with no
+        other job running, nothing is claimed past it until then, and nothing
+        else while it runs.
+        """
+        with self._transaction() as db:
+            if db.execute("SELECT 1 FROM jobs WHERE status = 'running' AND crashes > 0 LIMIT 1").fetchone():
+                return None
+            row = db.execute(
+                "SELECT id, request, crashes FROM jobs WHERE status = 'queued' ORDER BY priority DESC, created LIMIT 1"
+            ).fetchone()
+            if row is None or (row["crashes"] and not idle):
+                return None
+            db.execute(
+                "UPDATE jobs SET status = 'running', started = ?, progress = 0 WHERE id = ?",
+                (time.time(), row["id"]),
+            )
+            return row["id"], json.loads(row["request"])
+
+    def progress(self, job_id: str, fraction: Optional[float]) -> Optional[str]:
+        """Record progress (None: still alive, fraction unknown) and return the job's status"""
+        with self._connect() as db:
+            if fraction is not None:
+                db.execute(
+                    "UPDATE jobs SET progress = ? WHERE id = ? AND status = 'running'",
+                    (min(max(fraction, 0.0), 1.0), job_id),
+                )
+            row = db.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row["status"] if row else None
+
+    def finish(self, job_id: str, status: str, error: Optional[str] = None):
+        """Record the outcome of a running job; a job cancelled meanwhile stays cancelled"""
+        with self._connect() as db:
+            db.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished = ?, "
+                "progress = CASE WHEN ? = 'completed' THEN 1 ELSE progress END "
+                "WHERE id = ? AND status = 'running'",
+                (status, error, time.time(), status, job_id),
+            )
+
+    def crashed(self, job_id: str, max_crashes: int) -> Optional[str]:
+        """Queue a running job again after its worker died, or fail it once that
+        happened ``max_crashes`` times; returns its status afterwards"""
+        with self._transaction() as db:
+            row = db.execute("SELECT crashes FROM jobs WHERE id = ? AND status = 'running'", (job_id,)).fetchone()
+            if row is not None:
+                crashes = row["crashes"] + 1
+                if crashes >= max_crashes:
+                    db.execute(
+                        "UPDATE jobs SET status = 'error', error = ?, finished = ?, crashes = ? WHERE id = ?",
+                        (f"worker process died {crashes} times", time.time(), crashes, job_id),
+                    )
+                else:
+                    db.execute(
+                        "UPDATE jobs SET status = 'queued', started = NULL, progress = NULL, crashes = ? WHERE id = ?",
+                        (crashes, job_id),
+                    )
+            row = db.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row["status"] if row else None
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        """Cancel a queued or running job; returns its status afterwards, None if unknown"""
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status IN ('queued', 'running')",
+                (time.time(), job_id),
+            )
+            row = db.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row["status"] if row else None
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT id, status, priority, progress, error, created, started, finished FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def requeue_interrupted(self) -> int:
+        """Queue again the jobs a previous process left running"""
+        with self._connect() as db:
+            return db.execute(
+                "UPDATE jobs SET status = 'queued', started = NULL, progress = NULL WHERE status = 'running'"
+            ).rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        with self._connect() as db:
+            counts = dict(db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {status: counts.get(status, 0) for status in ("queued", "running", "completed", "error", "cancelled")}
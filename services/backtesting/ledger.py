@@ -0,0 +1,171 @@
+from typing import Any, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+def format_times(times: pd.Series, indices: np.ndarray) -> List[Any]:
+    """ISO 8601 strings for the selected rows of a datetime column, raw values otherwise"""
+    selected = times.iloc[indices]
+    if pd.api.types.is_datetime64_any_dtype(selected):
+        return [t.isoformat() for t in selected]
+    return selected.tolist()
+
+
+def trade_ledger(position: np.ndarray, long: bool = False) -> np.ndarray:
+    """Row indices of executed trades, with a ``True`` flag for buys.
+
+    Same rules as stepping through the rows: every ``position == 1`` row buys,
+    a ``position == -1`` row sells only while long, i.e. when the last signal
+    row before it was a buy. Since every signal row sets that state, it is the
+    buy flags of the signal rows shifted by one, with no Python loop; ``long``
+    is the state before the first row, for a series processed in chunks.
+    """
+    position = np.asarray(position)
+    buys = position == 1
+    signals = np.flatnonzero(buys | (position == -1))
+    if not len(signals):
+        return np.empty(0, dtype=[("index", np.int64), ("buy", bool)])
+
+    is_buy = buys[signals]
+    # Long before a signal row iff the previous signal row was a buy
+    long_before = np.concatenate([[long], is_buy[:-1]])
+    keep = is_buy | long_before
+
+    ledger = np.empty(int(keep.sum()), dtype=[("index", np.int64), ("buy", bool)])
+    ledger["index"] = signals[keep]
+    ledger["buy"] = is_buy[keep]
+    return ledger
+
+
+def _lttb(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets over (x, y); returns positions into x"""
+    n = len(x)
+    if points >= n or points < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    selected = np.empty(points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for b in range(points - 2):
+        start, end = edges[b], edges[b + 1]
+        # Average of the next bucket (the last point for the final bucket)
+        next_end = edges[b + 2] if b + 2 < len(edges) else n
+        cx, cy = x[end:next_end].mean(), y[end:next_end].mean()
+        area = np.abs((x[a] - cx) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (cy - y[a]))
+        a = start + int(area.argmax())
+        selected[b + 1] = a
+    return selected
+
+
+class EquitySampler:
+    """MinMax-LTTB over finite equity values fed in order, in chunks of any size.
+
+    ``count``, the number of values that will be fed, fixes the slices up
+    front; each slice keeps its running minimum and maximum (first occurrence
+    on ties) and the drawdown peak and trough are tracked as the values pass,
+    so memory stays proportional to ``points`` and the result is the same
+    however the values were chunked. ``labels`` travel with the values and
+    are what ``result`` returns for the chosen points.
+    """
+
+    def __init__(self, count: int, points: int = 100, preselect: int = 4):
+        self.count = count
+        self.points = points
+        self.buckets = min(points * preselect, count)
+        self.size = -(-count // self.buckets) if self.buckets else 1
+        self._seen = 0
+        self._all: List[Tuple[Any, float]] = []  # every value, when there are no more than points
+        self._low = np.full(self.buckets, np.inf)
+        self._high = np.full(self.buckets, -np.inf)
+        self._low_at = np.full(self.buckets, -1, dtype=np.int64)
+        self._high_at = np.full(self.buckets, -1, dtype=np.int64)
+        self._low_label = np.empty(self.buckets, dtype=object)
+        self._high_label = np.empty(self.buckets, dtype=object)
+        self._first: Tuple[Any, float] = (None, np.nan)
+        self._last: Tuple[Any, float] = (None, np.nan)
+        # Running maximum, and the deepest drawdown so far with the peak before it
+        self._peak: Tuple[int, Any, float] = (-1, None, -np.inf)
+        self._drawdown = np.inf
+        self._trough: Tuple[int, Any, float] = (-1, None, np.nan)
+        self._trough_peak: Tuple[int, Any, float] = (-1, None, np.nan)
+
+    def add(self, values: np.ndarray, labels):
+        values = np.asarray(values, dtype=np.float64)
+        n = len(values)
+        if not n:
+            return
+        index = self._seen + np.arange(n)
+        self._seen += n
+        if self.count <= self.points:
+            self._all.extend(zip(labels[np.arange(n)], values.tolist()))
+            return
+        if index[0] == 0:
+            self._first = (labels[0], values[0])
+        self._last = (labels[n - 1], values[-1])
+
+        bucket = index // self.size
+        starts = np.flatnonzero(np.concatenate([[True], bucket[1:] != bucket[:-1]]))
+        ids = bucket[starts]
+        lengths = np.diff(np.append(starts, n))
+        for extreme, better, kept, at, kept_labels in (
+            (np.minimum, np.less, self._low, self._low_at, self._low_label),
+            (np.maximum, np.greater, self._high, self._high_at, self._high_label),
+        ):
+            best = extreme.reduceat(values, starts)
+            first = np.minimum.reduceat(np.where(values == np.repeat(best, lengths), np.arange(n), n), starts)
+            # Strictly better only: an earlier chunk's equal value came first
+            update = better(best, kept[ids])
+            kept[ids[update]] = best[update]
+            at[ids[update]] = index[first[update]]
+            kept_labels[ids[update]] = list(labels[first[update]])
+
+        peaks = np.maximum.accumulate(np.concatenate([[self._peak[2]], values]))[1:]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            drawdown = np.where(peaks > 0, values / peaks - 1, 0.0)
+        trough = int(drawdown.argmin())
+        if drawdown[trough] < self._drawdown:
+            self._drawdown = drawdown[trough]
+            self._trough = (int(index[trough]), labels[trough], values[trough])
+            if peaks[trough] > self._peak[2]:
+                peak = int(np.flatnonzero(values[:trough + 1] == peaks[trough])[0])
+                self._trough_peak = (int(index[peak]), labels[peak], values[peak])
+            else:
+                self._trough_peak = self._peak
+        if peaks[-1] > self._peak[2]:
+            peak = int(np.flatnonzero(values == peaks[-1])[0])
+            self._peak = (int(index[peak]), labels[peak], values[peak])
+
+    def result(self) -> Tuple[List[Any], np.ndarray]:
+        """Labels and values of the chosen points, in order"""
+        if self.count <= self.points:
+            return [label for label, _ in self._all], np.array([value for _, value in self._all])
+        kept = {0: self._first, self.count - 1: self._last}
+        for at, values, labels in ((self._low_at, self._low, self._low_label),
+                                   (self._high_at, self._high, self._high_label)):
+            for i in np.flatnonzero(at >= 0):
+                kept[int(at[i])] = (labels[i], values[i])
+        candidates = np.array(sorted(kept))
+        y = np.array([kept[i][1] for i in candidates])
+        chosen = candidates[_lttb(candidates.astype(np.float64), y, self.points)]
+
+        for i, label, value in (self._trough_peak, self._trough):
+            kept[i] = (label, value)
+        selected = np.union1d(chosen, [self._trough_peak[0], self._trough[0]])
+        return [kept[i][0] for i in selected], np.array([kept[i][1] for i in selected])
+
+
+def downsample_equity(values: np.ndarray, points: int = 100, preselect: int = 4) -> np.ndarray:
+    """Indices of about ``points`` rows that keep the shape of an equity curve.
+
+    MinMax-LTTB: the minimum and maximum of ``points * preselect`` slices are
+    picked in one vectorized pass, LTTB then chooses among those few candidates,
+    and the peak and trough of the maximum drawdown are always kept so the
+    sampled curve shows the true drawdown. Rows that are NaN are never picked.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    finite = np.flatnonzero(np.isfinite(values))
+    sampler = EquitySampler(len(finite), points, preselect)
+    sampler.add(values[finite], finite)
+    labels, _ = sampler.result()
+    return np.asarray(labels, dtype=np.int64)
@@ -0,0 +1,299 @@
+import fcntl
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+
+logger = logging.getLogger(__name__)
+
+_DURATION = re.compile(r"^-(\d+)(ms|s|m|h|d|w)$")
+_UNITS = {"ms": "milliseconds", "s": "seconds", "m": "minutes", "h": "hours", "d": "days", "w": "weeks"}
+# Eviction goes this far below the bound, so the directory is not rescanned on every write
+_EVICT_TO = 0.9
+# Temporary files older than this were left by a crash, not by a write in progress
+_STALE_TMP_SECONDS = 3600
+
+
+def parse_flux_time(value: str, now: Optional[datetime] = None) -> Optional[datetime]:
+    """A Flux ``range`` bound as an aware UTC datetime: RFC 3339, ``now()`` or a
+    negative duration like ``-30d``. None for anything else (e.g. ``-1mo``)."""
+    now = now or datetime.now(timezone.utc)
+    value = value.strip()
+    if value == "now()":
+        return now
+    match = _DURATION.match(value)
+    if match:
+        return now - timedelta(**{_UNITS[match.group(2)]: int(match.group(1))})
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed.astimezone(timezone.utc) if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def _empty() -> pd.DataFrame:
+    return pd.DataFrame({"time": pd.Series(dtype="datetime64[ns, UTC]"), "close": pd.Series(dtype="float64")})
+
+
+def _day_start(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+
+def _between(df: pd.DataFrame, start: datetime, stop: datetime) -> pd.DataFrame:
+    times = df["time"]
+    return df[(times >= start) & (times < stop)].reset_index(drop=True)
+
+
+class PriceCache:
+    """Local cache of price history, one Arrow IPC file per symbol and UTC day.
+
+    Only complete days (ended more than ``settle`` seconds ago) are cached; a
+    load reads the cached days, fetches the missing ones in as few contiguous
+    ranges as possible and the still-open tail live. Partitions are
+    memory-mapped, so reading them is zero-copy until the frame is built.
+    Arrow IPC rather than Parquet for that reason: Parquet pages must be
+    decoded. The least recently used partitions (by file mtime, which reads
+    refresh) are deleted once the cache grows past ``max_bytes``.
+
+    Several processes may share the directory (the API and its workers each
+    build their own cache). The total size lives in a small file next to the
+    partitions, updated under an exclusive lock on the directory with every
+    write; when it passes ``max_bytes`` the directory itself is scanned, under
+    the same lock, and evicted down to 90% of the bound.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        fetch: Callable[[str, datetime, datetime], pd.DataFrame],
+        max_bytes: int = 2 * 2 ** 30,
+        settle: float = 300.0,
+    ):
+        self.directory = directory
+        self.fetch = fetch
+        self.max_bytes = max_bytes
+        self.settle = settle
+        self._usage_path = os.path.join(directory, ".usage")
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+        self.evicted = 0
+        os.makedirs(directory, exist_ok=True)
+        with self._locked():
+            self._reconcile(self.max_bytes)
+
+    @contextmanager
+    def _locked(self):
+        """Exclusive lock on the cache directory, across threads and processes"""
+        with open(os.path.join(self.directory, ".lock"), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _usage(self) -> Tuple[int, int]:
+        """Bytes and partitions in the cache, as last recorded"""
+        try:
+            with open(self._usage_path) as f:
+                size, count = f.read().split()
+            return int(size), int(count)
+        except (FileNotFoundError, ValueError):
+            return 0, 0
+
+    def _set_usage(self, size: int, count: int):
+        tmp = f"{self._usage_path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(f"{size} {count}")
+        os.replace(tmp, self._usage_path)
+
+    def _reconcile(self, limit: int):
+        """Rescan the directory, evict the least recently used partitions down to
+        ``limit`` bytes and record the exact usage; call with the lock held"""
+        partitions = []
+        now = time.time()
+        for symbol in os.listdir(self.directory):
+            folder = os.path.join(self.directory, symbol)
+            if not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                path = os.path.join(folder, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if name.endswith(".tmp"):
+                    if now - stat.st_mtime > _STALE_TMP_SECONDS:
+                        os.remove(path)
+                elif name.endswith(".arrow"):
+                    partitions.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in partitions)
+        count = len(partitions)
+        if total > limit:
+            for _, size, path in sorted(partitions):
+                if total <= limit:
+                    break
+                try:
+                    # Readers holding a mapping keep their pages until they are done
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                total -= size
+                count -= 1
+                self.evicted += 1
+        self._set_usage(total, count)
+
+    def _path(self, symbol: str, day: date) -> str:
+        return os.path.join(self.directory, symbol, f"{day.isoformat()}.arrow")
+
+    def _read(self, path: str) -> Optional[pa.Table]:
+        try:
+            table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+        except (FileNotFoundError, pa.ArrowInvalid):
+            # Evicted in the meantime, or left torn by a crash; fetched and written again
+            return None
+        now = time.time()
+        try:
+            # Recency is the file's mtime, so it is shared by every process and survives restarts
+            os.utime(path, (now, now))
+        except FileNotFoundError:
+            pass
+        return table
+
+    def _write(self, path: str, frame: pd.DataFrame):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        table = pa.Table.from_pandas(frame[["time", "close"]], preserve_index=False)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        with self._locked():
+            try:
+                old, replaced = os.path.getsize(path), 1
+            except FileNotFoundError:
+                old, replaced = 0, 0
+            os.replace(tmp, path)
+            size, count = self._usage()
+            size += os.path.getsize(path) - old
+            count += 1 - replaced
+            if size > self.max_bytes:
+                self._reconcile(int(self.max_bytes * _EVICT_TO))
+            else:
+                self._set_usage(size, count)
+
+    def _fetch(self, symbol: str, start: datetime, stop: datetime) -> pd.DataFrame:
+        self.fetches += 1
+        frame = self.fetch(symbol, start, stop)
+        if frame.empty:
+            return _empty()
+        return frame[["time", "close"]]
+
+    def _plan(self, start: datetime, stop: datetime) -> Tuple[List[date], Optional[datetime]]:
+        """The complete days covering ``[start, stop)``, and where the live part begins"""
+        first = start.date()
+        last = (stop - timedelta(microseconds=1)).date()
+        complete_before = datetime.now(timezone.utc) - timedelta(seconds=self.settle)
+        days: List[date] = []
+        for i in range((last - first).days + 1):
+            day = first + timedelta(days=i)
+            if _day_start(day) + timedelta(days=1) > complete_before:
+                # The first day still open, and everything after it, is read live
+                return days, max(start, _day_start(day))
+            days.append(day)
+        return days, None
+
+    def _store(self, symbol: str, run: List[date]) -> Dict[date, pa.Table]:
+        """Fetch a run of consecutive days in one query and cache each of them"""
+        frame = self._fetch(symbol, _day_start(run[0]), _day_start(run[-1]) + timedelta(days=1))
+        by_day = dict(tuple(frame.groupby(frame["time"].dt.date, sort=False)))
+        tables = {}
+        for day in run:
+            # Days without data are cached as empty partitions too
+            part = by_day.get(day, _empty())
+            self._write(self._path(symbol, day), part)
+            tables[day] = pa.Table.from_pandas(part[["time", "close"]], preserve_index=False)
+        return tables
+
+    def load(self, symbol: str, start: datetime, stop: datetime) -> pd.DataFrame:
+        """Prices of ``symbol`` in ``[start, stop)``, sorted by time"""
+        if stop <= start:
+            return _empty()
+        days, live_from = self._plan(start, stop)
+        tables: Dict[date, pa.Table] = {}
+        missing: List[date] = []
+        for day in days:
+            table = self._read(self._path(symbol, day))
+            if table is None:
+                missing.append(day)
+            else:
+                tables[day] = table
+        self.hits += len(tables)
+        self.misses += len(missing)
+
+        # One query per run of consecutive missing days
+        runs: List[List[date]] = []
+        for day in missing:
+            if runs and (day - runs[-1][-1]).days == 1:
+                runs[-1].append(day)
+            else:
+                runs.append([day])
+        for run in runs:
+            tables.update(self._store(symbol, run))
+
+        parts = [tables[day] for day in sorted(tables)]
+        frames = [pa.concat_tables(parts).to_pandas(split_blocks=True)] if parts else []
+        if live_from is not None:
+            frames.append(self._fetch(symbol, live_from, stop))
+        if not frames:
+            return _empty()
+        df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+        return _between(df, start, stop)
+
+    def scan(self, symbol: str, start: datetime, stop: datetime,
+             rows: int = 100_000) -> Callable[[], Iterator[pd.DataFrame]]:
+        """``load`` in frames of at most ``rows``, as a function that replays them.
+
+        Each call reads the days one at a time (fetching and caching a missing
+        day on its own), so memory is bounded by a day's partition however
+        long the range. The live tail is fetched once, here, so every pass
+        sees the same rows.
+        """
+        days, live_from = self._plan(start, stop) if stop > start else ([], None)
+        live = self._fetch(symbol, live_from, stop) if live_from is not None else _empty()
+
+        def frames() -> Iterator[pd.DataFrame]:
+            for day in days:
+                table = self._read(self._path(symbol, day))
+                if table is None:
+                    self.misses += 1
+                    table = self._store(symbol, [day])[day]
+                else:
+                    self.hits += 1
+                for batch in table.to_batches(max_chunksize=rows):
+                    yield _between(batch.to_pandas(), start, stop)
+            for i in range(0, len(live), rows):
+                yield _between(live.iloc[i:i + rows], start, stop)
+
+        return frames
+
+    def stats(self) -> Dict[str, Any]:
+        """Size of the shared cache; hits, misses, queries and evictions of this process"""
+        lookups = self.hits + self.misses
+        size, count = self._usage()
+        return {
+            "partitions": count,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "day_hits": self.hits,
+            "day_misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else None,
+            "influx_queries": self.fetches,
+            "evicted": self.evicted,
+        }
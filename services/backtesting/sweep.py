@@ -0,0 +1,253 @@
+import asyncio
+import bisect
+import itertools
+import math
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor
+from multiprocessing import shared_memory
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from engine import STRATEGY_PARAMETERS, WINDOW_PARAMETERS, indicator, returns_sharpe_ratio, strategy_signal
+
+RANKING_METRICS = ("total_return", "annual_return", "sharpe_ratio", "max_drawdown")
+
+
+def expand_grid(strategy_type: str, grid: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """Every combination of the grid, defaults filling the parameters not swept"""
+    defaults = STRATEGY_PARAMETERS[strategy_type]
+    unknown = set(grid) - set(defaults)
+    if unknown:
+        raise ValueError(f"unknown parameters for {strategy_type}: {sorted(unknown)}")
+    names = list(defaults)
+    values = [sorted(set(grid.get(name) or [defaults[name]])) for name in names]
+    for i, (name, options) in enumerate(zip(names, values)):
+        if name in WINDOW_PARAMETERS:
+            if any(int(v) != v or v < 1 for v in options):
+                raise ValueError(f"{name} must be positive integers")
+            values[i] = [int(v) for v in options]
+    return [
+        {"strategy_type": strategy_type, **dict(zip(names, combo))}
+        for combo in itertools.product(*values)
+    ]
+
+
+class SharedSeries:
+    """A float64 price series in shared memory, attached by name in the workers"""
+
+    def __init__(self, values: np.ndarray):
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        self.length = len(values)
+        self._shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        self._name = self._shm.name
+        np.ndarray(values.shape, dtype=np.float64, buffer=self._shm.buf)[:] = values
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def close(self):
+        """Release the segment; safe to call more than once"""
+        if self._shm is None:
+            return
+        shm, self._shm = self._shm, None
+        shm.close()
+        shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Worker side: attached series and their indicator columns, kept across tasks
+# so later chunks of a sweep reuse what earlier ones computed
+_attached: "OrderedDict[str, Tuple[shared_memory.SharedMemory, pd.Series]]" = OrderedDict()
+_indicators: "OrderedDict[Tuple[str, str, int], np.ndarray]" = OrderedDict()
+_indicator_bytes = 0
+
+
+def _series(name: str, length: int) -> pd.Series:
+    entry = _attached.get(name)
+    if entry is None:
+        shm = shared_memory.SharedMemory(name=name)
+        close = pd.Series(np.ndarray((length,), dtype=np.float64, buffer=shm.buf), copy=False)
+        entry = _attached[name] = (shm, close)
+        while len(_attached) > 2:
+            _detach(next(iter(_attached)))
+    _attached.move_to_end(name)
+    return entry[1]
+
+
+def _detach(name: str):
+    global _indicator_bytes
+    for key in [key for key in _indicators if key[0] == name]:
+        _indicator_bytes -= _indicators.pop(key).nbytes
+    shm, close = _attached.pop(name)
+    del close
+    try:
+        shm.close()
+    except BufferError:
+        pass  # still viewed; released with the last view. The creator unlinks it
+
+
+def _indicator(name: str, close: pd.Series, kind: str, window: int, cache_bytes: int) -> np.ndarray:
+    """A rolling column of the series, computed once per worker while it fits the cache"""
+    global _indicator_bytes
+    key = (name, kind, window)
+    values = _indicators.get(key)
+    if values is not None:
+        _indicators.move_to_end(key)
+        return values
+
+    if kind == "returns":
+        values = close.pct_change().to_numpy()
+    else:
+        values = indicator(close.to_numpy(), kind, window)
+
+    _indicators[key] = values
+    _indicator_bytes += values.nbytes
+    while _indicator_bytes > cache_bytes and len(_indicators) > 1:
+        _indicator_bytes -= _indicators.popitem(last=False)[1].nbytes
+    return values
+
+
+def backtest_metrics(signal: np.ndarray, returns: np.ndarray) -> Dict[str, float]:
+    """perform_backtest's metrics for a signal, without building a DataFrame"""
+    n = len(signal)
+    position = np.full(n, np.nan)
+    position[1:] = np.diff(signal)
+    strategy_returns = np.full(n, np.nan)
+    strategy_returns[1:] = position[:-1] * returns[1:]
+
+    valid = ~np.isnan(strategy_returns)
+    growth = np.cumprod(np.where(valid, 1 + strategy_returns, 1.0))
+    total_return = growth[-1] - 1 if n and valid[-1] else math.nan
+    portfolio = growth[valid]
+    sharpe_ratio = returns_sharpe_ratio(strategy_returns)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        max_drawdown = (portfolio / np.maximum.accumulate(portfolio) - 1).min() if len(portfolio) else math.nan
+    return {
+        "total_return": float(total_return),
+        "annual_return": float((1 + total_return) ** (252 / n) - 1) if n else math.nan,
+        "sharpe_ratio": float(sharpe_ratio),
+        "max_drawdown": float(max_drawdown),
+        "total_trades": int(np.count_nonzero(position == 1) + np.count_nonzero(position == -1)),
+    }
+
+
+def evaluate_chunk(name: str, length: int, combos: List[Dict[str, Any]], stop: int,
+                   cache_bytes: int) -> List[Dict[str, float]]:
+    """Metrics of each combination over the first ``stop`` bars; runs in a worker process.
+
+    Rolling indicators only look back, so a leading slice of a full-length
+    column is exactly the indicator of the shorter series and is reused as is.
+    """
+    series = _series(name, length)
+
+    def cached(kind: str, window: int) -> np.ndarray:
+        return _indicator(name, series, kind, window, cache_bytes)[:stop]
+
+    close = series.to_numpy()[:stop]
+    returns = cached("returns", 0)
+    return [backtest_metrics(strategy_signal(params, close, cached), returns) for params in combos]
+
+
+def _chunks(combos: List[Dict[str, Any]], size: int) -> List[List[Dict[str, Any]]]:
+    # Combinations are sorted by their first parameter, so a chunk mostly shares it
+    return [combos[i:i + size] for i in range(0, len(combos), size)]
+
+
+def _score(metrics: Dict[str, float], metric: str) -> float:
+    value = metrics[metric]
+    return value if math.isfinite(value) else -math.inf
+
+
+def _finite(metrics: Dict[str, float]) -> Dict[str, Optional[float]]:
+    return {key: (value if math.isfinite(value) else None) for key, value in metrics.items()}
+
+
+async def _evaluate(executor: Executor, series: SharedSeries, chunks: List[List[Dict[str, Any]]],
+                    stop: int, cache_bytes: int):
+    """Yield ``(chunk, metrics)`` as the workers finish; unfinished chunks are cancelled on exit"""
+    loop = asyncio.get_running_loop()
+    pending = {
+        asyncio.ensure_future(loop.run_in_executor(
+            executor, evaluate_chunk, series.name, series.length, chunk, stop, cache_bytes
+        )): chunk
+        for chunk in chunks
+    }
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+async def run_sweep(
+    executor: Executor,
+    series: SharedSeries,
+    combos: List[Dict[str, Any]],
+    metric: str = "sharpe_ratio",
+    top: int = 10,
+    prune_fraction: float = 0.0,
+    prune_keep: float = 0.5,
+    chunk_size: int = 8,
+    cache_bytes: int = 256 * 2 ** 20,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Evaluate ``combos`` on ``executor``, yielding events as chunks finish.
+
+    With ``prune_fraction`` set, every combination is first scored on that
+    leading fraction of the bars and only the best ``prune_keep`` of them are
+    run on the full series (one round of successive halving). Yields
+    ``pruned`` events for the combinations dropped, a ``result`` event per
+    finished combination with its rank so far by ``metric`` (higher is
+    better), then one ``done`` event with the final ranking.
+    """
+    started = time.perf_counter()
+    total = len(combos)
+
+    if prune_fraction > 0 and total > 1:
+        stop = max(int(series.length * prune_fraction), 3)
+        partial: List[Tuple[float, Dict[str, Any]]] = []
+        async for chunk, results in _evaluate(executor, series, _chunks(combos, chunk_size), stop, cache_bytes):
+            partial.extend((_score(metrics, metric), params) for params, metrics in zip(chunk, results))
+        partial.sort(key=lambda item: item[0], reverse=True)
+        keep = max(math.ceil(total * prune_keep), min(top, total))
+        for score, params in partial[keep:]:
+            yield {"event": "pruned", "params": params, "partial_" + metric: score if math.isfinite(score) else None}
+        # Survivors stay in grid order, so chunks still share indicators
+        survivors = {id(params) for _, params in partial[:keep]}
+        combos = [params for params in combos if id(params) in survivors]
+
+    scores: List[float] = []  # negated, ascending
+    ranked: List[Tuple[float, Dict[str, Any], Dict[str, float]]] = []
+    async for chunk, results in _evaluate(executor, series, _chunks(combos, chunk_size), series.length, cache_bytes):
+        for params, metrics in zip(chunk, results):
+            score = _score(metrics, metric)
+            rank = bisect.bisect_left(scores, -score) + 1
+            bisect.insort(scores, -score)
+            ranked.append((score, params, metrics))
+            yield {
+                "event": "result", "params": params, "metrics": _finite(metrics),
+                "rank": rank, "completed": len(ranked), "total": len(combos),
+            }
+
+    ranked.sort(key=lambda item: item[0], reverse=True)
+    yield {
+        "event": "done",
+        "evaluated": len(ranked),
+        "pruned": total - len(ranked),
+        "seconds": time.perf_counter() - started,
+        "ranking": [
+            {"rank": i + 1, "params": params, "metrics": _finite(metrics)}
+            for i, (_, params, metrics) in enumerate(ranked[:top])
+        ],
+    }
@@ -0,0 +1,85 @@
+"""Backtest jobs through the API, on spawned worker processes.
+
+Run from services/backtesting with ``python -m pytest tests``.
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Spawned workers import this module again and must see the same directories
+BASE = os.environ.get("BACKTEST_TEST_DIR") or tempfile.mkdtemp()
+os.environ.update(
+    BACKTEST_TEST_DIR=BASE,
+    BACKTEST_QUEUE_DB=os.path.join(BASE, "queue.db"),
+    PRICE_CACHE_DIR=os.path.join(BASE, "prices"),
+    BACKTEST_WORKERS="2",
+    MAX_JOB_CRASHES="2",
+    JOB_POLL_SECONDS="0.1",
+)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+START, END = "2024-01-01T00:00:00Z", "2024-01-08T00:00:00Z"
+
+
+def execute_or_crash(backtest_id, request):
+    """app.execute_job, except that the CRASH symbol kills the worker"""
+    if request["symbol"] == "CRASH":
+        os._exit(1)
+    return app.execute_job(backtest_id, request)
+
+
+def backtest(symbol="BTC", long_window=30):
+    return {
+        "strategy_config": {"strategy_type": "sma_crossover", "short_window": 5, "long_window": long_window},
+        "symbol": symbol, "start_date": START, "end_date": END,
+    }
+
+
+def wait_for(client, backtest_id, timeout=120):
+    deadline = time.monotonic() + timeout
+    while True:
+        status = client.get(f"/api/v1/backtest/status/{backtest_id}").json()
+        if status["status"] not in ("queued", "running") or time.monotonic() > deadline:
+            return status
+        time.sleep(0.1)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    n = 7 * 24 * 60
+    prices = pd.DataFrame({
+        "time": pd.date_range(START, periods=n, freq="min"),
+        "close": 100 * np.exp(np.cumsum(np.random.default_rng(0).normal(0, 0.001, n))),
+    })
+    # Cached on disk, where the workers read it
+    monkeypatch.setattr(app.price_cache, "fetch", lambda symbol, start, stop: prices)
+    app.price_cache.load("BTC", app.parse_flux_time(START), app.parse_flux_time(END))
+    monkeypatch.chdir(BASE)
+    monkeypatch.setattr(app, "execute_job", execute_or_crash)
+    with TestClient(app.app) as client:
+        yield client
+
+
+def test_worker_crash_requeues_and_pool_recovers(client):
+    crash = client.post("/api/v1/backtest/run", json=backtest("CRASH")).json()["backtest_id"]
+    beside = client.post("/api/v1/backtest/run", json=backtest()).json()["backtest_id"]
+
+    # Both were running when the worker died; only the job that keeps crashing fails
+    status = wait_for(client, crash)
+    assert status["status"] == "error"
+    assert "died" in status["error"]
+    assert wait_for(client, beside)["status"] == "completed"
+
+    after = client.post("/api/v1/backtest/run", json=backtest(long_window=40)).json()["backtest_id"]
+    status = wait_for(client, after)
+    assert status["status"] == "completed"
+    assert status["metrics"]["total_trades"] > 0
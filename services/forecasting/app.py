@@ -1,23 +1,32 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 import numpy as np
-import pandas as pd
-import joblib
 import os
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from pydantic import BaseModel
 import json
-from kafka import KafkaProducer, KafkaConsumer
+from kafka import KafkaConsumer
 import threading
+import asyncio
 import time
 from datetime import datetime, timedelta
 import logging
 import uuid
-import pickle
-from sklearn.preprocessing import MinMaxScaler
-from sklearn.ensemble import RandomForestRegressor
-from statsmodels.tsa.arima.model import ARIMA
-import tensorflow as tf
+from numpy.lib.stride_tricks import sliding_window_view
+from shared.events import publisher_from_env, decode_event
+from batching import MicroBatcher
+from registry import ModelRegistry
+from artifacts import ArtifactStore, MappedForest, MappedScaler
+from training import TrainingScheduler, TRAINABLE_MODELS, source_from_env
+from forecast_cache import ForecastCache, forecast_key, seed_from_key
+from forecast_store import ForecastStore
+from evaluation import PerformanceTracker, PostgresPerformanceSink
+from arima_forecast import ArimaStates, MIN_OBSERVATIONS, fit_arima_params
+from feature_store import FeatureStore, NoCandles
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -34,69 +43,231 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Kafka setup
-producer = KafkaProducer(
-    bootstrap_servers=os.getenv("KAFKA_SERVERS", "localhost:9092"),
-    value_serializer=lambda v: json.dumps(v).encode('utf-8')
-)
+# Kafka setup (batched, compressed, keyed by symbol)
+publisher = publisher_from_env()
 
-# Create models directory
-os.makedirs("models", exist_ok=True)
+# Versioned model artifacts, shared by every worker through the filesystem
+MODEL_PATH = os.getenv("MODEL_PATH", "models")
+# How often each worker checks for versions published by other workers
+MODEL_RELOAD_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", 30))
 
-# Load or initialize models
-models = {}
-scaler = None
+store = ArtifactStore(MODEL_PATH)
 
-def load_models():
-    global models, scaler
+# Models are loaded on first use (or by the background warm-up), each loader
+# doing its own heavy imports so startup does not pay for TensorFlow & co.
+# Scaler and forest weights are memory-mapped, so all workers on a host share
+# one copy in the page cache. The bootstraps publish a first version when none
+# exists, converting the flat files of earlier releases if present.
+def initial_scaler():
+    if os.path.exists(os.path.join(MODEL_PATH, "feature_scaler.pkl")):
+        import joblib
+        return joblib.load(os.path.join(MODEL_PATH, "feature_scaler.pkl"))
     
-    # Check if models exist, if not create dummy models for demonstration
-    if not os.path.exists("models/feature_scaler.pkl"):
-        # Create a dummy scaler
-        scaler = MinMaxScaler()
-        scaler.fit(np.array([[0], [100]]))  # Dummy fit
-        joblib.dump(scaler, "models/feature_scaler.pkl")
+    # Create a dummy scaler for demonstration
+    from sklearn.preprocessing import MinMaxScaler
+    scaler = MinMaxScaler()
+    scaler.fit(np.array([[0] * 5, [100] * 5]))  # Dummy fit over the 5 OHLCV columns
+    return scaler
+
+def bootstrap_feature_scaler(directory):
+    MappedScaler.from_sklearn(initial_scaler()).save(directory)
+
+def load_feature_scaler(directory):
+    return MappedScaler.load(directory)
+
+def bootstrap_random_forest(directory):
+    if os.path.exists(os.path.join(MODEL_PATH, "random_forest.pkl")):
+        import joblib
+        rf_model = joblib.load(os.path.join(MODEL_PATH, "random_forest.pkl"))
     else:
-        scaler = joblib.load("models/feature_scaler.pkl")
-    
-    # Random Forest model
-    if not os.path.exists("models/random_forest.pkl"):
         # Create a dummy Random Forest model
+        from sklearn.ensemble import RandomForestRegressor
         rf_model = RandomForestRegressor(n_estimators=10)
         X = np.random.rand(100, 5)
         y = np.random.rand(100)
         rf_model.fit(X, y)
-        joblib.dump(rf_model, "models/random_forest.pkl")
-    
-    models["random_forest"] = joblib.load("models/random_forest.pkl")
-    
+    # The forest carries its scaler and takes raw OHLCV features, like the
+    # per-symbol forests published by retraining
+    MappedForest.from_sklearn(rf_model, MappedScaler.from_sklearn(initial_scaler())).save(directory)
+
+def load_random_forest(directory):
+    return MappedForest.load(directory)
+
+def bootstrap_arima(directory):
     # ARIMA model (just parameters for demonstration)
-    models["arima"] = {
-        "order": (1, 1, 1),
-        "seasonal_order": (1, 1, 1, 12) if os.path.exists("models/arima_params.json") else None
+    with open(os.path.join(directory, "params.json"), "w") as f:
+        json.dump({"order": [1, 1, 1], "seasonal_order": None}, f)
+
+def load_arima(directory):
+    with open(os.path.join(directory, "params.json")) as f:
+        params = json.load(f)
+    return {
+        "order": tuple(params["order"]),
+        "seasonal_order": tuple(params["seasonal_order"]) if params.get("seasonal_order") else None,
+        # Fitted by retraining; without them the model is fit per forecast
+        "params": params.get("params")
     }
+
+def bootstrap_lstm(directory):
+    import tensorflow as tf
     
-    # LSTM model (create a simple model for demonstration)
-    if not os.path.exists("models/lstm_model"):
-        # Create a simple LSTM model
+    if os.path.exists(os.path.join(MODEL_PATH, "lstm_model")):
+        model = tf.keras.models.load_model(os.path.join(MODEL_PATH, "lstm_model"))
+    else:
+        # Create a simple LSTM model for demonstration
         model = tf.keras.Sequential([
-            tf.keras.layers.LSTM(50, return_sequences=True, input_shape=(10, 1)),
+            tf.keras.layers.LSTM(50, return_sequences=True, input_shape=(10, 5)),
             tf.keras.layers.LSTM(50),
             tf.keras.layers.Dense(1)
         ])
         model.compile(optimizer='adam', loss='mse')
-        model.save("models/lstm_model")
-    
-    models["lstm"] = tf.keras.models.load_model("models/lstm_model")
-    
-    logger.info("Models loaded successfully")
+    model.save(os.path.join(directory, "model"))
+
+def load_lstm(directory):
+    import tensorflow as tf
+    return tf.keras.models.load_model(os.path.join(directory, "model"))
+
+MODEL_LOADERS = {
+    "random_forest": (load_random_forest, bootstrap_random_forest),
+    "arima": (load_arima, bootstrap_arima),
+    "lstm": (load_lstm, bootstrap_lstm)
+}
+
+# Only the models this worker serves are registered (all by default)
+ENABLED_MODELS = [
+    name.strip() for name in os.getenv("ENABLED_MODELS", ",".join(MODEL_LOADERS)).split(",")
+    if name.strip() in MODEL_LOADERS
+]
+# Models loaded in the background at startup; readiness waits for these
+WARM_MODELS = [
+    name.strip() for name in os.getenv("WARM_MODELS", ",".join(ENABLED_MODELS)).split(",")
+    if name.strip() in ENABLED_MODELS
+]
+
+registry = ModelRegistry(store)
+registry.register("feature_scaler", load_feature_scaler, bootstrap_feature_scaler)
+for name in ENABLED_MODELS:
+    registry.register(name, *MODEL_LOADERS[name])
+
+# Concurrent predict requests are stacked into one model call per batch, run on
+# a dedicated thread per model so inference never blocks the event loop
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", 64))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", 5))
+
+# One batcher per forest (shared or per-symbol), all on the same inference thread
+rf_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="random_forest-inference")
+rf_batchers: Dict[str, MicroBatcher] = {}
+
+def rf_batcher(name: str) -> MicroBatcher:
+    batcher = rf_batchers.get(name)
+    if batcher is None:
+        batcher = rf_batchers[name] = MicroBatcher(
+            name,
+            lambda x: registry.get(name).predict(x),
+            max_batch_size=BATCH_MAX_SIZE,
+            max_wait_ms=BATCH_MAX_WAIT_MS,
+            executor=rf_executor
+        )
+    return batcher
+
+lstm_batcher = MicroBatcher(
+    "lstm",
+    lambda x: registry.get("lstm").predict_on_batch(x),
+    max_batch_size=BATCH_MAX_SIZE,
+    max_wait_ms=BATCH_MAX_WAIT_MS
+)
+
+# ARIMA keeps a fitted filter state per symbol, advanced by each closed candle
+# only; request windows are filtered on a copy, so a forecast never refits.
+# Parameter fits (first sight of a symbol, schedule, drift) are CPU-bound and
+# run in their own process pool (replaced if a worker dies), abandoned after
+# ARIMA_TIMEOUT seconds (the symbol then fails alone). State updates and
+# forecasts run on one dedicated thread.
+ARIMA_WINDOW = int(os.getenv("ARIMA_WINDOW", 500))
+ARIMA_TIMEOUT = float(os.getenv("ARIMA_TIMEOUT", 5))
+ARIMA_INTERVAL = os.getenv("ARIMA_INTERVAL", "1h")  # candles of the forecast step
+ARIMA_REFIT_INTERVAL = float(os.getenv("ARIMA_REFIT_INTERVAL", 6 * 3600))
+
+def new_arima_pool() -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        int(os.getenv("ARIMA_WORKERS", 0)) or None,
+        mp_context=multiprocessing.get_context("spawn")
+    )
+
+arima_pool = new_arima_pool()
+arima_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="arima-state")
+arima_states = ArimaStates(window=ARIMA_WINDOW, refit_interval=ARIMA_REFIT_INTERVAL)
+
+# Closed bars of FEATURE_INTERVAL from candle-events, with rolling technical
+# features, so requests can name a symbol and window instead of sending bars.
+# A symbol seen for the first time is backfilled from the training source;
+# one with nothing to backfill is not looked up again for BACKFILL_RETRY_SECONDS.
+FEATURE_INTERVAL = os.getenv("FEATURE_INTERVAL", ARIMA_INTERVAL)
+FEATURE_WINDOW = int(os.getenv("FEATURE_WINDOW", ARIMA_WINDOW))
+INTERVAL_SECONDS = {"1m": 60, "5m": 300, "15m": 900, "1h": 3600, "4h": 14400, "1d": 86400}
+feature_store = FeatureStore(capacity=int(os.getenv("FEATURE_CAPACITY", 2000)))
+BACKFILL_RETRY_SECONDS = float(os.getenv("BACKFILL_RETRY_SECONDS", 300))
+BACKFILL_MISS_LIMIT = int(os.getenv("BACKFILL_MISS_LIMIT", 1000))
+MAX_SYMBOL_LENGTH = 20
+backfills: Dict[str, "asyncio.Future[None]"] = {}  # running backfills only
+backfill_misses: Dict[str, float] = {}  # symbol -> when a backfill found no bars, oldest first
+
+# Retraining runs in a process pool; windows, checkpoints and job records are
+# kept next to the artifacts so every worker sees them
+TRAINING_DIR = os.getenv("TRAINING_DIR", os.path.join(MODEL_PATH, "training"))
+TRAINING_SYMBOLS = [s.strip().upper() for s in os.getenv("TRAINING_SYMBOLS", "BTCUSDT,ETHUSDT").split(",") if s.strip()]
+# Seconds between scheduled retraining jobs; 0 only retrains on request
+RETRAIN_INTERVAL = float(os.getenv("RETRAIN_INTERVAL", 0))
+
+# Models are trained on the same bars they are served with
+trainer = TrainingScheduler(
+    TRAINING_DIR,
+    MODEL_PATH,
+    lambda: source_from_env(FEATURE_INTERVAL),
+    registry.refresh,
+    max_workers=int(os.getenv("TRAINING_WORKERS", 0)) or None,
+    window_rows=int(os.getenv("TRAINING_WINDOW_ROWS", 10000)),
+    min_rows=int(os.getenv("TRAINING_MIN_ROWS", 200)),
+    lookback_days=int(os.getenv("TRAINING_LOOKBACK_DAYS", 30)),
+    interval=FEATURE_INTERVAL
+)
+
+# Identical requests (same symbol, feature window, horizon and model versions)
+# are answered from memory; a model swap drops the entries that used it
+forecast_cache = ForecastCache(
+    max_entries=int(os.getenv("FORECAST_CACHE_SIZE", 10000)),
+    ttl=float(os.getenv("FORECAST_CACHE_TTL", 60))
+)
+registry.on_swap(forecast_cache.invalidate_model)
+
+# Every forecast is kept (batched SQLite writes) so actual prices arriving on
+# trade-results can be scored against it; aggregates go to ModelPerformanceLog
+forecast_store = ForecastStore(
+    os.getenv("FORECAST_STORE_PATH", os.path.join(MODEL_PATH, "forecasts.db")),
+    batch_size=int(os.getenv("FORECAST_STORE_BATCH", 500)),
+    flush_interval=float(os.getenv("FORECAST_STORE_FLUSH_SECONDS", 1))
+)
+# Retrain a symbol when its recent errors drift away from the long-run level
+DRIFT_RETRAIN = os.getenv("DRIFT_RETRAIN", "true").lower() == "true"
+main_loop: Optional[asyncio.AbstractEventLoop] = None
 
-# Load models on startup
-load_models()
+def retrain_on_drift(symbol: str, model: str):
+    if model == "arima":
+        arima_executor.submit(arima_states.mark_drift, symbol)
+    if DRIFT_RETRAIN and main_loop is not None and symbol.isalnum():
+        main_loop.call_soon_threadsafe(trainer.submit, [symbol], list(TRAINABLE_MODELS))
+
+performance = PerformanceTracker(
+    PostgresPerformanceSink(os.environ["POSTGRES_URL"]) if os.getenv("POSTGRES_URL") else None,
+    flush_interval=float(os.getenv("PERFORMANCE_FLUSH_SECONDS", 300)),
+    drift_ratio=float(os.getenv("DRIFT_RATIO", 2.0)),
+    on_drift=retrain_on_drift
+)
 
 class PredictionRequest(BaseModel):
     symbol: str
-    features: List[Dict[str, float]]
+    features: Optional[List[Dict[str, float]]] = None  # OHLCV rows; from the feature store if omitted
+    window: Optional[int] = None  # latest bars taken from the feature store
     horizon: int = 24  # hours
 
 class PredictionResponse(BaseModel):
@@ -106,174 +277,521 @@ class PredictionResponse(BaseModel):
     horizon: int
     predictions: Dict[str, Any]
 
+class BatchPredictionRequest(BaseModel):
+    forecasts: List[PredictionRequest]
+
+class BatchPredictionResponse(BaseModel):
+    results: List[PredictionResponse]
+    errors: Dict[str, str]  # symbol -> reason, for symbols that failed
+
+class RetrainRequest(BaseModel):
+    symbols: Optional[List[str]] = None
+    models: Optional[List[str]] = None
+    force: bool = False  # refit even without new data
+
 class ModelInfo(BaseModel):
     name: str
+    symbol: Optional[str] = None
     type: str
     description: str
+    version: Optional[str] = None  # served by this worker
+    current_version: Optional[str] = None  # latest published
     last_trained: Optional[str] = None
+    loaded_at: Optional[str] = None
+    load_seconds: Optional[float] = None
     accuracy_metrics: Optional[Dict[str, float]] = None
 
 @app.get("/")
 async def root():
     return {"message": "AI Forecasting Service is running"}
 
+REQUIRED_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+SEQUENCE_LENGTH = 10
+MAX_BATCH_FORECASTS = int(os.getenv("MAX_BATCH_FORECASTS", 200))
+
+class ForecastJob:
+    """One symbol's forecast within an ensemble run"""
+
+    def __init__(self, request: PredictionRequest, features: np.ndarray):
+        self.request = request
+        self.features = features
+        self.served: Dict[str, str] = {}
+        self.versions: Dict[str, Optional[str]] = {}
+        self.key: Optional[bytes] = None
+        self.error: Optional[Exception] = None
+        self.arima_ready = False
+
+def feature_matrix(features: List[Dict[str, float]]) -> np.ndarray:
+    """OHLCV rows as a float array; missing columns fall back to close, or 0"""
+    return np.array(
+        [[row.get(col, row.get('close', 0.0)) for col in REQUIRED_COLUMNS] for row in features],
+        dtype=np.float64
+    ).reshape(len(features), len(REQUIRED_COLUMNS))
+
+async def backfill_features(symbol: str):
+    """Load a symbol's recent bars from the training source; concurrent calls share one load"""
+    if not symbol.isalnum() or len(symbol) > MAX_SYMBOL_LENGTH:
+        return
+    missed = backfill_misses.get(symbol)
+    if missed is not None and time.monotonic() - missed < BACKFILL_RETRY_SECONDS:
+        return
+    # Concurrent requests for a new symbol wait on the same backfill; a failed one is retried by the next request
+    if symbol not in backfills:
+        backfills[symbol] = asyncio.ensure_future(load_history(symbol))
+        backfills[symbol].add_done_callback(lambda _: backfills.pop(symbol, None))
+    # A request that goes away must not cancel the backfill for the others
+    await asyncio.shield(backfills[symbol])
+
+async def load_history(symbol: str):
+    since_ms = int((time.time() - feature_store.capacity * INTERVAL_SECONDS.get(FEATURE_INTERVAL, 3600)) * 1000)
+    try:
+        frame = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: source_from_env(FEATURE_INTERVAL).fetch(symbol, since_ms)
+        )
+        loaded = feature_store.load(
+            symbol, frame["timestamp"].to_numpy(), frame[REQUIRED_COLUMNS].to_numpy(dtype=np.float64)
+        )
+    except Exception as e:
+        logger.error(f"Error backfilling features of {symbol}: {e}")
+        raise
+    logger.info(f"Backfilled {loaded} bars of {symbol}")
+    backfill_misses.pop(symbol, None)
+    if symbol not in feature_store:
+        if len(backfill_misses) >= BACKFILL_MISS_LIMIT:
+            del backfill_misses[next(iter(backfill_misses))]
+        backfill_misses[symbol] = time.monotonic()
+
+async def request_features(request: PredictionRequest) -> np.ndarray:
+    """The request's own OHLCV rows, or its window of the symbol's stored bars"""
+    if request.features is not None:
+        return feature_matrix(request.features)
+    symbol = request.symbol.upper()
+    if symbol not in feature_store:
+        await backfill_features(symbol)
+    return feature_store.window(symbol, request.window or FEATURE_WINDOW)
+
+def random_walk(start: float, horizon: int, volatility: float, rng: np.random.Generator) -> np.ndarray:
+    """Multiplicative random walk of ``horizon`` steps from ``start``, built in one pass"""
+    return start * np.cumprod(1 + rng.normal(0, volatility, horizon))
+
+trained_intervals: Dict[Tuple[str, Optional[str]], Optional[str]] = {}
+
+def trained_on_feature_bars(name: str) -> bool:
+    """Whether a published per-symbol model was trained on FEATURE_INTERVAL bars"""
+    key = (name, registry.version(name))
+    if key not in trained_intervals:
+        try:
+            trained_intervals[key] = store.meta(*key).get("interval")
+        except Exception:
+            trained_intervals[key] = None
+        if trained_intervals[key] != FEATURE_INTERVAL:
+            logger.warning(f"Not serving {name} {key[1]}: trained on {trained_intervals[key]} bars, not {FEATURE_INTERVAL}")
+    return trained_intervals[key] == FEATURE_INTERVAL
+
+async def prepare(jobs: List[ForecastJob]):
+    """Resolve and load each job's models, then derive its cache key from their versions"""
+    for job in jobs:
+        # Per-symbol models are published under the upper-case symbol
+        symbol = job.request.symbol.upper()
+        job.served = {"feature_scaler": "feature_scaler"}
+        for model in ENABLED_MODELS:
+            # A symbol's own forest or ARIMA if retraining published one
+            job.served[model] = registry.resolve(model, symbol) if model in TRAINABLE_MODELS else model
+    for name in {name for job in jobs for name in job.served.values()}:
+        await registry.aget(name)
+    for job in jobs:
+        for model, name in job.served.items():
+            if name != model and not trained_on_feature_bars(name):
+                # Fitted on other bars than the ones it would be served with
+                job.served[model] = model
+                await registry.aget(model)
+        job.versions = {name: registry.version(name) for name in job.served.values()}
+    await asyncio.gather(*(ensure_arima_state(job) for job in jobs if "arima" in job.served))
+    for job in jobs:
+        if job.arima_ready:
+            # The ARIMA forecast depends on the state, not only on the request
+            job.versions["arima.state"] = str(arima_states.revision(job.request.symbol.upper()))
+        job.key = forecast_key(job.request.symbol.upper(), job.features, job.request.horizon, job.versions)
+
+def stored_closes(symbol: str) -> Tuple[Optional[np.ndarray], Optional[int]]:
+    """The symbol's stored ARIMA_INTERVAL closes and the start of the last bar, if there are enough"""
+    symbol = symbol.upper()
+    if FEATURE_INTERVAL != ARIMA_INTERVAL or symbol not in feature_store:
+        return None, None
+    starts, bars = feature_store.history(symbol, ARIMA_WINDOW)
+    if len(bars) < MIN_OBSERVATIONS:
+        return None, None
+    return bars[:, 3], int(starts[-1])
+
+def seed_arima(symbol: str, close: np.ndarray, order, params, version: Optional[str]):
+    """Seed from the stored candles, read here on arima_executor so none is missed or taken twice"""
+    history, last_start = stored_closes(symbol)
+    if history is None:
+        arima_states.seed(symbol, close, order, params, version)
+    else:
+        arima_states.seed(symbol, history, order, params, version, last_start=last_start)
+
+async def fit_arima(close: np.ndarray, order, timeout: float) -> np.ndarray:
+    """fit_arima_params on the ARIMA pool, which is replaced if a dead worker broke it"""
+    global arima_pool
+    pool = arima_pool
+    try:
+        return await asyncio.wait_for(
+            asyncio.get_running_loop().run_in_executor(pool, fit_arima_params, close, order), timeout
+        )
+    except BrokenProcessPool:
+        # Only the first fit to notice replaces it; concurrent ones already see the new pool
+        if arima_pool is pool:
+            logger.error("ARIMA fit process died; starting a new pool")
+            pool.shutdown(wait=False, cancel_futures=True)
+            arima_pool = new_arima_pool()
+        raise
+
+async def ensure_arima_state(job: ForecastJob):
+    """Make sure the symbol has an ARIMA state for the served model, seeding it if needed.
+
+    The state is only ever advanced by candles; the request window itself is
+    forecast on a copy (see ArimaStates.forecast).
+    """
+    loop = asyncio.get_running_loop()
+    # Keyed like the candle events that advance it
+    symbol = job.request.symbol.upper()
+    name = job.served["arima"]
+    arima, version = registry.get(name), registry.version(name)
+    close = job.features[-ARIMA_WINDOW:, 3]
+    if len(close) < MIN_OBSERVATIONS:
+        return
+    try:
+        if await loop.run_in_executor(arima_executor, arima_states.ready, symbol, version):
+            job.arima_ready = True
+            return
+        params = arima["params"]
+        if params is None:
+            history, _ = stored_closes(symbol)
+            params = await fit_arima(close if history is None else history, arima["order"], ARIMA_TIMEOUT)
+        await loop.run_in_executor(arima_executor, seed_arima, symbol, close, arima["order"], params, version)
+        job.arima_ready = True
+    except asyncio.TimeoutError:
+        job.error = TimeoutError(f"ARIMA fit exceeded {ARIMA_TIMEOUT}s")
+    except Exception as e:
+        job.error = e
+
+async def run_ensemble(jobs: List[ForecastJob]) -> List[Any]:
+    """Forecast many symbols with one model call per model, not per symbol.
+
+    All feature rows are scaled as one stacked matrix, forests get one stacked
+    input per (shared or per-symbol) forest and the LSTM one stacked tensor of
+    windows; ARIMA forecasts come from the per-symbol filter states on the
+    ARIMA thread (only first-seed fits use the process pool). Returns, per job,
+    the forecast or the exception that made it fail.
+    """
+    loop = asyncio.get_running_loop()
+    outputs: List[Dict[str, np.ndarray]] = [{} for _ in jobs]
+    failures: List[Optional[Exception]] = [None] * len(jobs)
+    rngs = [np.random.default_rng(seed_from_key(job.key)) for job in jobs]
+
+    # Scale features
+    scaler = registry.get("feature_scaler")
+    lengths = [len(job.features) for job in jobs]
+    scaled = np.split(scaler.transform(np.concatenate([job.features for job in jobs])), np.cumsum(lengths)[:-1])
+
+    async def run_forests():
+        groups: Dict[str, List[int]] = {}
+        for i, job in enumerate(jobs):
+            if "random_forest" in job.served:
+                groups.setdefault(job.served["random_forest"], []).append(i)
+
+        async def run_group(name, members):
+            # Forests scale their own input; the last data point of each symbol
+            return await rf_batcher(name).submit(np.vstack([jobs[i].features[-1:] for i in members]))
+
+        results = await asyncio.gather(*(run_group(n, m) for n, m in groups.items()), return_exceptions=True)
+        for members, result in zip(groups.values(), results):
+            for row, i in enumerate(members):
+                if isinstance(result, Exception):
+                    failures[i] = failures[i] or result
+                else:
+                    # Generate a series of predictions for the horizon (random noise for demonstration)
+                    outputs[i]["random_forest"] = random_walk(result[row], jobs[i].request.horizon, 0.01, rngs[i])
+
+    async def run_lstm():
+        members = [i for i, job in enumerate(jobs) if "lstm" in job.served]
+        ready = [i for i in members if lengths[i] >= SEQUENCE_LENGTH]
+        for i in members:
+            if lengths[i] < SEQUENCE_LENGTH:
+                # Not enough data for LSTM
+                outputs[i]["lstm"] = np.full(jobs[i].request.horizon, float(jobs[i].features[-1, 3]))
+        if not ready:
+            return
+        # Only the latest window of each symbol feeds the forecast; strided views, no copies until the stack
+        windows = np.stack([sliding_window_view(scaled[i], SEQUENCE_LENGTH, axis=0)[-1].T for i in ready])
+        try:
+            result = await lstm_batcher.submit(windows)
+        except Exception as e:
+            for i in ready:
+                failures[i] = failures[i] or e
+            return
+        for row, i in enumerate(ready):
+            # Generate a series of predictions for the horizon (random noise for demonstration)
+            outputs[i]["lstm"] = random_walk(result[row][0], jobs[i].request.horizon, 0.02, rngs[i])
+
+    async def run_arima(i):
+        job = jobs[i]
+        if not job.arima_ready:
+            # Too little history for a fit: carry the last close forward
+            outputs[i]["arima"] = np.full(job.request.horizon, float(job.features[-1, 3]))
+            return
+        try:
+            outputs[i]["arima"] = await loop.run_in_executor(
+                arima_executor, arima_states.forecast, job.request.symbol.upper(),
+                job.features[-ARIMA_WINDOW:, 3], job.request.horizon
+            )
+        except Exception as e:
+            failures[i] = failures[i] or e
+
+    await asyncio.gather(
+        run_forests(),
+        run_lstm(),
+        *(run_arima(i) for i, job in enumerate(jobs) if "arima" in job.served)
+    )
+
+    results: List[Any] = []
+    for i, job in enumerate(jobs):
+        if failures[i] is not None:
+            results.append(failures[i])
+            continue
+        # Ensemble prediction (simple average) and confidence intervals
+        predictions = {name: outputs[i][name] for name in ENABLED_MODELS if name in outputs[i]}
+        stacked = np.vstack(list(predictions.values()))
+        ensemble_pred = stacked.mean(axis=0)
+        std_dev = stacked.std(axis=0)
+        results.append({
+            "ensemble": ensemble_pred.tolist(),
+            "lower_bound": (ensemble_pred - 1.96 * std_dev).tolist(),
+            "upper_bound": (ensemble_pred + 1.96 * std_dev).tolist(),
+            "models": {name: pred.tolist() for name, pred in predictions.items()}
+        })
+    return results
+
+async def forecast_jobs(jobs: List[ForecastJob]) -> List[Any]:
+    """Cached forecasts where possible, one ensemble run for the rest"""
+    await prepare(jobs)
+    results: List[Any] = [job.error or forecast_cache.get(job.key) for job in jobs]
+    misses = [i for i, result in enumerate(results) if result is None]
+    if misses:
+        started = time.perf_counter()
+        computed = await run_ensemble([jobs[i] for i in misses])
+        # Compute time is shared evenly by the symbols of the run
+        elapsed = (time.perf_counter() - started) / len(misses)
+        for i, result in zip(misses, computed):
+            results[i] = result
+            if not isinstance(result, Exception):
+                forecast_cache.put(jobs[i].key, result, jobs[i].versions, elapsed)
+    return results
+
+def publish_forecast(job: ForecastJob, forecast: Dict[str, Any]) -> Dict[str, Any]:
+    # Construct response
+    result = {
+        "symbol": job.request.symbol,
+        "timestamp": datetime.now().isoformat(),
+        "forecast_id": str(uuid.uuid4()),
+        "horizon": job.request.horizon,
+        "predictions": forecast
+    }
+    
+    # Send to Kafka
+    publisher.publish("forecast-events", result, key=job.request.symbol)
+    if job.request.horizon > 0:
+        forecast_store.add(result, {role: registry.version(name) for role, name in job.served.items()})
+    return result
+
 @app.post("/api/v1/forecast/predict", response_model=PredictionResponse)
 async def predict(request: PredictionRequest):
     """Generate price forecasts using ensemble of models"""
     try:
-        # Convert features to DataFrame
-        df = pd.DataFrame(request.features)
-        required_columns = ['open', 'high', 'low', 'close', 'volume']
-        
-        # Check if required columns exist
-        for col in required_columns:
-            if col not in df.columns:
-                df[col] = df['close'] if 'close' in df.columns else 0
-        
-        # Scale features
-        feature_cols = df[required_columns].values
-        scaled_features = scaler.transform(feature_cols)
-        
-        # Generate forecast ID
-        forecast_id = str(uuid.uuid4())
-        
-        # Make predictions with each model
-        predictions = {}
+        job = ForecastJob(request, await request_features(request))
+        forecast = (await forecast_jobs([job]))[0]
+        if isinstance(forecast, Exception):
+            raise forecast
+        return publish_forecast(job, forecast)
         
-        # Random Forest prediction
-        if "random_forest" in models:
-            rf_input = scaled_features[-1].reshape(1, -1)  # Use last data point
-            rf_pred = models["random_forest"].predict(rf_input)
-            
-            # Generate a series of predictions for the horizon
-            rf_forecast = []
-            last_pred = rf_pred[0]
-            
-            for i in range(request.horizon):
-                # Add some random noise for demonstration
-                next_pred = last_pred * (1 + np.random.normal(0, 0.01))
-                rf_forecast.append(float(next_pred))
-                last_pred = next_pred
-                
-            predictions["random_forest"] = rf_forecast
-        
-        # ARIMA prediction
-        if "arima" in models:
-            # For demonstration, generate some forecasts
-            arima_forecast = []
-            last_close = df['close'].iloc[-1]
-            
-            for i in range(request.horizon):
-                # Add some random noise for demonstration
-                next_pred = last_close * (1 + np.random.normal(0, 0.015))
-                arima_forecast.append(float(next_pred))
-                last_close = next_pred
-                
-            predictions["arima"] = arima_forecast
+    except NoCandles as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error generating forecast: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/v1/forecast/predict/batch", response_model=BatchPredictionResponse)
+async def predict_batch(request: BatchPredictionRequest):
+    """Forecast many symbols in one call; symbols that fail are reported, not fatal"""
+    if len(request.forecasts) > MAX_BATCH_FORECASTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_FORECASTS} forecasts per request")
+    
+    try:
+        jobs, errors = [], {}
+        features = await asyncio.gather(*(request_features(item) for item in request.forecasts), return_exceptions=True)
+        for item, matrix in zip(request.forecasts, features):
+            try:
+                if isinstance(matrix, Exception):
+                    raise matrix
+                if not len(matrix):
+                    raise ValueError("no features")
+                jobs.append(ForecastJob(item, matrix))
+            except Exception as e:
+                errors[item.symbol] = f"invalid features: {e}"
         
-        # LSTM prediction
-        if "lstm" in models:
-            # Prepare data for LSTM
-            sequence_length = 10
-            if len(df) >= sequence_length:
-                lstm_input = []
-                for i in range(len(df) - sequence_length + 1):
-                    lstm_input.append(scaled_features[i:i+sequence_length])
-                
-                lstm_input = np.array(lstm_input)
-                lstm_pred = models["lstm"].predict(lstm_input)
-                
-                # Generate a series of predictions for the horizon
-                lstm_forecast = []
-                last_pred = lstm_pred[-1][0]
-                
-                for i in range(request.horizon):
-                    # Add some random noise for demonstration
-                    next_pred = last_pred * (1 + np.random.normal(0, 0.02))
-                    lstm_forecast.append(float(next_pred))
-                    last_pred = next_pred
-                    
-                predictions["lstm"] = lstm_forecast
+        results = []
+        for job, forecast in zip(jobs, await forecast_jobs(jobs) if jobs else []):
+            if isinstance(forecast, Exception):
+                logger.error(f"Error generating forecast for {job.request.symbol}: {forecast}")
+                errors[job.request.symbol] = str(forecast) or type(forecast).__name__
             else:
-                # Not enough data for LSTM
-                predictions["lstm"] = [float(df['close'].iloc[-1])] * request.horizon
-        
-        # Ensemble prediction (simple average)
-        ensemble_pred = np.mean([predictions[m] for m in predictions.keys()], axis=0)
-        
-        # Calculate confidence intervals
-        std_dev = np.std([predictions[m] for m in predictions.keys()], axis=0)
-        lower_bound = (ensemble_pred - 1.96 * std_dev).tolist()
-        upper_bound = (ensemble_pred + 1.96 * std_dev).tolist()
-        
-        # Construct response
-        result = {
-            "symbol": request.symbol,
-            "timestamp": datetime.now().isoformat(),
-            "forecast_id": forecast_id,
-            "horizon": request.horizon,
-            "predictions": {
-                "ensemble": ensemble_pred.tolist(),
-                "lower_bound": lower_bound,
-                "upper_bound": upper_bound,
-                "models": {name: pred for name, pred in predictions.items()}
-            }
-        }
-        
-        # Send to Kafka
-        producer.send("forecast-events", result)
+                results.append(publish_forecast(job, forecast))
         
-        return result
+        return {"results": results, "errors": errors}
         
     except Exception as e:
-        logger.error(f"Error generating forecast: {e}")
+        logger.error(f"Error generating batch forecast: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/health/live")
+async def liveness():
+    """The process is up and serving requests"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness():
+    """Ready once the warm-up models are loaded; others still load on first use"""
+    pending = [name for name in ["feature_scaler"] + WARM_MODELS if not registry.is_loaded(name)]
+    if pending:
+        return JSONResponse(status_code=503, content={"status": "loading", "pending": pending})
+    return {"status": "ready"}
+
+MODEL_DESCRIPTIONS = {
+    "random_forest": ("machine_learning", "Random Forest regression model"),
+    "arima": ("statistical", "ARIMA time series model"),
+    "lstm": ("deep_learning", "LSTM neural network model")
+}
+
 @app.get("/api/v1/forecast/models", response_model=List[ModelInfo])
 async def list_models():
-    """List available forecasting models"""
+    """List available forecasting models with their published and served versions"""
     model_list = []
     
-    if "random_forest" in models:
-        model_list.append(ModelInfo(
-            name="random_forest",
-            type="machine_learning",
-            description="Random Forest regression model",
-            last_trained=datetime.now().isoformat(),
-            accuracy_metrics={"mse": 0.05, "mae": 0.02}
-        ))
-    
-    if "arima" in models:
-        model_list.append(ModelInfo(
-            name="arima",
-            type="statistical",
-            description="ARIMA time series model",
-            last_trained=datetime.now().isoformat(),
-            accuracy_metrics={"mse": 0.08, "mae": 0.03}
-        ))
-    
-    if "lstm" in models:
-        model_list.append(ModelInfo(
-            name="lstm",
-            type="deep_learning",
-            description="LSTM neural network model",
-            last_trained=datetime.now().isoformat(),
-            accuracy_metrics={"mse": 0.04, "mae": 0.015}
-        ))
+    published = store.names()
+    for base in ENABLED_MODELS:
+        model_type, description = MODEL_DESCRIPTIONS[base]
+        # The shared model followed by its per-symbol variants
+        for name in [base] + [n for n in published if n.startswith(f"{base}.")]:
+            current = store.current_version(name)
+            meta = store.meta(name, current) if current else {}
+            info = registry.load_info.get(name, {})
+            model_list.append(ModelInfo(
+                name=name,
+                symbol=meta.get("symbol"),
+                type=model_type,
+                description=description,
+                version=registry.version(name),
+                current_version=current,
+                last_trained=meta.get("created_at"),
+                loaded_at=info.get("loaded_at"),
+                load_seconds=info.get("load_seconds"),
+                accuracy_metrics=meta.get("metrics")
+            ))
     
     return model_list
 
+@app.get("/api/v1/forecast/features/{symbol}")
+async def get_features(symbol: str, window: int = 1):
+    """Latest bars of a symbol with their rolling technical features"""
+    symbol = symbol.upper()
+    try:
+        if symbol not in feature_store:
+            await backfill_features(symbol)
+        bars = feature_store.latest(symbol, window)
+    except NoCandles:
+        raise HTTPException(status_code=404, detail=f"No candles for {symbol}")
+    except Exception as e:
+        logger.error(f"Error loading features of {symbol}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"symbol": symbol, "interval": FEATURE_INTERVAL, "bars": bars}
+
+@app.get("/api/v1/forecast/stats")
+async def get_stats():
+    """Get event publishing, inference batching and model loading counters"""
+    return {
+        "events": publisher.metrics(),
+        "models": registry.stats(),
+        "training": trainer.stats(),
+        "cache": forecast_cache.stats(),
+        "forecast_store": forecast_store.stats(),
+        "performance": performance.stats(),
+        "arima": arima_states.stats(),
+        "features": feature_store.stats(),
+        "batching": {
+            "random_forest": {name: batcher.stats() for name, batcher in rf_batchers.items()},
+            "lstm": lstm_batcher.stats()
+        }
+    }
+
 @app.post("/api/v1/forecast/retrain")
-async def retrain_models():
-    """Trigger model retraining"""
-    # In a real implementation, this would start a background task to retrain models
-    # For demonstration, we'll just return a success message
+async def retrain_models(request: Optional[RetrainRequest] = None):
+    """Schedule a retraining job"""
+    request = request or RetrainRequest()
+    symbols = [s.upper() for s in request.symbols] if request.symbols else TRAINING_SYMBOLS
+    models = request.models or list(TRAINABLE_MODELS)
+    
+    invalid = [s for s in symbols if not s.isalnum()] + [m for m in models if m not in TRAINABLE_MODELS]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid symbols or models: {invalid}")
+    
+    job = trainer.submit(symbols, models, force=request.force)
     return {
         "status": "success",
         "message": "Model retraining has been scheduled",
-        "job_id": str(uuid.uuid4())
+        "job_id": job["job_id"]
     }
 
+@app.get("/api/v1/forecast/retrain/{job_id}")
+async def retrain_status(job_id: str):
+    """Status, progress and duration of a retraining job"""
+    job = trainer.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/api/v1/forecast/retrain")
+async def list_retrain_jobs():
+    """Recent retraining jobs of this worker"""
+    return list(reversed(trainer.jobs.values()))
+
+async def retrain_periodically():
+    while True:
+        await asyncio.sleep(RETRAIN_INTERVAL)
+        trainer.submit(TRAINING_SYMBOLS, list(TRAINABLE_MODELS))
+
+def parse_timestamp(value) -> Optional[datetime]:
+    """Epoch milliseconds or ISO 8601, as naive local time like forecast timestamps"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value / 1000)
+    parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    return parsed.astimezone().replace(tzinfo=None) if parsed.tzinfo else parsed
+
+def evaluate_actual(data: Dict[str, Any]):
+    """Score every model of the referenced forecast against an actual price"""
+    forecast = forecast_store.lookup(data["forecast_id"])
+    if forecast is None:
+        return
+    actual = float(data["actual_price"])
+    step = forecast.step_at(parse_timestamp(data.get("timestamp")))
+    for row, model in enumerate(forecast.models):
+        predicted = float(forecast.paths[row, step - 1])
+        performance.observe(model, forecast.versions.get(model), forecast.symbol, forecast.timeframe, predicted, actual)
+        if model == "ensemble" and actual:
+            forecast_store.record_actual(forecast.forecast_id, actual, abs(predicted - actual) / actual * 100)
+
 # Start background consumer to monitor model performance
 def monitor_model_performance():
     """Background thread to monitor model performance"""
@@ -281,36 +799,96 @@ def monitor_model_performance():
         consumer = KafkaConsumer(
             "trade-results",
             bootstrap_servers=os.getenv("KAFKA_SERVERS", "localhost:9092"),
-            value_deserializer=lambda v: json.loads(v.decode('utf-8')),
+            value_deserializer=lambda v: decode_event(v)[0],
             group_id="forecasting-monitor",
             auto_offset_reset="latest"
         )
         
-        # Keep track of model performance
-        model_errors = {model: [] for model in models.keys()}
-        model_errors["ensemble"] = []
-        
+        while True:
+            # Poll with a timeout so aggregates are flushed on time when idle
+            for records in consumer.poll(timeout_ms=1000).values():
+                for message in records:
+                    try:
+                        data = message.value
+                        if "forecast_id" in data and "actual_price" in data:
+                            evaluate_actual(data)
+                    except Exception as e:
+                        logger.error(f"Error in monitoring loop: {e}")
+            performance.maybe_flush()
+    except Exception as e:
+        logger.error(f"Failed to start monitoring consumer: {e}")
+
+def follow_candles():
+    """Background thread feeding closed bars to the feature store and the ARIMA states"""
+    try:
+        # No consumer group: every worker keeps its own states and needs all candles
+        consumer = KafkaConsumer(
+            "candle-events",
+            bootstrap_servers=os.getenv("KAFKA_SERVERS", "localhost:9092"),
+            value_deserializer=lambda v: decode_event(v)[0],
+            auto_offset_reset="latest"
+        )
         for message in consumer:
             try:
-                data = message.value
-                if "forecast_id" in data and "actual_price" in data:
-                    forecast_id = data["forecast_id"]
-                    actual = data["actual_price"]
-                    
-                    # In a real system, you'd store forecasts in a database
-                    # and retrieve them here to compare with actual values
-                    
-                    # Update error metrics
-                    # Detect if model drift is occurring
-                    # Trigger retraining if needed
-                    pass
+                candle = message.value
+                if candle.get("interval") == FEATURE_INTERVAL:
+                    feature_store.add(
+                        candle["symbol"], candle["start"], candle["open"], candle["high"],
+                        candle["low"], candle["close"], candle["volume"]
+                    )
+                if "arima" in ENABLED_MODELS and candle.get("interval") == ARIMA_INTERVAL:
+                    arima_executor.submit(arima_states.observe_candle, candle["symbol"], candle["start"], candle["close"])
             except Exception as e:
-                logger.error(f"Error in monitoring loop: {e}")
+                logger.error(f"Error in candle loop: {e}")
     except Exception as e:
-        logger.error(f"Failed to start monitoring consumer: {e}")
+        logger.error(f"Failed to start candle consumer: {e}")
+
+async def refit_arima_periodically():
+    """Re-estimate ARIMA parameters of states that are due (schedule or drift), off the request path"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(60)
+        for symbol, history, order, version in await loop.run_in_executor(arima_executor, arima_states.refit_due):
+            try:
+                params = await fit_arima(history, order, ARIMA_TIMEOUT * 4)
+                await loop.run_in_executor(arima_executor, arima_states.seed, symbol, None, order, params, version, True)
+            except Exception as e:
+                logger.error(f"ARIMA refit for {symbol} failed: {e!r}")
 
-# Start the monitoring thread
-threading.Thread(target=monitor_model_performance, daemon=True).start()
+@app.on_event("startup")
+async def startup_event():
+    global main_loop
+    main_loop = asyncio.get_running_loop()
+    forecast_store.start()
+    
+    # Load the served models in the background so the worker comes up immediately
+    registry.warm_up(["feature_scaler"] + WARM_MODELS)
+    # Pick up versions published by retraining without a restart
+    registry.watch(MODEL_RELOAD_INTERVAL)
+    if RETRAIN_INTERVAL > 0:
+        asyncio.create_task(retrain_periodically())
+    
+    # Start the monitoring thread
+    threading.Thread(target=monitor_model_performance, daemon=True).start()
+    threading.Thread(target=follow_candles, daemon=True).start()
+    if "arima" in ENABLED_MODELS:
+        asyncio.create_task(refit_arima_periodically())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Do not wait for abandoned (timed out) ARIMA forecasts
+    arima_pool.shutdown(wait=False, cancel_futures=True)
+    
+    # Write the forecasts and actual prices still buffered, and deliver pending events
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, forecast_store.stop)
+    except Exception as e:
+        logger.error(f"Error flushing forecasts on shutdown: {e}")
+    try:
+        await loop.run_in_executor(None, publisher.close, 10)
+    except Exception as e:
+        logger.error(f"Error closing event publisher: {e}")
 
 if __name__ == "__main__":
     import uvicorn
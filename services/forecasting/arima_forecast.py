@@ -0,0 +1,158 @@
+import time
+import warnings
+from collections import deque
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Fewer closes than this and the ARIMA forecast is the last close carried forward
+MIN_OBSERVATIONS = 20
+
+
+def fit_arima_params(close: np.ndarray, order: Tuple[int, int, int]) -> np.ndarray:
+    """Maximum-likelihood ARIMA parameters for ``close``; runs in a worker process"""
+    from statsmodels.tsa.arima.model import ARIMA
+
+    with warnings.catch_warnings():
+        # Convergence chatter on short or flat windows is expected here
+        warnings.simplefilter("ignore")
+        return np.asarray(ARIMA(np.asarray(close, dtype=np.float64), order=order).fit().params)
+
+
+class ArimaState:
+    __slots__ = ("results", "history", "order", "model_version", "revision", "seeded_at", "last_start", "drifted",
+                 "candles", "pure")
+
+    def __init__(self, results, history: deque, order, model_version: Optional[str], revision: int, candles: int):
+        self.results = results
+        self.history = history
+        self.order = order
+        self.model_version = model_version
+        self.revision = revision
+        self.seeded_at = time.monotonic()
+        self.last_start = 0
+        self.drifted = False
+        # Trailing closes of the history that came from candles; the filtered state
+        # is only the symbol's own if all of them did when it was seeded
+        self.candles = candles
+        self.pure = candles >= len(history)
+
+
+class ArimaStates:
+    """Per-symbol ARIMA filter states, advanced one observation at a time.
+
+    A state is seeded once by filtering a window of closes with known parameters
+    (O(window), no optimizer), preferably the symbol's stored candles. Afterwards
+    every closed candle is added with ``results.extend``, which starts from the
+    previous filtered state, so updating costs the same whatever the length of
+    the history. Only candles advance a state: a request window that is the
+    latest stretch of a candle-only history is forecast from the state itself,
+    any other window is filtered on a copy with the same parameters
+    (``results.apply``, O(window)), so no request sees another one's data.
+
+    The parameters are only re-estimated by a full refit on a schedule or after
+    drift; see :meth:`refit_due`. Not thread-safe: all calls are meant to run on a
+    single executor thread.
+    """
+
+    def __init__(self, window: int = 500, refit_interval: float = 6 * 3600):
+        self.window = window
+        self.refit_interval = refit_interval
+        self._states: Dict[str, ArimaState] = {}
+        self.seeds = 0
+        self.extended = 0
+        self.applied = 0
+        self.refits = 0
+
+    def revision(self, symbol: str) -> Optional[int]:
+        state = self._states.get(symbol)
+        return state.revision if state else None
+
+    def ready(self, symbol: str, model_version: Optional[str]) -> bool:
+        state = self._states.get(symbol)
+        return state is not None and state.model_version == model_version
+
+    def seed(self, symbol: str, close: Optional[np.ndarray], order, params: Sequence[float],
+             model_version: Optional[str], refit: bool = False, last_start: Optional[int] = None):
+        """Filter ``close`` (default: the state's current history) with ``params``.
+
+        ``last_start`` is the start of the candle ``close`` ends with; without it
+        ``close`` is taken to be a request window, which only stands in until the
+        state has seen a window of candles.
+        """
+        from statsmodels.tsa.arima.model import ARIMA
+
+        previous = self._states.get(symbol)
+        if close is None:
+            # A refit finishing now also covers the closes that arrived during it
+            close = np.array(previous.history)
+            candles = previous.candles
+        else:
+            candles = len(close) if last_start is not None else 0
+        close = np.asarray(close[-self.window:], dtype=np.float64)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            results = ARIMA(close, order=order).filter(np.asarray(params))
+        state = ArimaState(
+            results, deque(close, maxlen=self.window), order, model_version,
+            previous.revision + 1 if previous else 0, min(candles, len(close))
+        )
+        if last_start is not None:
+            state.last_start = last_start
+        elif previous is not None:
+            state.last_start = previous.last_start
+        self._states[symbol] = state
+        self.seeds += 1
+        self.refits += refit
+
+    def _extend(self, state: ArimaState, new: np.ndarray):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            state.results = state.results.extend(np.asarray(new, dtype=np.float64))
+        state.history.extend(new)
+        state.candles = min(state.candles + len(new), len(state.history))
+        state.revision += 1
+        self.extended += len(new)
+
+    def observe_candle(self, symbol: str, start: int, close: float):
+        """Advance a seeded state by one closed bar; repeated or older bars are ignored"""
+        state = self._states.get(symbol)
+        if state is None or start <= state.last_start:
+            return
+        state.last_start = start
+        self._extend(state, np.array([close]))
+        if not state.pure and state.candles == self.window:
+            # The request window it was seeded from has rolled out; filter the candles alone
+            self.seed(symbol, None, state.order, state.results.params, state.model_version)
+
+    def forecast(self, symbol: str, close: np.ndarray, horizon: int) -> np.ndarray:
+        """Forecast following the request window ``close``; the shared state is left as it is"""
+        state = self._states[symbol]
+        close = np.asarray(close, dtype=np.float64)
+        if state.pure and 0 < len(close) <= len(state.history) and np.array_equal(
+            close, np.array(state.history)[-len(close):]
+        ):
+            return np.asarray(state.results.forecast(horizon))
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            results = state.results.apply(close)
+        self.applied += 1
+        return np.asarray(results.forecast(horizon))
+
+    def mark_drift(self, symbol: str):
+        state = self._states.get(symbol)
+        if state is not None:
+            state.drifted = True
+
+    def refit_due(self):
+        """Symbols whose parameters should be re-estimated, with their history"""
+        now = time.monotonic()
+        return [
+            (symbol, np.array(state.history), state.order, state.model_version)
+            for symbol, state in self._states.items()
+            if state.drifted or now - state.seeded_at >= self.refit_interval
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"states": len(self._states), "seeds": self.seeds, "refits": self.refits, "extended": self.extended,
+                "applied": self.applied}
@@ -0,0 +1,180 @@
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+
+class ArtifactStore:
+    """Versioned model artifacts on disk.
+
+    Layout: ``<root>/<model>/<version>/`` holds the artifact files plus
+    ``meta.json``, and ``<root>/<model>/CURRENT`` names the version being served.
+    A version directory is fully written under a temporary name and renamed into
+    place before ``CURRENT`` is atomically replaced, so readers (including other
+    worker processes) never see a half-written model.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, name: str, version: str) -> str:
+        return os.path.join(self.root, name, version)
+
+    def current_version(self, name: str) -> Optional[str]:
+        try:
+            with open(os.path.join(self.root, name, "CURRENT")) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def names(self) -> List[str]:
+        """Models with a served version"""
+        return sorted(n for n in os.listdir(self.root) if os.path.isfile(os.path.join(self.root, n, "CURRENT")))
+
+    def versions(self, name: str) -> List[str]:
+        model_dir = os.path.join(self.root, name)
+        if not os.path.isdir(model_dir):
+            return []
+        return sorted(
+            v for v in os.listdir(model_dir)
+            if not v.startswith(".") and os.path.isfile(os.path.join(model_dir, v, "meta.json"))
+        )
+
+    def meta(self, name: str, version: str) -> Dict[str, Any]:
+        with open(os.path.join(self.path(name, version), "meta.json")) as f:
+            return json.load(f)
+
+    def publish(self, name: str, save: Callable[[str], None], meta: Optional[Dict[str, Any]] = None) -> str:
+        """Write a new version with ``save(directory)`` and make it current"""
+        model_dir = os.path.join(self.root, name)
+        os.makedirs(model_dir, exist_ok=True)
+        version = f"{datetime.utcnow().strftime('%Y%m%d%H%M%S%f')}-{uuid.uuid4().hex[:6]}"
+
+        staging = tempfile.mkdtemp(prefix=".staging-", dir=model_dir)
+        try:
+            save(staging)
+            with open(os.path.join(staging, "meta.json"), "w") as f:
+                json.dump({"version": version, "created_at": datetime.utcnow().isoformat(), **(meta or {})}, f)
+            os.rename(staging, self.path(name, version))
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        self.set_current(name, version)
+        return version
+
+    def set_current(self, name: str, version: str):
+        pointer = os.path.join(self.root, name, "CURRENT")
+        tmp = f"{pointer}.{uuid.uuid4().hex}"
+        with open(tmp, "w") as f:
+            f.write(version)
+        os.replace(tmp, pointer)
+
+
+class MappedScaler:
+    """Min-max feature scaling from memory-mapped ``scale``/``min`` arrays"""
+
+    def __init__(self, scale: np.ndarray, offset: np.ndarray):
+        self.scale = scale
+        self.offset = offset
+
+    @classmethod
+    def from_sklearn(cls, scaler) -> "MappedScaler":
+        return cls(np.asarray(scaler.scale_, dtype=np.float64), np.asarray(scaler.min_, dtype=np.float64))
+
+    def save(self, directory: str):
+        np.save(os.path.join(directory, "scale.npy"), self.scale)
+        np.save(os.path.join(directory, "min.npy"), self.offset)
+
+    @classmethod
+    def load(cls, directory: str) -> "MappedScaler":
+        return cls(
+            np.load(os.path.join(directory, "scale.npy"), mmap_mode="r"),
+            np.load(os.path.join(directory, "min.npy"), mmap_mode="r"),
+        )
+
+    def transform(self, X: np.ndarray) -> np.ndarray:
+        return np.asarray(X, dtype=np.float64) * self.scale + self.offset
+
+
+class MappedForest:
+    """A fitted random-forest regressor flattened into memory-mappable arrays.
+
+    sklearn copies every tree's nodes into private buffers when unpickling, so each
+    worker would hold its own copy of the forest. Here the nodes of all trees are
+    concatenated into plain arrays loaded with ``mmap_mode="r"``; every worker maps
+    the same file and the OS keeps one physical copy in the page cache. Prediction
+    walks all trees for all rows at once, one tree level per step, and matches
+    ``RandomForestRegressor.predict``. A forest may carry the scaler it was trained
+    with, in which case it takes raw features.
+    """
+
+    FIELDS = ("left", "right", "feature", "threshold", "value", "roots")
+
+    def __init__(self, left, right, feature, threshold, value, roots, scaler: Optional[MappedScaler] = None):
+        self.left = left
+        self.right = right
+        self.feature = feature
+        self.threshold = threshold
+        self.value = value
+        self.roots = roots
+        self.scaler = scaler
+
+    @classmethod
+    def from_sklearn(cls, forest, scaler: Optional[MappedScaler] = None) -> "MappedForest":
+        left, right, feature, threshold, value, roots = [], [], [], [], [], []
+        offset = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            is_leaf = tree.children_left < 0
+            # Leaves point at themselves, so finished rows simply stay put
+            own = np.arange(tree.node_count) + offset
+            left.append(np.where(is_leaf, own, tree.children_left + offset))
+            right.append(np.where(is_leaf, own, tree.children_right + offset))
+            feature.append(np.where(is_leaf, 0, tree.feature))
+            threshold.append(tree.threshold)
+            value.append(tree.value[:, 0, 0])
+            roots.append(offset)
+            offset += tree.node_count
+        return cls(
+            np.concatenate(left).astype(np.int64),
+            np.concatenate(right).astype(np.int64),
+            np.concatenate(feature).astype(np.int64),
+            np.concatenate(threshold).astype(np.float64),
+            np.concatenate(value).astype(np.float64),
+            np.asarray(roots, dtype=np.int64),
+            scaler,
+        )
+
+    def save(self, directory: str):
+        for field in self.FIELDS:
+            np.save(os.path.join(directory, f"{field}.npy"), getattr(self, field))
+        if self.scaler is not None:
+            self.scaler.save(directory)
+
+    @classmethod
+    def load(cls, directory: str) -> "MappedForest":
+        arrays = [np.load(os.path.join(directory, f"{field}.npy"), mmap_mode="r") for field in cls.FIELDS]
+        scaler = MappedScaler.load(directory) if os.path.exists(os.path.join(directory, "scale.npy")) else None
+        return cls(*arrays, scaler)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        if self.scaler is not None:
+            X = self.scaler.transform(X)
+        # sklearn compares float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        rows = np.arange(len(X))
+        nodes = np.repeat(self.roots[:, None], len(X), axis=1)
+        while True:
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            next_nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+            if np.array_equal(next_nodes, nodes):
+                break
+            nodes = next_nodes
+        return self.value[nodes].mean(axis=0)
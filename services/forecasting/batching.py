@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Coalesces concurrent inference calls into batched model invocations.
+
+    Callers submit arrays whose first axis is a batch of rows. The worker takes the
+    first waiting submission, keeps collecting until ``max_batch_size`` rows are
+    queued or ``max_wait_ms`` has passed, concatenates everything into one array,
+    runs ``predict_batch`` on a dedicated executor thread and scatters the output
+    rows back to each caller. While one batch is running the next one fills up, so
+    under load the model is called with large batches and the event loop never waits
+    on it. When the previous batch held a single submission the service is idle and
+    the lone request is dispatched without waiting.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        predict_batch: Callable[[np.ndarray], np.ndarray],
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0,
+        executor: Optional[ThreadPoolExecutor] = None,
+        latency_window: int = 1024,
+    ):
+        self.name = name
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{name}-inference")
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.rows = 0
+        self._last_batch_len = 0
+        self._latencies = deque(maxlen=latency_window)
+
+    async def submit(self, inputs: np.ndarray) -> np.ndarray:
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.ensure_future(self._run())
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((inputs, future, time.perf_counter()))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            rows = len(batch[0][0])
+            wait = self.max_wait if self._last_batch_len > 1 or not self._queue.empty() else 0
+            deadline = loop.time() + wait
+            while rows < self.max_batch_size:
+                if self._queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    item = self._queue.get_nowait()
+                batch.append(item)
+                rows += len(item[0])
+
+            self._last_batch_len = len(batch)
+            await self._execute(loop, batch)
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            await asyncio.gather(self._worker, return_exceptions=True)
+            self._worker = None
+
+    async def _execute(self, loop, batch):
+        sizes = [len(inputs) for inputs, _, _ in batch]
+        try:
+            stacked = np.concatenate([inputs for inputs, _, _ in batch])
+            outputs = await loop.run_in_executor(self.executor, self.predict_batch, stacked)
+        except Exception as e:
+            logger.error(f"{self.name}: batch of {sum(sizes)} rows failed: {e}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.rows += len(stacked)
+        now = time.perf_counter()
+        offset = 0
+        for (_, future, submitted_at), size in zip(batch, sizes):
+            if not future.done():
+                future.set_result(outputs[offset:offset + size])
+            offset += size
+            self._latencies.append((now - submitted_at) * 1000)
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self._latencies)
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "mean_batch_rows": self.rows / self.batches if self.batches else None,
+            "latency_ms_p50": latencies[len(latencies) // 2] if latencies else None,
+            "latency_ms_p99": latencies[int(len(latencies) * 0.99)] if latencies else None,
+        }
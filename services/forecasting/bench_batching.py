@@ -0,0 +1,69 @@
+"""Throughput and latency of micro-batched vs per-request inference.
+
+Uses a synthetic model with a fixed per-call dispatch cost plus a per-row cost,
+which is the shape of the Keras/sklearn overhead the batcher amortizes:
+
+    python bench_batching.py --call-ms 3 --row-us 20 --concurrency 1 8 32 128
+"""
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from batching import MicroBatcher
+
+
+def make_model(call_ms: float, row_us: float):
+    weights = np.random.rand(50, 1)
+
+    def predict(x: np.ndarray) -> np.ndarray:
+        time.sleep(call_ms / 1000 + len(x) * row_us / 1e6)
+        return x.reshape(len(x), -1) @ weights
+
+    return predict
+
+
+async def run(concurrency: int, requests: int, submit):
+    latencies = []
+    pending = iter(range(requests))
+
+    async def client():
+        for _ in pending:
+            started = time.perf_counter()
+            await submit(np.random.rand(1, 10, 5))
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return requests / elapsed, latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+
+async def main(args):
+    predict = make_model(args.call_ms, args.row_us)
+    executor = ThreadPoolExecutor(max_workers=1)
+
+    async def unbatched(x):
+        return await asyncio.get_running_loop().run_in_executor(executor, predict, x)
+
+    print(f"{'mode':<10}{'conc':>6}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for concurrency in args.concurrency:
+        batcher = MicroBatcher("bench", predict, args.max_batch, args.max_wait_ms)
+        for mode, submit in (("unbatched", unbatched), ("batched", batcher.submit)):
+            rps, p50, p99 = await run(concurrency, args.requests, submit)
+            print(f"{mode:<10}{concurrency:>6}{rps:>10.0f}{p50:>10.2f}{p99:>10.2f}")
+        await batcher.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--call-ms", type=float, default=3.0, help="fixed cost per model call")
+    parser.add_argument("--row-us", type=float, default=20.0, help="cost per input row")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    asyncio.run(main(parser.parse_args()))
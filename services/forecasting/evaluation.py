@@ -0,0 +1,218 @@
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class RollingErrors:
+    """Error aggregates updated in O(1) per observation.
+
+    MAE and MSE are in percent of the actual price, like
+    ``PricePrediction.prediction_error``, so they are comparable across symbols
+    and fit ModelPerformanceLog's columns. R² is computed on prices.
+    """
+
+    __slots__ = ("count", "abs_pct", "sq_pct", "sq_err", "sum_y", "sum_y2")
+
+    def __init__(self):
+        self.count = 0
+        self.abs_pct = 0.0
+        self.sq_pct = 0.0
+        self.sq_err = 0.0
+        self.sum_y = 0.0
+        self.sum_y2 = 0.0
+
+    def add(self, predicted: float, actual: float):
+        error = predicted - actual
+        pct = error / actual * 100
+        self.count += 1
+        self.abs_pct += abs(pct)
+        self.sq_pct += pct * pct
+        self.sq_err += error * error
+        self.sum_y += actual
+        self.sum_y2 += actual * actual
+
+    @property
+    def mae(self) -> float:
+        return self.abs_pct / self.count
+
+    @property
+    def mse(self) -> float:
+        return self.sq_pct / self.count
+
+    @property
+    def r_squared(self) -> float:
+        total = self.sum_y2 - self.sum_y * self.sum_y / self.count
+        return 1 - self.sq_err / total if total > 0 else 0.0
+
+
+class DriftDetector:
+    """Compares a fast and a slow exponentially weighted absolute error.
+
+    Drift is flagged when the recent error exceeds ``ratio`` times the long-run
+    error, after ``min_samples`` observations.
+    """
+
+    __slots__ = ("fast", "slow", "count", "_fast_alpha", "_slow_alpha")
+
+    def __init__(self, fast_halflife: int, slow_halflife: int):
+        self.fast = 0.0
+        self.slow = 0.0
+        self.count = 0
+        self._fast_alpha = 1 - 0.5 ** (1 / fast_halflife)
+        self._slow_alpha = 1 - 0.5 ** (1 / slow_halflife)
+
+    def add(self, abs_pct: float):
+        if self.count == 0:
+            self.fast = self.slow = abs_pct
+        else:
+            self.fast += self._fast_alpha * (abs_pct - self.fast)
+            self.slow += self._slow_alpha * (abs_pct - self.slow)
+        self.count += 1
+
+    def drifting(self, ratio: float, min_samples: int) -> bool:
+        return self.count >= min_samples and self.fast > ratio * max(self.slow, 1e-9)
+
+
+class PostgresPerformanceSink:
+    """Inserts aggregates into the backend's ModelPerformanceLog table"""
+
+    def __init__(self, dsn: str):
+        self.dsn = dsn
+        self.conn = None
+
+    def write(self, rows: List[tuple]):
+        import psycopg2
+        from psycopg2.extras import execute_values
+
+        if self.conn is None or self.conn.closed:
+            self.conn = psycopg2.connect(self.dsn)
+        try:
+            with self.conn, self.conn.cursor() as cursor:
+                execute_values(cursor, """
+                    INSERT INTO api_modelperformancelog
+                        (model_version, symbol, timeframe, evaluation_date,
+                         mean_absolute_error, mean_squared_error, r_squared, sample_size)
+                    VALUES %s
+                """, rows)
+        except psycopg2.InterfaceError:
+            self.conn = None
+            raise
+
+
+def _clamp(value: float, limit: float) -> float:
+    # Fits DecimalField(max_digits, decimal_places) of ModelPerformanceLog
+    return round(min(max(value, -limit), limit), 4)
+
+
+class PerformanceTracker:
+    """Streaming evaluation of forecasts against actual prices.
+
+    Each observation updates the aggregates of its (model, version, symbol,
+    timeframe) in O(1); every ``flush_interval`` seconds the aggregates are written
+    to ModelPerformanceLog in one batch and reset, so the database sees one row per
+    group and period instead of one write per message. A drift detector per (model,
+    symbol) calls ``on_drift`` when recent errors run away from the long-run level.
+    """
+
+    def __init__(
+        self,
+        sink: Optional[Any],
+        flush_interval: float = 300.0,
+        drift_ratio: float = 2.0,
+        drift_min_samples: int = 50,
+        drift_cooldown: float = 3600.0,
+        on_drift: Optional[Callable[[str, str], None]] = None,
+    ):
+        self.sink = sink
+        self.flush_interval = flush_interval
+        self.drift_ratio = drift_ratio
+        self.drift_min_samples = drift_min_samples
+        self.drift_cooldown = drift_cooldown
+        self.on_drift = on_drift
+        self._window: Dict[Tuple[str, str, str], RollingErrors] = {}
+        self._totals: Dict[Tuple[str, str], RollingErrors] = {}
+        self._drift: Dict[Tuple[str, str], DriftDetector] = {}
+        self._drift_fired: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._next_flush = time.monotonic() + flush_interval
+        self.observations = 0
+        self.flushed_rows = 0
+        self.drift_events = 0
+        self.errors = 0
+
+    def observe(self, model: str, version: Optional[str], symbol: str, timeframe: str, predicted: float, actual: float):
+        if actual <= 0 or not math.isfinite(predicted):
+            return
+        model_version = f"{model}@{version}"[:50] if version else model
+        with self._lock:
+            self._window.setdefault((model_version, symbol, timeframe), RollingErrors()).add(predicted, actual)
+            self._totals.setdefault((model, symbol), RollingErrors()).add(predicted, actual)
+            detector = self._drift.get((model, symbol))
+            if detector is None:
+                detector = self._drift[(model, symbol)] = DriftDetector(20, 500)
+            detector.add(abs(predicted - actual) / actual * 100)
+            self.observations += 1
+            drifting = detector.drifting(self.drift_ratio, self.drift_min_samples)
+
+        if drifting:
+            self._report_drift(model, symbol, detector)
+
+    def _report_drift(self, model: str, symbol: str, detector: DriftDetector):
+        now = time.monotonic()
+        if now - self._drift_fired.get(symbol, -math.inf) < self.drift_cooldown:
+            return
+        self._drift_fired[symbol] = now
+        self.drift_events += 1
+        logger.warning(
+            f"Drift in {model} for {symbol}: recent error {detector.fast:.2f}% vs long-run {detector.slow:.2f}%"
+        )
+        if self.on_drift is not None:
+            self.on_drift(symbol, model)
+
+    def maybe_flush(self):
+        if time.monotonic() < self._next_flush:
+            return
+        self._next_flush = time.monotonic() + self.flush_interval
+        with self._lock:
+            window, self._window = self._window, {}
+        if not window or self.sink is None:
+            return
+
+        evaluated_at = datetime.now(timezone.utc)
+        rows = [
+            (model_version, symbol, timeframe, evaluated_at,
+             _clamp(errors.mae, 999999.9999), _clamp(errors.mse, 999999.9999),
+             _clamp(errors.r_squared, 9.9999), errors.count)
+            for (model_version, symbol, timeframe), errors in window.items()
+        ]
+        try:
+            self.sink.write(rows)
+            self.flushed_rows += len(rows)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Error writing {len(rows)} model performance rows: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            models = {
+                f"{model}/{symbol}": {
+                    "samples": errors.count,
+                    "mae_pct": errors.mae,
+                    "mse_pct": errors.mse,
+                    "r_squared": errors.r_squared,
+                    "recent_mae_pct": self._drift[(model, symbol)].fast,
+                }
+                for (model, symbol), errors in self._totals.items()
+            }
+        return {
+            "observations": self.observations,
+            "flushed_rows": self.flushed_rows,
+            "drift_events": self.drift_events,
+            "write_errors": self.errors,
+            "models": models,
+        }
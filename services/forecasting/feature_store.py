@@ -0,0 +1,206 @@
+import math
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+BAR_COLUMNS = ["open", "high", "low", "close", "volume"]
+FEATURE_NAMES = ["return", "volatility", "rsi", "sma_fast", "sma_slow", "volume_z"]
+
+
+class NoCandles(ValueError):
+    """The store holds no bars of a symbol"""
+
+
+class _RollingSum:
+    """Sum and sum of squares over the last ``window`` values, fed one value at a time"""
+
+    __slots__ = ("window", "total", "squares")
+
+    def __init__(self, window: int):
+        self.window = window
+        self.total = 0.0
+        self.squares = 0.0
+
+    def push(self, new: float, old: Optional[float]):
+        self.total += new
+        self.squares += new * new
+        if old is not None:
+            self.total -= old
+            self.squares -= old * old
+
+    def reset(self, values: np.ndarray):
+        self.total = float(values.sum())
+        self.squares = float((values * values).sum())
+
+    def mean(self) -> float:
+        return self.total / self.window
+
+    def std(self) -> float:
+        mean = self.total / self.window
+        return math.sqrt(max(self.squares / self.window - mean * mean, 0.0))
+
+
+class SymbolFeatures:
+    """Ring buffers of one symbol's closed bars and the features derived from them.
+
+    Every bar updates the features in O(1): rolling sums gain the new value and
+    lose the one leaving the window (read back from the ring), RSI uses Wilder's
+    smoothing. The sums are recomputed from the ring each time it wraps, so
+    floating-point error cannot build up. Features without enough bars yet are NaN.
+    """
+
+    def __init__(self, capacity: int, fast: int, slow: int, volatility: int, rsi: int, volume: int):
+        if capacity <= max(fast, slow, volatility, rsi, volume):
+            raise ValueError("capacity must exceed the longest feature window")
+        self.capacity = capacity
+        self.starts = np.zeros(capacity, dtype=np.int64)
+        self.bars = np.zeros((capacity, len(BAR_COLUMNS)), dtype=np.float64)
+        self.features = np.full((capacity, len(FEATURE_NAMES)), np.nan)
+        self.count = 0
+        self._fast = _RollingSum(fast)
+        self._slow = _RollingSum(slow)
+        self._returns = _RollingSum(volatility)
+        self._volume = _RollingSum(volume)
+        self._rsi_period = rsi
+        self._gain = 0.0
+        self._loss = 0.0
+
+    @property
+    def last_start(self) -> Optional[int]:
+        return int(self.starts[(self.count - 1) % self.capacity]) if self.count else None
+
+    def _back(self, column: np.ndarray, lag: int) -> Optional[float]:
+        """Value ``lag`` bars before the one being added, None before the first bar"""
+        return float(column[(self.count - lag) % self.capacity]) if self.count >= lag else None
+
+    def add(self, start: int, bar: np.ndarray):
+        i = self.count % self.capacity
+        close, volume = float(bar[3]), float(bar[4])
+        previous = self._back(self.bars[:, 3], 1)
+
+        change = close - previous if previous is not None else 0.0
+        ret = math.log(close / previous) if previous and close > 0 else 0.0
+        self._fast.push(close, self._back(self.bars[:, 3], self._fast.window))
+        self._slow.push(close, self._back(self.bars[:, 3], self._slow.window))
+        self._returns.push(ret, self._back(self.features[:, 0], self._returns.window))
+        self._volume.push(volume, self._back(self.bars[:, 4], self._volume.window))
+
+        # Wilder's RSI: plain average over the first period, exponential afterwards
+        period = self._rsi_period
+        gain, loss = max(change, 0.0), max(-change, 0.0)
+        if self.count <= period:
+            self._gain += gain / period
+            self._loss += loss / period
+        else:
+            self._gain += (gain - self._gain) / period
+            self._loss += (loss - self._loss) / period
+
+        self.starts[i] = start
+        self.bars[i] = bar
+        n = self.count + 1
+        self.features[i] = (
+            ret,
+            self._returns.std() if n > self._returns.window else np.nan,
+            (100.0 - 100.0 / (1.0 + self._gain / self._loss) if self._loss else 100.0) if n > period else np.nan,
+            self._fast.mean() if n >= self._fast.window else np.nan,
+            self._slow.mean() if n >= self._slow.window else np.nan,
+            ((volume - self._volume.mean()) / self._volume.std() if self._volume.std() else 0.0)
+            if n >= self._volume.window else np.nan,
+        )
+        self.count = n
+        if i == self.capacity - 1:
+            self._resync()
+
+    def _resync(self):
+        for rolling, values in (
+            (self._fast, self.bars[:, 3]), (self._slow, self.bars[:, 3]),
+            (self._returns, self.features[:, 0]), (self._volume, self.bars[:, 4]),
+        ):
+            rolling.reset(self.tail(values, rolling.window))
+
+    def tail(self, column: np.ndarray, n: int) -> np.ndarray:
+        """Last ``n`` rows of a ring-ordered array, oldest first"""
+        n = min(n, self.count, self.capacity)
+        end = self.count % self.capacity
+        if n <= end:
+            return column[end - n:end].copy()
+        return np.concatenate([column[end - n:], column[:end]])
+
+
+class FeatureStore:
+    """Rolling bars and technical features per symbol, fed by closed candles.
+
+    Forecast requests reference a symbol and a window instead of sending the
+    bars; :meth:`window` returns the latest bars as the OHLCV matrix the models
+    take. Symbols are created on their first bar. Thread-safe: candles are added
+    by the consumer thread while requests read.
+    """
+
+    def __init__(self, capacity: int = 2000, fast: int = 10, slow: int = 50,
+                 volatility: int = 20, rsi: int = 14, volume: int = 20):
+        self.capacity = capacity
+        self._windows = dict(fast=fast, slow=slow, volatility=volatility, rsi=rsi, volume=volume)
+        self._symbols: Dict[str, SymbolFeatures] = {}
+        self._lock = threading.Lock()
+        self.bars = 0
+        self.skipped = 0
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._symbols
+
+    def add(self, symbol: str, start: int, open: float, high: float, low: float, close: float, volume: float) -> bool:
+        """Append a closed bar; repeated or older bars are skipped"""
+        with self._lock:
+            features = self._symbols.get(symbol)
+            if features is None:
+                features = self._symbols[symbol] = SymbolFeatures(self.capacity, **self._windows)
+            last = features.last_start
+            if last is not None and start <= last:
+                self.skipped += 1
+                return False
+            features.add(start, np.array([open, high, low, close, volume], dtype=np.float64))
+            self.bars += 1
+            return True
+
+    def load(self, symbol: str, starts: np.ndarray, bars: np.ndarray) -> int:
+        """Backfill from history (e.g. the training source); returns the bars taken"""
+        order = np.argsort(starts, kind="stable")
+        return sum(self.add(symbol, int(starts[i]), *bars[i]) for i in order[-self.capacity:])
+
+    def window(self, symbol: str, n: int) -> np.ndarray:
+        """The last ``n`` (or fewer) bars as OHLCV rows, oldest first"""
+        with self._lock:
+            features = self._symbols.get(symbol)
+            if features is None or not features.count:
+                raise NoCandles(f"no candles for {symbol}")
+            return features.tail(features.bars, n)
+
+    def history(self, symbol: str, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Bar starts and OHLCV rows of the last ``n`` (or fewer) bars, read together"""
+        with self._lock:
+            features = self._symbols.get(symbol)
+            if features is None or not features.count:
+                raise NoCandles(f"no candles for {symbol}")
+            return features.tail(features.starts, n), features.tail(features.bars, n)
+
+    def latest(self, symbol: str, n: int = 1) -> List[Dict[str, Any]]:
+        """The last ``n`` bars with their features; features not ready yet are None"""
+        with self._lock:
+            features = self._symbols.get(symbol)
+            if features is None or not features.count:
+                raise NoCandles(f"no candles for {symbol}")
+            starts = features.tail(features.starts, n)
+            bars = features.tail(features.bars, n)
+            derived = features.tail(features.features, n)
+        return [
+            {
+                "start": int(start),
+                **dict(zip(BAR_COLUMNS, bar.tolist())),
+                **{name: (None if math.isnan(value) else value) for name, value in zip(FEATURE_NAMES, row.tolist())},
+            }
+            for start, bar, row in zip(starts, bars, derived)
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"symbols": len(self._symbols), "bars": self.bars, "skipped": self.skipped}
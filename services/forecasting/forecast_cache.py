@@ -0,0 +1,88 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+
+def forecast_key(symbol: str, features: np.ndarray, horizon: int, versions: Dict[str, Optional[str]]) -> bytes:
+    """Content address of a forecast: same inputs and model versions, same key"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{symbol}|{horizon}|".encode())
+    digest.update(repr(sorted(versions.items())).encode())
+    digest.update(np.ascontiguousarray(features, dtype=np.float64).tobytes())
+    return digest.digest()
+
+
+def seed_from_key(key: bytes) -> int:
+    """RNG seed derived from the key, so a recomputed forecast equals the cached one"""
+    return int.from_bytes(key[:8], "big")
+
+
+class ForecastCache:
+    """LRU cache of forecast outputs with a per-entry TTL.
+
+    Entries remember the model versions they were computed with; when a model is
+    swapped, :meth:`invalidate_model` drops every entry that used it. Each entry
+    also keeps how long it took to compute, so hits add up the time saved.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[bytes, Tuple[float, float, Dict[str, Optional[str]], Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        self.invalidated = 0
+        self.saved_seconds = 0.0
+
+    def get(self, key: bytes) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, compute_seconds, _, value = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += compute_seconds
+            return value
+
+    def put(self, key: bytes, value: Any, versions: Dict[str, Optional[str]], compute_seconds: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, compute_seconds, versions, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+
+    def invalidate_model(self, name: str):
+        """Drop entries computed with any version of ``name``"""
+        with self._lock:
+            stale = [key for key, (_, _, versions, _) in self._entries.items() if name in versions]
+            for key in stale:
+                del self._entries[key]
+            self.invalidated += len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else None,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "invalidated": self.invalidated,
+            "saved_compute_seconds": self.saved_seconds,
+        }
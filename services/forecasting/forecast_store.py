@@ -0,0 +1,233 @@
+import json
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# PricePrediction timeframes by length in hours (forecast steps are hourly)
+TIMEFRAMES = [(1, "1h"), (4, "4h"), (24, "1d"), (72, "3d"), (168, "7d")]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS forecasts (
+    forecast_id TEXT PRIMARY KEY,
+    symbol TEXT NOT NULL,
+    prediction_timestamp TEXT NOT NULL,
+    target_timestamp TEXT NOT NULL,
+    timeframe TEXT NOT NULL,
+    predicted_price REAL NOT NULL,
+    confidence_level TEXT NOT NULL,
+    confidence_score REAL NOT NULL,
+    model_version TEXT NOT NULL,
+    actual_price REAL,
+    prediction_error REAL,
+    horizon INTEGER NOT NULL,
+    models TEXT NOT NULL,
+    paths BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS forecasts_symbol_target ON forecasts (symbol, target_timestamp);
+"""
+
+
+class StoredForecast:
+    """What the evaluator needs of a forecast: every model's path over the horizon"""
+
+    __slots__ = ("forecast_id", "symbol", "prediction_timestamp", "timeframe", "target_step", "versions", "models", "paths")
+
+    def __init__(self, forecast_id: str, symbol: str, prediction_timestamp: datetime, timeframe: str,
+                 target_step: int, versions: Dict[str, Optional[str]], models: List[str], paths: np.ndarray):
+        self.forecast_id = forecast_id
+        self.symbol = symbol
+        self.prediction_timestamp = prediction_timestamp
+        self.timeframe = timeframe
+        self.target_step = target_step
+        self.versions = versions
+        self.models = models
+        self.paths = paths
+
+    def step_at(self, timestamp: Optional[datetime]) -> int:
+        """1-based forecast step closest to ``timestamp``, the target step if unknown"""
+        if timestamp is None:
+            return self.target_step
+        hours = round((timestamp - self.prediction_timestamp).total_seconds() / 3600)
+        return min(max(hours, 1), self.paths.shape[1])
+
+
+def _timeframe(horizon: int) -> Tuple[int, str]:
+    eligible = [tf for tf in TIMEFRAMES if tf[0] <= horizon]
+    return eligible[-1] if eligible else (horizon, TIMEFRAMES[0][1])
+
+
+def _confidence(price: float, lower: float, upper: float) -> Tuple[str, float]:
+    # Narrower 95% band relative to the price means higher confidence
+    score = min(max(100 * (1 - (upper - lower) / abs(price)), 0.0), 100.0) if price else 0.0
+    return ("HIGH" if score >= 90 else "MEDIUM" if score >= 75 else "LOW"), round(score, 2)
+
+
+class ForecastStore:
+    """Forecasts persisted to SQLite in batches and indexed by ``forecast_id``.
+
+    Rows carry the fields of the backend's PricePrediction (the target is the
+    longest PricePrediction timeframe within the horizon) plus every model's full
+    path as a float32 blob. :meth:`add` only appends to a buffer; a writer thread
+    inserts the buffer in one transaction every ``flush_interval`` seconds or once
+    ``batch_size`` rows are waiting. The most recent ``index_size`` forecasts are
+    also kept in memory, so joining an actual price rarely touches the disk; older
+    ones and those made by other workers are read back from the file.
+    """
+
+    def __init__(self, path: str, batch_size: int = 500, flush_interval: float = 1.0, index_size: int = 100000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.index_size = index_size
+        self._index: "OrderedDict[str, StoredForecast]" = OrderedDict()
+        self._pending: List[tuple] = []
+        self._actuals: List[tuple] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._read_conn = threading.local()
+        self.written = 0
+        self.index_hits = 0
+        self.disk_hits = 0
+        self.not_found = 0
+        self.errors = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def start(self) -> threading.Thread:
+        self._conn = self._connect()
+        self._conn.executescript(SCHEMA)
+        self._thread = threading.Thread(target=self._run, name="forecast-store", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self, timeout: Optional[float] = 10.0):
+        """Stop the writer thread and write whatever is still buffered"""
+        self._stopping.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                logger.error("Forecast writer did not stop; buffered forecasts may be lost")
+                return
+        if self._conn is not None:
+            # Rows added while the thread made its last pass
+            self.flush()
+
+    def add(self, forecast: Dict[str, Any], versions: Dict[str, Optional[str]]):
+        predictions = forecast["predictions"]
+        models = ["ensemble"] + list(predictions["models"])
+        paths = np.array(
+            [predictions["ensemble"]] + list(predictions["models"].values()), dtype=np.float32
+        )
+        hours, timeframe = _timeframe(forecast["horizon"])
+        predicted_at = datetime.fromisoformat(forecast["timestamp"])
+        target = hours - 1
+        level, score = _confidence(
+            predictions["ensemble"][target], predictions["lower_bound"][target], predictions["upper_bound"][target]
+        )
+        stored = StoredForecast(
+            forecast["forecast_id"], forecast["symbol"], predicted_at, timeframe, hours, versions, models, paths
+        )
+        row = (
+            stored.forecast_id, stored.symbol, predicted_at.isoformat(),
+            (predicted_at + timedelta(hours=hours)).isoformat(), timeframe,
+            float(predictions["ensemble"][target]), level, score, json.dumps(versions),
+            forecast["horizon"], json.dumps(models), paths.tobytes(),
+        )
+        with self._lock:
+            self._index[stored.forecast_id] = stored
+            if len(self._index) > self.index_size:
+                self._index.popitem(last=False)
+            self._pending.append(row)
+            if len(self._pending) >= self.batch_size:
+                self._wake.set()
+
+    def lookup(self, forecast_id: str) -> Optional[StoredForecast]:
+        stored = self._index.get(forecast_id)
+        if stored is not None:
+            self.index_hits += 1
+            return stored
+
+        conn = getattr(self._read_conn, "conn", None)
+        if conn is None:
+            conn = self._read_conn.conn = self._connect()
+        row = conn.execute(
+            "SELECT symbol, prediction_timestamp, timeframe, model_version, horizon, models, paths "
+            "FROM forecasts WHERE forecast_id = ?", (forecast_id,)
+        ).fetchone()
+        if row is None:
+            self.not_found += 1
+            return None
+        self.disk_hits += 1
+        symbol, predicted_at, timeframe, versions, horizon, models, paths = row
+        models = json.loads(models)
+        hours = dict((name, h) for h, name in TIMEFRAMES).get(timeframe, horizon)
+        return StoredForecast(
+            forecast_id, symbol, datetime.fromisoformat(predicted_at), timeframe, hours,
+            json.loads(versions), models, np.frombuffer(paths, dtype=np.float32).reshape(len(models), horizon)
+        )
+
+    def record_actual(self, forecast_id: str, actual_price: float, prediction_error: float):
+        """Queue the PricePrediction ``actual_price``/``prediction_error`` update"""
+        with self._lock:
+            self._actuals.append((actual_price, prediction_error, forecast_id))
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Error writing forecasts: {e}")
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+            actuals, self._actuals = self._actuals, []
+        if not pending and not actuals:
+            return
+        try:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO forecasts (forecast_id, symbol, prediction_timestamp, target_timestamp, "
+                    "timeframe, predicted_price, confidence_level, confidence_score, model_version, horizon, models, paths) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", pending
+                )
+                self._conn.executemany(
+                    "UPDATE forecasts SET actual_price = ?, prediction_error = ? WHERE forecast_id = ?", actuals
+                )
+        except Exception:
+            # Keep the rows for the next attempt, within bounds
+            limit = self.batch_size * 100
+            with self._lock:
+                self._pending = (pending + self._pending)[-limit:]
+                self._actuals = (actuals + self._actuals)[-limit:]
+            raise
+        self.written += len(pending)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "written": self.written,
+            "pending": len(self._pending),
+            "indexed": len(self._index),
+            "index_hits": self.index_hits,
+            "disk_hits": self.disk_hits,
+            "not_found": self.not_found,
+            "write_errors": self.errors,
+        }
@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from artifacts import ArtifactStore
+
+logger = logging.getLogger(__name__)
+
+
+def _rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+class ModelRegistry:
+    """Loads versioned models on first use instead of at import time.
+
+    Each model is registered with a loader that does its own heavy imports and
+    deserializes one version directory of the :class:`ArtifactStore`, so a worker
+    only pays for the models it actually serves. Loads are serialized per model,
+    record their duration and the process RSS growth they caused, and can be
+    started ahead of traffic with :meth:`warm_up`.
+
+    When the store's current version changes (a publish from this or any other
+    worker), :meth:`reload` loads the new version next to the old one and swaps a
+    single reference. Requests that already hold the old model finish on it.
+
+    Per-symbol variants (``<name>.<symbol>``, published by retraining) are served
+    through :meth:`resolve`, which falls back to the shared model.
+    """
+
+    def __init__(self, store: ArtifactStore):
+        self.store = store
+        self._loaders: Dict[str, Callable[[str], Any]] = {}
+        self._bootstraps: Dict[str, Optional[Callable[[str], None]]] = {}
+        self._models: Dict[str, Any] = {}
+        self._versions: Dict[str, str] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        # Variants known to have no published version, rechecked on every watch tick
+        self._missing: Set[str] = set()
+        self._swap_listeners: List[Callable[[str], None]] = []
+        self.load_info: Dict[str, Dict[str, Any]] = {}
+
+    def register(self, name: str, loader: Callable[[str], Any], bootstrap: Optional[Callable[[str], None]] = None):
+        """``loader(directory)`` reads a version; ``bootstrap(directory)`` writes one if none exists"""
+        self._loaders[name] = loader
+        self._bootstraps[name] = bootstrap
+        self._locks[name] = threading.Lock()
+        self.load_info[name] = {
+            "loaded": False, "version": None, "loaded_at": None,
+            "load_seconds": None, "memory_bytes": None, "swaps": 0, "error": None,
+        }
+
+    def on_swap(self, listener: Callable[[str], None]):
+        """Call ``listener(name)`` whenever a loaded model is replaced by a new version"""
+        self._swap_listeners.append(listener)
+
+    def names(self) -> List[str]:
+        return list(self._loaders)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._loaders
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def version(self, name: str) -> Optional[str]:
+        """Version currently served by this worker"""
+        return self._versions.get(name)
+
+    def resolve(self, name: str, symbol: str) -> str:
+        """Name of the model serving ``symbol``: its own variant if published, else ``name``"""
+        if not symbol.isalnum():
+            return name
+        key = f"{name}.{symbol}"
+        if key in self._loaders:
+            return key
+        if key in self._missing or self.store.current_version(key) is None:
+            self._missing.add(key)
+            return name
+        self.register(key, self._loaders[name])
+        return key
+
+    def _current_version(self, name: str) -> str:
+        version = self.store.current_version(name)
+        if version is None:
+            bootstrap = self._bootstraps[name]
+            if bootstrap is None:
+                raise RuntimeError(f"No published version of model {name}")
+            version = self.store.publish(name, bootstrap, {"source": "bootstrap"})
+            logger.info(f"Published initial version {version} of model {name}")
+        return version
+
+    def _load(self, name: str, version: str):
+        started = time.perf_counter()
+        rss_before = _rss_bytes()
+        try:
+            model = self._loaders[name](self.store.path(name, version))
+        except Exception as e:
+            self.load_info[name]["error"] = str(e)
+            raise
+        rss_after = _rss_bytes()
+
+        swapped = name in self._models
+        # Single reference swap: in-flight callers keep the object they already got
+        self._models[name] = model
+        self._versions[name] = version
+        info = self.load_info[name]
+        info.update({
+            "loaded": True,
+            "version": version,
+            "loaded_at": datetime.utcnow().isoformat(),
+            "load_seconds": time.perf_counter() - started,
+            "memory_bytes": rss_after - rss_before if rss_before and rss_after else None,
+            "swaps": info["swaps"] + swapped,
+            "error": None,
+        })
+        logger.info(f"Loaded model {name} version {version} in {info['load_seconds']:.2f}s")
+        if swapped:
+            for listener in self._swap_listeners:
+                listener(name)
+        return model
+
+    def get(self, name: str) -> Any:
+        """Return a model, loading it on this thread if needed"""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        with self._locks[name]:
+            if name in self._models:
+                return self._models[name]
+            return self._load(name, self._current_version(name))
+
+    async def aget(self, name: str) -> Any:
+        """Return a model, loading it off the event loop if needed"""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        return await asyncio.get_running_loop().run_in_executor(None, self.get, name)
+
+    def reload(self, name: str) -> bool:
+        """Swap in the store's current version if it differs from the loaded one"""
+        if name not in self._models:
+            return False
+        with self._locks[name]:
+            version = self.store.current_version(name)
+            if version is None or version == self._versions.get(name):
+                return False
+            self._load(name, version)
+            return True
+
+    def publish(self, name: str, save: Callable[[str], None], meta: Optional[Dict[str, Any]] = None) -> str:
+        """Publish a new version and hot-swap it in this worker"""
+        version = self.store.publish(name, save, meta)
+        self.refresh([name])
+        return version
+
+    def refresh(self, names: Iterable[str]):
+        """Pick up versions just published for ``names``, including new variants"""
+        for name in names:
+            self._missing.discard(name)
+            self.reload(name)
+
+    def watch(self, interval: float) -> threading.Thread:
+        """Poll the store in a background thread and swap in versions published elsewhere"""
+        def poll():
+            while True:
+                time.sleep(interval)
+                self._missing.clear()
+                for name in list(self._models):
+                    try:
+                        self.reload(name)
+                    except Exception as e:
+                        logger.error(f"Reload of model {name} failed: {e}")
+
+        thread = threading.Thread(target=poll, name="model-watch", daemon=True)
+        thread.start()
+        return thread
+
+    def warm_up(self, names: Iterable[str]) -> threading.Thread:
+        """Load models in a background thread"""
+        def load_all():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    logger.error(f"Warm-up of model {name} failed: {e}")
+
+        thread = threading.Thread(target=load_all, name="model-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: dict(info) for name, info in self.load_info.items()}
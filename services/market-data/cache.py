@@ -0,0 +1,113 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+
+class TieredCache:
+    """Two-tier cache of pre-serialized JSON response bodies.
+
+    L1 is a bounded in-process LRU, L2 is Redis. Values are serialized once when
+    loaded, so hot reads hand the stored bytes straight to the response without a
+    JSON decode/encode or model rebuild. An L1 entry stays servable for
+    ``stale_ttl`` seconds past its freshness; a stale hit is answered immediately
+    while a single background task reloads it (stale-while-revalidate).
+    """
+
+    def __init__(self, redis_client, flight: SingleFlight, max_entries: int = 256):
+        self.redis = redis_client
+        self.flight = flight
+        self.max_entries = max_entries
+        # key -> (body, fresh_until, stale_until) on the monotonic clock
+        self._entries: "OrderedDict[str, Tuple[bytes, float, float]]" = OrderedDict()
+        self.counters = {
+            "l1": {"hits": 0, "stale_hits": 0, "misses": 0, "evictions": 0},
+            "l2": {"hits": 0, "misses": 0},
+            "loads": 0,
+            "load_errors": 0,
+        }
+
+    async def get(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: int,
+        stale_ttl: int = 0
+    ) -> bytes:
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            body, fresh_until, stale_until = entry
+            if now < fresh_until:
+                self.counters["l1"]["hits"] += 1
+                self._entries.move_to_end(key)
+                return body
+            if now < stale_until:
+                self.counters["l1"]["stale_hits"] += 1
+                self._entries.move_to_end(key)
+                asyncio.ensure_future(self._revalidate(key, loader, ttl, stale_ttl))
+                return body
+        self.counters["l1"]["misses"] += 1
+
+        # Fall back to Redis, honouring the remaining TTL so L1 never outlives L2
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.get(key)
+            pipe.pttl(key)
+            cached, remaining_ms = await pipe.execute()
+        if cached is not None and remaining_ms > 0:
+            self.counters["l2"]["hits"] += 1
+            body = cached.encode() if isinstance(cached, str) else cached
+            self._store(key, body, remaining_ms / 1000, stale_ttl)
+            return body
+        self.counters["l2"]["misses"] += 1
+
+        return await self.refresh(key, loader, ttl, stale_ttl)
+
+    async def refresh(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: int,
+        stale_ttl: int = 0
+    ) -> bytes:
+        """Load a value, write it through both tiers and return its serialized body"""
+        return await self.flight.do(key, lambda: self._load(key, loader, ttl, stale_ttl))
+
+    def invalidate(self, key: str):
+        self._entries.pop(key, None)
+
+    async def _load(self, key, loader, ttl, stale_ttl) -> bytes:
+        self.counters["loads"] += 1
+        try:
+            value = await loader()
+        except Exception:
+            self.counters["load_errors"] += 1
+            raise
+        body = json.dumps(value).encode()
+        await self.redis.setex(key, ttl, body)
+        self._store(key, body, ttl, stale_ttl)
+        return body
+
+    async def _revalidate(self, key, loader, ttl, stale_ttl):
+        try:
+            await self.refresh(key, loader, ttl, stale_ttl)
+        except Exception as e:
+            # Keep serving the stale copy until its window runs out
+            logger.warning(f"Background refresh of {key} failed: {e}")
+
+    def _store(self, key: str, body: bytes, ttl: float, stale_ttl: float):
+        now = time.monotonic()
+        self._entries[key] = (body, now + ttl, now + ttl + stale_ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.counters["l1"]["evictions"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), **self.counters}
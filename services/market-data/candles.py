@@ -0,0 +1,257 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import influxdb_client
+import psycopg2
+from influxdb_client.client.write_api import SYNCHRONOUS
+from psycopg2.extras import execute_values
+
+logger = logging.getLogger(__name__)
+
+INTERVALS_MS = {
+    "1s": 1000,
+    "1m": 60 * 1000,
+    "5m": 5 * 60 * 1000,
+    "1h": 60 * 60 * 1000,
+    "1d": 24 * 60 * 60 * 1000,
+}
+
+
+class Candle:
+    __slots__ = ("symbol", "interval", "start", "open", "high", "low", "close", "volume", "trades",
+                 "first_trade", "last_trade")
+
+    def __init__(self, symbol: str, interval: str, start: int, price: float, quantity: float, timestamp: int):
+        self.symbol = symbol
+        self.interval = interval
+        self.start = start
+        self.open = self.high = self.low = self.close = price
+        self.volume = quantity
+        self.trades = 1
+        # Trade times behind open and close, so late ticks land in the right place
+        self.first_trade = self.last_trade = timestamp
+
+    def update(self, price: float, quantity: float, timestamp: int):
+        if price > self.high:
+            self.high = price
+        elif price < self.low:
+            self.low = price
+        if timestamp < self.first_trade:
+            self.first_trade = timestamp
+            self.open = price
+        if timestamp >= self.last_trade:
+            # Equal times keep arrival order, like the exchange's trade ids
+            self.last_trade = timestamp
+            self.close = price
+        self.volume += quantity
+        self.trades += 1
+
+
+class CandleAggregator:
+    """Rolls trade ticks into OHLCV bars for several intervals.
+
+    Each tick touches exactly one open bar per interval (a dict lookup on the bucket
+    start), so the cost per tick is O(intervals). A bar stays open until the latest
+    event time seen for its symbol passes the bar's end by ``watermark_ms``; ticks that
+    arrive late but inside that window still update the bar, later ones are counted
+    and dropped. Closed bars are collected until :meth:`drain` is called.
+    """
+
+    def __init__(self, intervals: List[str], watermark_ms: int = 2000):
+        self.intervals = [(name, INTERVALS_MS[name]) for name in intervals]
+        self.watermark_ms = watermark_ms
+        # (symbol, interval) -> {bucket start: bar}; holds at most a few bars each
+        self._open: Dict[Tuple[str, str], Dict[int, Candle]] = {}
+        self._event_time: Dict[str, int] = {}
+        # Lower bound set by advance(), so a bar closed on the wall clock is never reopened
+        self._idle_watermark = 0
+        self._closed: List[Candle] = []
+        self.ticks = 0
+        self.late_dropped = 0
+
+    def add_tick(self, symbol: str, price: float, quantity: float, timestamp: int):
+        self.ticks += 1
+        event_time = self._event_time.get(symbol, timestamp)
+        if timestamp > event_time:
+            event_time = timestamp
+        self._event_time[symbol] = event_time
+        watermark = max(event_time - self.watermark_ms, self._idle_watermark)
+
+        for interval, length in self.intervals:
+            start = timestamp - timestamp % length
+            if start + length <= watermark:
+                self.late_dropped += 1
+                continue
+
+            bars = self._open.setdefault((symbol, interval), {})
+            bar = bars.get(start)
+            if bar is None:
+                bars[start] = Candle(symbol, interval, start, price, quantity, timestamp)
+                self._close_bars(bars, length, watermark)
+            else:
+                bar.update(price, quantity, timestamp)
+
+    def advance(self, now_ms: int):
+        """Close bars of symbols that have gone quiet, using wall-clock time"""
+        watermark = now_ms - self.watermark_ms
+        self._idle_watermark = max(self._idle_watermark, watermark)
+        for (symbol, interval), bars in self._open.items():
+            self._close_bars(bars, INTERVALS_MS[interval], watermark)
+
+    def _close_bars(self, bars: Dict[int, Candle], length: int, watermark: int):
+        for start in [s for s in bars if s + length <= watermark]:
+            self._closed.append(bars.pop(start))
+
+    def drain(self) -> List[Candle]:
+        closed, self._closed = self._closed, []
+        return closed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ticks": self.ticks,
+            "open_bars": sum(len(bars) for bars in self._open.values()),
+            "pending_closed": len(self._closed),
+            "late_dropped": self.late_dropped,
+        }
+
+
+class InfluxCandleSink:
+    """Writes closed bars to the ``candles`` measurement, tagged by symbol and interval"""
+
+    def __init__(self):
+        self.client = influxdb_client.InfluxDBClient(
+            url=os.getenv("INFLUXDB_URL", "http://localhost:8086"),
+            token=os.getenv("INFLUXDB_TOKEN", "my-super-secret-token"),
+            org=os.getenv("INFLUXDB_ORG", "crypto_trading")
+        )
+        self.write_api = self.client.write_api(write_options=SYNCHRONOUS)
+        self.bucket = os.getenv("INFLUXDB_BUCKET", "market_data")
+
+    def write(self, candles: List[Candle]):
+        points = [
+            influxdb_client.Point("candles")
+            .tag("symbol", c.symbol)
+            .tag("interval", c.interval)
+            .field("open", c.open)
+            .field("high", c.high)
+            .field("low", c.low)
+            .field("close", c.close)
+            .field("volume", c.volume)
+            .field("trades", c.trades)
+            .time(c.start, write_precision=influxdb_client.WritePrecision.MS)
+            for c in candles
+        ]
+        self.write_api.write(bucket=self.bucket, record=points)
+
+
+class PostgresCandleSink:
+    """Upserts closed bars of one interval into the backend's CryptoPriceData table"""
+
+    def __init__(self, dsn: str, interval: str):
+        self.dsn = dsn
+        self.interval = interval
+        self.conn = None
+
+    def write(self, candles: List[Candle]):
+        rows = [
+            (
+                c.symbol,
+                datetime.fromtimestamp(c.start / 1000, tz=timezone.utc),
+                c.open, c.high, c.low, c.close, c.volume
+            )
+            for c in candles if c.interval == self.interval
+        ]
+        if not rows:
+            return
+
+        if self.conn is None or self.conn.closed:
+            self.conn = psycopg2.connect(self.dsn)
+        try:
+            with self.conn, self.conn.cursor() as cursor:
+                execute_values(cursor, """
+                    INSERT INTO api_cryptopricedata
+                        (symbol, timestamp, open_price, high_price, low_price, close_price, volume)
+                    VALUES %s
+                    ON CONFLICT (symbol, timestamp) DO UPDATE SET
+                        open_price = EXCLUDED.open_price,
+                        high_price = EXCLUDED.high_price,
+                        low_price = EXCLUDED.low_price,
+                        close_price = EXCLUDED.close_price,
+                        volume = EXCLUDED.volume
+                """, rows)
+        except psycopg2.InterfaceError:
+            self.conn = None
+            raise
+
+
+class EventCandleSink:
+    """Publishes closed bars as events keyed by symbol, for consumers such as forecasting"""
+
+    def __init__(self, send: Callable[[str, List[dict]], None], topic: str = "candle-events"):
+        self.send = send
+        self.topic = topic
+
+    def write(self, candles: List[Candle]):
+        self.send(self.topic, [
+            {
+                "symbol": c.symbol,
+                "interval": c.interval,
+                "start": c.start,
+                "open": c.open,
+                "high": c.high,
+                "low": c.low,
+                "close": c.close,
+                "volume": c.volume,
+                "trades": c.trades,
+            }
+            for c in candles
+        ])
+
+
+class CandleWriter:
+    """Periodically closes idle bars and flushes closed bars to the sinks in batches"""
+
+    def __init__(self, aggregator: CandleAggregator, sinks: List[Any], flush_interval: float = 1.0):
+        self.aggregator = aggregator
+        self.sinks = sinks
+        self.flush_interval = flush_interval
+        self.flushed = 0
+        self.errors = 0
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.aggregator.advance(int(time.time() * 1000))
+            candles = self.aggregator.drain()
+            if not candles:
+                continue
+
+            # Database clients are blocking, keep them off the event loop
+            for sink in self.sinks:
+                try:
+                    await loop.run_in_executor(None, sink.write, candles)
+                except Exception as e:
+                    self.errors += 1
+                    logger.error(f"Error writing {len(candles)} candles with {type(sink).__name__}: {e}")
+            self.flushed += len(candles)
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.aggregator.stats(), "flushed": self.flushed, "write_errors": self.errors}
+
+
+def build_sinks(
+    postgres_url: Optional[str],
+    postgres_interval: str,
+    send_events: Optional[Callable[[str, List[dict]], None]] = None,
+) -> List[Any]:
+    sinks: List[Any] = [InfluxCandleSink()]
+    if postgres_url:
+        sinks.append(PostgresCandleSink(postgres_url, postgres_interval))
+    if send_events is not None:
+        sinks.append(EventCandleSink(send_events))
+    return sinks
@@ -0,0 +1,179 @@
+import asyncio
+import json
+import logging
+import os
+import random
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import websockets
+
+logger = logging.getLogger(__name__)
+
+BINANCE_WS_URL = os.getenv("BINANCE_WS_URL", "wss://stream.binance.com:9443")
+
+# Binance accepts up to 1024 streams per combined connection; staying well below
+# that keeps a single reconnect from dropping the whole watchlist.
+STREAMS_PER_CONNECTION = int(os.getenv("STREAMS_PER_CONNECTION", 200))
+
+
+class CombinedStreamClient:
+    """A single combined-stream WebSocket connection with reconnect and backoff"""
+
+    def __init__(
+        self,
+        name: str,
+        streams: List[str],
+        on_message: Callable[[str, Dict[str, Any]], None],
+        on_connect: Optional[Callable[[], None]] = None,
+        base_url: str = BINANCE_WS_URL,
+        min_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+    ):
+        self.name = name
+        self.streams = streams
+        self.on_message = on_message
+        self.on_connect = on_connect
+        self.url = f"{base_url.rstrip('/')}/stream?streams={'/'.join(streams)}"
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.connected = False
+        self.connects = 0
+        self.messages = 0
+
+    async def run(self):
+        attempt = 0
+        while True:
+            try:
+                async with websockets.connect(
+                    self.url, ping_interval=20, ping_timeout=20, max_size=2 ** 20
+                ) as ws:
+                    self.connected = True
+                    self.connects += 1
+                    if self.on_connect:
+                        self.on_connect()
+                    logger.info(f"{self.name}: connected ({len(self.streams)} streams)")
+
+                    async for raw in ws:
+                        # Only reset the backoff once the stream is actually delivering,
+                        # otherwise an accept-then-close loop would reconnect at full speed
+                        attempt = 0
+                        self.messages += 1
+                        message = json.loads(raw)
+                        self.on_message(message.get("stream"), message.get("data"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"{self.name}: connection lost: {e}")
+            finally:
+                self.connected = False
+
+            # Exponential backoff with full jitter so a fleet of connections does not
+            # reconnect in lockstep after an exchange-side disconnect
+            delay = random.uniform(0, min(self.max_backoff, self.min_backoff * 2 ** attempt))
+            attempt += 1
+            await asyncio.sleep(delay)
+
+
+class PriceIngestor:
+    """Streams aggregate trades for a watchlist and flushes the latest price per symbol.
+
+    Symbols are spread over as few combined-stream connections as possible. Trades are
+    checked for gaps in the per-symbol aggregate trade id, and the latest price of every
+    symbol that changed is handed to ``sink`` in one batch every ``flush_interval``
+    seconds, so the write rate is bounded by the watchlist size rather than trade volume.
+    Consumers that need every trade (e.g. candle building) register a listener,
+    which is called synchronously with ``(symbol, price, quantity, trade_time_ms)``.
+    """
+
+    def __init__(
+        self,
+        symbols: List[str],
+        sink: Callable[[List[Dict[str, Any]]], Awaitable[None]],
+        base_url: str = BINANCE_WS_URL,
+        streams_per_connection: int = STREAMS_PER_CONNECTION,
+        flush_interval: float = 0.25,
+    ):
+        self.symbols = [s.upper() for s in symbols]
+        self.sink = sink
+        self.flush_interval = flush_interval
+        self.latest: Dict[str, Dict[str, Any]] = {}
+        self.gaps: Dict[str, int] = {}
+        self._dirty: Dict[str, Dict[str, Any]] = {}
+        self._last_trade_id: Dict[str, int] = {}
+        self._listeners: List[Callable[[str, float, float, int], None]] = []
+
+        self.clients = []
+        for i in range(0, len(self.symbols), streams_per_connection):
+            chunk = self.symbols[i:i + streams_per_connection]
+            self.clients.append(CombinedStreamClient(
+                name=f"prices-{len(self.clients)}",
+                streams=[f"{s.lower()}@aggTrade" for s in chunk],
+                on_message=self._handle_message,
+                on_connect=lambda chunk=chunk: self._reset_sequences(chunk),
+                base_url=base_url,
+            ))
+
+    def add_listener(self, listener: Callable[[str, float, float, int], None]):
+        self._listeners.append(listener)
+
+    def _reset_sequences(self, symbols: List[str]):
+        # Trades missed while disconnected are expected, not a gap
+        for symbol in symbols:
+            self._last_trade_id.pop(symbol, None)
+
+    def _handle_message(self, stream: str, data: Dict[str, Any]):
+        if not data or data.get("e") != "aggTrade":
+            return
+
+        symbol = data["s"]
+        trade_id = data["a"]
+        last_id = self._last_trade_id.get(symbol)
+        if last_id is not None:
+            if trade_id <= last_id:
+                return  # Duplicate or replayed trade
+            if trade_id != last_id + 1:
+                self.gaps[symbol] = self.gaps.get(symbol, 0) + 1
+                logger.warning(f"Sequence gap for {symbol}: {last_id} -> {trade_id}")
+        self._last_trade_id[symbol] = trade_id
+
+        price_data = {
+            "symbol": symbol,
+            "price": float(data["p"]),
+            "timestamp": int(data["T"])
+        }
+        self.latest[symbol] = price_data
+        self._dirty[symbol] = price_data
+
+        quantity = float(data["q"])
+        for listener in self._listeners:
+            try:
+                listener(symbol, price_data["price"], quantity, price_data["timestamp"])
+            except Exception as e:
+                logger.error(f"Error in trade listener for {symbol}: {e}")
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if not self._dirty:
+                continue
+            batch, self._dirty = self._dirty, {}
+            try:
+                await self.sink(list(batch.values()))
+            except Exception as e:
+                logger.error(f"Error flushing {len(batch)} prices: {e}")
+
+    async def run(self):
+        await asyncio.gather(
+            self._flush_periodically(),
+            *(client.run() for client in self.clients)
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "symbols": len(self.symbols),
+            "connections": len(self.clients),
+            "connected": sum(1 for c in self.clients if c.connected),
+            "reconnects": sum(max(c.connects - 1, 0) for c in self.clients),
+            "messages": sum(c.messages for c in self.clients),
+            "sequence_gaps": dict(self.gaps),
+        }
@@ -1,15 +1,25 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Query, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-import redis
+import redis.asyncio as redis
 import httpx
 import asyncio
 import json
 import os
-from kafka import KafkaProducer
+from concurrent.futures import ThreadPoolExecutor
+from shared.events import publisher_from_env
 import logging
 from typing import Dict, List, Optional
 from pydantic import BaseModel
 from datetime import datetime
+from ingest import PriceIngestor
+from singleflight import SingleFlight
+from cache import TieredCache
+from candles import CandleAggregator, CandleWriter, build_sinks
+from stream import PriceHub, encode_batch
+from orderbook import OrderBook, OrderBookManager
+from scheduler import (
+    WEIGHT_EXCHANGE_INFO, WEIGHT_TICKER_24HR_ALL, UpstreamScheduler, WeightBudget
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -26,20 +36,74 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Connect to Redis
-redis_client = redis.Redis(
+# Connect to Redis (async client with a bounded pool; callers wait for a free
+# connection instead of opening new ones under load)
+redis_pool = redis.BlockingConnectionPool(
     host=os.getenv("REDIS_HOST", "localhost"),
     port=int(os.getenv("REDIS_PORT", 6379)),
     db=0,
-    decode_responses=True
+    decode_responses=True,
+    max_connections=int(os.getenv("REDIS_MAX_CONNECTIONS", 50)),
+    timeout=5
 )
+redis_client = redis.Redis(connection_pool=redis_pool)
+
+# Kafka publisher (batched, compressed, keyed by symbol)
+publisher = publisher_from_env()
+
+# KafkaProducer.send can block on metadata refreshes and a full buffer, so all
+# sends go through a dedicated thread instead of running on the event loop
+kafka_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kafka-publisher")
+
+def _send_events(topic: str, values: List[dict]):
+    for value in values:
+        publisher.publish(topic, value, key=value.get("symbol"))
+
+def _log_publish_error(future):
+    if not future.cancelled() and future.exception():
+        logger.error(f"Error publishing to Kafka: {future.exception()}")
 
-# Kafka producer
-producer = KafkaProducer(
-    bootstrap_servers=os.getenv("KAFKA_SERVERS", "localhost:9092"),
-    value_serializer=lambda v: json.dumps(v).encode('utf-8')
+def publish_events(topic: str, values: List[dict]):
+    """Hand events to the Kafka producer without blocking the event loop"""
+    future = asyncio.get_running_loop().run_in_executor(kafka_executor, _send_events, topic, values)
+    future.add_done_callback(_log_publish_error)
+
+# Upstream request-weight budget, updated from the headers of every Binance response
+weight_budget = WeightBudget(limit_per_minute=int(os.getenv("BINANCE_WEIGHT_LIMIT", 1200)))
+
+# Shared Binance REST client for the lifetime of the app; keeps HTTP/2
+# connections alive across requests instead of a new handshake per cache miss
+http_client = httpx.AsyncClient(
+    base_url=os.getenv("BINANCE_API_URL", "https://api.binance.com"),
+    http2=True,
+    limits=httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=30),
+    timeout=httpx.Timeout(5.0, connect=3.0),
+    event_hooks={"response": [weight_budget.observe]}
 )
 
+# Concurrent cache misses for the same key share one upstream request
+upstream_calls = SingleFlight()
+
+# Slow-changing responses are served from memory in front of Redis
+response_cache = TieredCache(redis_client, upstream_calls, max_entries=int(os.getenv("L1_CACHE_ENTRIES", 256)))
+
+# Cache policies (fresh TTL, extra seconds a stale copy may be served while refreshing)
+SYMBOLS_TTL = (3600, 600)
+OVERVIEW_TTL = (60, 30)
+
+# Symbols tracked by the background ingestion
+WATCHLIST = [
+    s.strip().upper()
+    for s in os.getenv("MARKET_DATA_SYMBOLS", "BTCUSDT,ETHUSDT,BNBUSDT,ADAUSDT,DOGEUSDT,XRPUSDT").split(",")
+    if s.strip()
+]
+
+# Upper bound on symbols per batch price request (keeps the bulk ticker URL short)
+MAX_BATCH_SYMBOLS = 200
+
+# Fan-out of streamed prices to WebSocket clients
+price_hub = PriceHub(max_symbols_per_client=int(os.getenv("STREAM_MAX_SYMBOLS", 200)))
+
 # Models
 class PriceData(BaseModel):
     symbol: str
@@ -58,16 +122,48 @@ class MarketOverview(BaseModel):
     volume_24h: Dict[str, float]
     change_24h: Dict[str, float]
 
+class OrderBookDepth(BaseModel):
+    symbol: str
+    last_update_id: int
+    bids: List[List[float]]
+    asks: List[List[float]]
+
+class VwapQuote(BaseModel):
+    symbol: str
+    side: str
+    size: float
+    filled: float
+    vwap: Optional[float]
+    levels: int
+    slippage_bps: Optional[float]
+
 @app.get("/")
 async def root():
     return {"message": "Market Data Service is running"}
 
+async def fetch_price(symbol: str) -> dict:
+    """Fetch a symbol's price from Binance and refresh its cache entry"""
+    response = await http_client.get("/api/v3/ticker/price", params={"symbol": symbol})
+    if response.status_code != 200:
+        raise HTTPException(status_code=response.status_code, detail="Failed to fetch price")
+    
+    data = response.json()
+    price_data = {
+        "symbol": symbol,
+        "price": float(data["price"]),
+        "timestamp": int(datetime.now().timestamp() * 1000)
+    }
+    
+    # Cache for 5 seconds
+    await redis_client.setex(f"price:{symbol}", 5, json.dumps(price_data))
+    return price_data
+
 @app.get("/api/v1/market-data/price/{symbol}", response_model=PriceData)
 async def get_price(symbol: str):
     """Get the current price for a specific symbol"""
     try:
         # Try to get from cache first
-        cached = redis_client.get(f"price:{symbol}")
+        cached = await redis_client.get(f"price:{symbol}")
         if cached:
             data = json.loads(cached)
             return PriceData(
@@ -76,140 +172,303 @@ async def get_price(symbol: str):
                 timestamp=data["timestamp"]
             )
         
-        # If not in cache, fetch from Binance
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"https://api.binance.com/api/v3/ticker/price?symbol={symbol}")
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail="Failed to fetch price")
-            
-            data = response.json()
-            price_data = {
-                "symbol": symbol,
-                "price": float(data["price"]),
-                "timestamp": int(datetime.now().timestamp() * 1000)
-            }
-            
-            # Cache for 5 seconds
-            redis_client.setex(f"price:{symbol}", 5, json.dumps(price_data))
-            return PriceData(**price_data)
+        # If not in cache, fetch from Binance (once for all concurrent misses)
+        price_data = await upstream_calls.do(f"price:{symbol}", lambda: fetch_price(symbol))
+        return PriceData(**price_data)
     except Exception as e:
         logger.error(f"Error fetching price for {symbol}: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def request_prices(symbols: List[str]) -> List[dict]:
+    """Fetch several prices from Binance in one bulk call"""
+    response = await http_client.get(
+        "/api/v3/ticker/price",
+        params={"symbols": json.dumps(symbols, separators=(",", ":"))}
+    )
+    if response.status_code != 200:
+        raise HTTPException(status_code=response.status_code, detail="Failed to fetch prices")
+    
+    timestamp = int(datetime.now().timestamp() * 1000)
+    return [
+        {"symbol": data["symbol"], "price": float(data["price"]), "timestamp": timestamp}
+        for data in response.json()
+    ]
+
+async def fetch_prices(symbols: List[str]) -> List[dict]:
+    """Fetch several prices from Binance in one bulk call and refresh their cache entries"""
+    prices = await request_prices(symbols)
+    
+    # Cache for 5 seconds
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for price_data in prices:
+            pipe.setex(f"price:{price_data['symbol']}", 5, json.dumps(price_data))
+        await pipe.execute()
+    return prices
+
+@app.get("/api/v1/market-data/prices", response_model=List[PriceData])
+async def get_prices(symbols: str):
+    """Get the current prices for a comma-separated list of symbols"""
+    requested = list(dict.fromkeys(s.strip().upper() for s in symbols.split(",") if s.strip()))
+    if not requested:
+        raise HTTPException(status_code=400, detail="No symbols requested")
+    if len(requested) > MAX_BATCH_SYMBOLS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SYMBOLS} symbols per request")
+    
+    try:
+        # Read every cached price in a single round trip
+        cached = await redis_client.mget([f"price:{symbol}" for symbol in requested])
+        prices = {}
+        missing = []
+        for symbol, value in zip(requested, cached):
+            if value:
+                prices[symbol] = json.loads(value)
+            else:
+                missing.append(symbol)
+        
+        # Fetch only the missing symbols, in one bulk call
+        if missing:
+            missing.sort()
+            fetched = await upstream_calls.do(f"prices:{','.join(missing)}", lambda: fetch_prices(missing))
+            for price_data in fetched:
+                prices[price_data["symbol"]] = price_data
+        
+        return [PriceData(**prices[symbol]) for symbol in requested if symbol in prices]
+    except Exception as e:
+        logger.error(f"Error fetching prices for {requested}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def fetch_symbols() -> List[dict]:
+    """Fetch the tradable symbols from Binance"""
+    response = await http_client.get("/api/v3/exchangeInfo")
+    if response.status_code != 200:
+        raise HTTPException(status_code=response.status_code, detail="Failed to fetch symbols")
+    
+    data = response.json()
+    symbols = []
+    for symbol_data in data["symbols"]:
+        if symbol_data["status"] == "TRADING":
+            symbols.append(SymbolInfo(
+                symbol=symbol_data["symbol"],
+                name=symbol_data["symbol"],
+                base_asset=symbol_data["baseAsset"],
+                quote_asset=symbol_data["quoteAsset"]
+            ).dict())
+    
+    return symbols
+
 @app.get("/api/v1/market-data/symbols", response_model=List[SymbolInfo])
 async def get_symbols():
     """Get list of available trading symbols"""
     try:
-        # Try to get from cache first
-        cached = redis_client.get("symbols")
-        if cached:
-            return json.loads(cached)
-        
-        # If not in cache, fetch from Binance
-        async with httpx.AsyncClient() as client:
-            response = await client.get("https://api.binance.com/api/v3/exchangeInfo")
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail="Failed to fetch symbols")
-            
-            data = response.json()
-            symbols = []
-            for symbol_data in data["symbols"]:
-                if symbol_data["status"] == "TRADING":
-                    symbols.append(SymbolInfo(
-                        symbol=symbol_data["symbol"],
-                        name=symbol_data["symbol"],
-                        base_asset=symbol_data["baseAsset"],
-                        quote_asset=symbol_data["quoteAsset"]
-                    ))
-            
-            # Cache for 1 hour
-            redis_client.setex("symbols", 3600, json.dumps([s.dict() for s in symbols]))
-            return symbols
+        # Served from memory or Redis, fetched from Binance only when both miss
+        body = await response_cache.get("symbols", fetch_symbols, *SYMBOLS_TTL)
+        return Response(content=body, media_type="application/json")
     except Exception as e:
         logger.error(f"Error fetching symbols: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def fetch_market_overview() -> dict:
+    """Fetch 24h ticker data from Binance"""
+    symbols = set(WATCHLIST)
+    prices = {}
+    volume_24h = {}
+    change_24h = {}
+    
+    # Get 24h ticker data
+    response = await http_client.get("/api/v3/ticker/24hr")
+    if response.status_code != 200:
+        raise HTTPException(status_code=response.status_code, detail="Failed to fetch market data")
+    
+    data = response.json()
+    for ticker in data:
+        if ticker["symbol"] in symbols:
+            symbol = ticker["symbol"]
+            prices[symbol] = float(ticker["lastPrice"])
+            volume_24h[symbol] = float(ticker["volume"])
+            change_24h[symbol] = float(ticker["priceChangePercent"])
+    
+    overview = {
+        "prices": prices,
+        "timestamp": int(datetime.now().timestamp() * 1000),
+        "volume_24h": volume_24h,
+        "change_24h": change_24h
+    }
+    
+    return overview
+
 @app.get("/api/v1/market-data/overview", response_model=MarketOverview)
 async def get_market_overview():
     """Get an overview of the market with prices, volumes, and 24h changes"""
     try:
-        # Try to get from cache first
-        cached = redis_client.get("market_overview")
-        if cached:
-            return json.loads(cached)
-        
-        # If not in cache, fetch from Binance
-        symbols = ["BTCUSDT", "ETHUSDT", "BNBUSDT", "ADAUSDT", "DOGEUSDT", "XRPUSDT"]
-        prices = {}
-        volume_24h = {}
-        change_24h = {}
-        
-        async with httpx.AsyncClient() as client:
-            # Get 24h ticker data
-            response = await client.get("https://api.binance.com/api/v3/ticker/24hr")
-            if response.status_code != 200:
-                raise HTTPException(status_code=response.status_code, detail="Failed to fetch market data")
-            
-            data = response.json()
-            for ticker in data:
-                if ticker["symbol"] in symbols:
-                    symbol = ticker["symbol"]
-                    prices[symbol] = float(ticker["lastPrice"])
-                    volume_24h[symbol] = float(ticker["volume"])
-                    change_24h[symbol] = float(ticker["priceChangePercent"])
-            
-            overview = {
-                "prices": prices,
-                "timestamp": int(datetime.now().timestamp() * 1000),
-                "volume_24h": volume_24h,
-                "change_24h": change_24h
-            }
-            
-            # Cache for 60 seconds
-            redis_client.setex("market_overview", 60, json.dumps(overview))
-            return overview
+        # Served from memory or Redis, fetched from Binance only when both miss
+        body = await response_cache.get("market_overview", fetch_market_overview, *OVERVIEW_TTL)
+        return Response(content=body, media_type="application/json")
     except Exception as e:
         logger.error(f"Error fetching market overview: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.websocket("/api/v1/market-data/stream")
+async def stream_prices(websocket: WebSocket, symbols: Optional[str] = None):
+    """Push price updates for subscribed symbols.
+
+    Subscribe with ``?symbols=A,B`` on connect and/or by sending
+    ``{"action": "subscribe" | "unsubscribe", "symbols": [...]}``.
+    """
+    await websocket.accept()
+    subscriber = price_hub.connect()
+
+    def subscribe(requested: List[str]):
+        added = price_hub.subscribe(subscriber, [s.strip().upper() for s in requested if s.strip()])
+        # Start each new subscription from the latest known price
+        for symbol in added:
+            if symbol in ingestor.latest:
+                subscriber.offer(symbol, json.dumps(ingestor.latest[symbol]))
+
+    async def send_updates():
+        while True:
+            batch = await subscriber.next_batch()
+            if batch:
+                await websocket.send_text(encode_batch(batch))
+
+    if symbols:
+        subscribe(symbols.split(","))
+    writer = asyncio.create_task(send_updates())
+    try:
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+            except ValueError:
+                continue
+            requested = message.get("symbols") or []
+            if message.get("action") == "subscribe":
+                subscribe(requested)
+            elif message.get("action") == "unsubscribe":
+                price_hub.unsubscribe(subscriber, [s.strip().upper() for s in requested])
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.warning(f"Price stream closed: {e}")
+    finally:
+        writer.cancel()
+        price_hub.disconnect(subscriber)
+
+def get_synced_book(symbol: str) -> OrderBook:
+    book = orderbooks.books.get(symbol.upper())
+    if book is None:
+        raise HTTPException(status_code=404, detail=f"No order book maintained for {symbol}")
+    if not book.synced:
+        raise HTTPException(status_code=503, detail=f"Order book for {symbol} is resynchronizing")
+    return book
+
+@app.get("/api/v1/market-data/orderbook/{symbol}", response_model=OrderBookDepth)
+async def get_order_book(symbol: str, depth: int = Query(20, ge=1, le=1000)):
+    """Get the top price levels of the local order book"""
+    return get_synced_book(symbol).depth(depth)
+
+@app.get("/api/v1/market-data/orderbook/{symbol}/vwap", response_model=VwapQuote)
+async def get_order_book_vwap(
+    symbol: str,
+    side: str = Query(..., regex="^(buy|sell)$"),
+    size: float = Query(..., gt=0)
+):
+    """Estimate the average fill price and slippage of a market order of a given size"""
+    return get_synced_book(symbol).vwap(side, size)
+
+@app.get("/api/v1/market-data/stats")
+async def get_stats():
+    """Get cache, upstream and ingestion counters"""
+    return {
+        "cache": response_cache.stats(),
+        "upstream": upstream_calls.stats(),
+        "ingest": ingestor.stats(),
+        "candles": candle_writer.stats(),
+        "stream": price_hub.stats(),
+        "events": publisher.metrics(),
+        "orderbooks": orderbooks.stats(),
+        "scheduler": upstream_scheduler.stats()
+    }
+
 # Background task to fetch prices
 @app.on_event("startup")
 async def startup_event():
     asyncio.create_task(fetch_prices_continuously())
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await http_client.aclose()
+    await redis_client.close()
+    await redis_pool.disconnect()
+    # Drain buffered events before the process exits
+    await asyncio.get_running_loop().run_in_executor(kafka_executor, publisher.close)
+    kafka_executor.shutdown(wait=True)
+
+async def publish_prices(batch: List[dict]):
+    """Push a batch of streamed prices to clients, the cache and the event bus"""
+    for price_data in batch:
+        price_hub.publish(price_data)
+        upstream_scheduler.observe(price_data)
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for price_data in batch:
+            pipe.setex(f"price:{price_data['symbol']}", 5, json.dumps(price_data))
+        await pipe.execute()
+    publish_events('market-events', batch)
+
+async def poll_prices(symbols: List[str]):
+    """Refresh prices the streams have not updated recently through the REST API"""
+    await publish_prices(await request_prices(symbols))
+
+ingestor = PriceIngestor(WATCHLIST, sink=publish_prices)
+
+# Polls whatever the streams leave stale, most valuable symbols first, and runs
+# the periodic cache refreshes within the same rate-limit budget
+upstream_scheduler = UpstreamScheduler(
+    WATCHLIST,
+    poll=poll_prices,
+    budget=weight_budget,
+    demand=price_hub.demand,
+    stale_after=float(os.getenv("PRICE_STALE_AFTER", 2.0))
+)
+upstream_scheduler.every(
+    "overview", 60,
+    lambda: response_cache.refresh("market_overview", fetch_market_overview, *OVERVIEW_TTL),
+    weight=WEIGHT_TICKER_24HR_ALL
+)
+upstream_scheduler.every(
+    "symbols", 3600,
+    lambda: response_cache.refresh("symbols", fetch_symbols, *SYMBOLS_TTL),
+    weight=WEIGHT_EXCHANGE_INFO
+)
+
+# Local order books maintained from the diff-depth streams
+orderbooks = OrderBookManager(
+    [s.strip() for s in os.getenv("ORDERBOOK_SYMBOLS", ",".join(WATCHLIST)).split(",") if s.strip()],
+    http_client,
+    max_levels=int(os.getenv("ORDERBOOK_MAX_LEVELS", 1000)),
+    snapshot_limit=int(os.getenv("ORDERBOOK_SNAPSHOT_LIMIT", 1000)),
+    record_dir=os.getenv("ORDERBOOK_RECORD_DIR")
+)
+
+# OHLCV bars built from every streamed trade; closed 1m bars also go to the
+# backend's CryptoPriceData table when POSTGRES_URL is set, and all closed
+# bars are published as candle-events
+candle_aggregator = CandleAggregator(
+    intervals=os.getenv("CANDLE_INTERVALS", "1s,1m,5m,1h,1d").split(","),
+    watermark_ms=int(os.getenv("CANDLE_WATERMARK_MS", 2000))
+)
+ingestor.add_listener(candle_aggregator.add_tick)
+candle_writer = CandleWriter(
+    candle_aggregator,
+    build_sinks(os.getenv("POSTGRES_URL"), os.getenv("CANDLE_DB_INTERVAL", "1m"), _send_events)
+)
+
 async def fetch_prices_continuously():
-    symbols = ["BTCUSDT", "ETHUSDT", "BNBUSDT", "ADAUSDT", "DOGEUSDT", "XRPUSDT"]
-    async with httpx.AsyncClient() as client:
-        while True:
-            try:
-                for symbol in symbols:
-                    try:
-                        response = await client.get(f"https://api.binance.com/api/v3/ticker/price?symbol={symbol}")
-                        if response.status_code == 200:
-                            data = response.json()
-                            price_data = {
-                                "symbol": symbol,
-                                "price": float(data["price"]),
-                                "timestamp": int(datetime.now().timestamp() * 1000)
-                            }
-                            
-                            # Update Redis cache
-                            redis_client.setex(f"price:{symbol}", 5, json.dumps(price_data))
-                            
-                            # Send to Kafka
-                            producer.send('market-events', price_data)
-                            logger.debug(f"Updated price for {symbol}: {price_data['price']}")
-                    except Exception as e:
-                        logger.error(f"Error fetching {symbol}: {e}")
-                
-                # Fetch market overview every minute
-                if datetime.now().second == 0:
-                    await get_market_overview()
-                    
-            except Exception as e:
-                logger.error(f"Error in price fetching loop: {e}")
-                
-            await asyncio.sleep(1)  # Fetch every second
+    # Prices arrive over the exchange WebSocket streams
+    asyncio.create_task(ingestor.run())
+    asyncio.create_task(candle_writer.run())
+    asyncio.create_task(orderbooks.run())
+
+    # REST polling only fills in where the streams fall behind
+    await upstream_scheduler.run()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,333 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sortedcontainers import SortedList
+
+from ingest import BINANCE_WS_URL, STREAMS_PER_CONNECTION, CombinedStreamClient
+
+logger = logging.getLogger(__name__)
+
+Level = Tuple[float, float]
+
+
+class OrderBookGap(Exception):
+    """A diff update does not continue from the book's last update id"""
+
+
+class _BookSide:
+    """Price levels of one side, sorted so the best level is always last.
+
+    Keys are prices for bids and negated prices for asks, so in both cases the best
+    level sits at the end of a sorted list: reading it is O(1), and inserting,
+    deleting or evicting a level is O(log n). Quantities live in a dict by price.
+    """
+
+    def __init__(self, sign: int, max_levels: int):
+        self.sign = sign
+        self.max_levels = max_levels
+        self.keys = SortedList()
+        self.levels: Dict[float, float] = {}
+
+    def set(self, price: float, quantity: float):
+        key = price * self.sign
+        if quantity == 0:
+            if self.levels.pop(price, None) is not None:
+                self.keys.remove(key)
+            return
+
+        if price not in self.levels:
+            self.keys.add(key)
+            # Bound memory by dropping the level furthest from the touch
+            if len(self.keys) > self.max_levels:
+                worst = self.keys.pop(0)
+                if worst == key:
+                    return  # the new level itself is the furthest; it was never stored
+                del self.levels[worst * self.sign]
+        self.levels[price] = quantity
+
+    def best(self) -> Optional[Level]:
+        if not self.keys:
+            return None
+        price = self.keys[-1] * self.sign
+        return price, self.levels[price]
+
+    def top(self, n: int) -> List[Level]:
+        start = max(len(self.keys) - n, 0)
+        return [(k * self.sign, self.levels[k * self.sign]) for k in self.keys.islice(start, reverse=True)]
+
+    def walk(self) -> Iterable[Level]:
+        for key in reversed(self.keys):
+            yield key * self.sign, self.levels[key * self.sign]
+
+    def clear(self):
+        self.keys.clear()
+        self.levels.clear()
+
+
+class OrderBook:
+    """Local L2 book for one symbol, seeded from a snapshot and kept current by diffs.
+
+    Updates follow Binance's diff-depth rules: diffs whose final update id is not
+    newer than the book are ignored, and the first id of every applied diff must not
+    skip past ``last_update_id + 1``; otherwise :class:`OrderBookGap` is raised and
+    the book has to be re-seeded. Given the same snapshot and diffs, the resulting
+    book is always the same.
+    """
+
+    def __init__(self, symbol: str, max_levels: int = 1000):
+        self.symbol = symbol
+        self.bids = _BookSide(1, max_levels)
+        self.asks = _BookSide(-1, max_levels)
+        self.last_update_id = 0
+        self.synced = False
+
+    def load_snapshot(self, snapshot: Dict[str, Any]):
+        self.bids.clear()
+        self.asks.clear()
+        for price, quantity in snapshot["bids"]:
+            self.bids.set(float(price), float(quantity))
+        for price, quantity in snapshot["asks"]:
+            self.asks.set(float(price), float(quantity))
+        self.last_update_id = snapshot["lastUpdateId"]
+        self.synced = True
+
+    def apply_diff(self, event: Dict[str, Any]):
+        if event["u"] <= self.last_update_id:
+            return
+        if event["U"] > self.last_update_id + 1:
+            self.synced = False
+            raise OrderBookGap(f"{self.symbol}: expected update {self.last_update_id + 1}, got {event['U']}")
+
+        for price, quantity in event["b"]:
+            self.bids.set(float(price), float(quantity))
+        for price, quantity in event["a"]:
+            self.asks.set(float(price), float(quantity))
+        self.last_update_id = event["u"]
+
+    def best_bid(self) -> Optional[Level]:
+        return self.bids.best()
+
+    def best_ask(self) -> Optional[Level]:
+        return self.asks.best()
+
+    def depth(self, n: int) -> Dict[str, Any]:
+        return {
+            "symbol": self.symbol,
+            "last_update_id": self.last_update_id,
+            "bids": self.bids.top(n),
+            "asks": self.asks.top(n),
+        }
+
+    def vwap(self, side: str, size: float) -> Dict[str, Any]:
+        """Average fill price of a market order of ``size`` walking the book"""
+        levels = self.asks.walk() if side == "buy" else self.bids.walk()
+        filled = 0.0
+        notional = 0.0
+        consumed = 0
+        for price, quantity in levels:
+            take = min(quantity, size - filled)
+            filled += take
+            notional += take * price
+            consumed += 1
+            if filled >= size:
+                break
+
+        best = self.best_ask() if side == "buy" else self.best_bid()
+        vwap = notional / filled if filled else None
+        slippage_bps = None
+        if vwap is not None and best is not None:
+            slippage_bps = abs(vwap - best[0]) / best[0] * 10000
+        return {
+            "symbol": self.symbol,
+            "side": side,
+            "size": size,
+            "filled": filled,
+            "vwap": vwap,
+            "levels": consumed,
+            "slippage_bps": slippage_bps,
+        }
+
+    @classmethod
+    def replay(cls, symbol: str, snapshot: Dict[str, Any], diffs: Iterable[Dict[str, Any]], max_levels: int = 1000):
+        book = cls(symbol, max_levels)
+        book.load_snapshot(snapshot)
+        for event in diffs:
+            book.apply_diff(event)
+        return book
+
+
+def replay_recording(path: str, max_levels: int = 1000) -> OrderBook:
+    """Rebuild a book from a JSON-lines recording written by OrderBookManager"""
+    with open(path) as f:
+        records = [json.loads(line) for line in f]
+    snapshots = [i for i, r in enumerate(records) if r["type"] == "snapshot"]
+    if not snapshots:
+        raise ValueError(f"No snapshot in {path}")
+    # Start from the last re-seed; earlier diffs belong to a superseded book
+    start = snapshots[-1]
+    snapshot = records[start]
+    return OrderBook.replay(
+        snapshot["symbol"],
+        snapshot["data"],
+        (r["data"] for r in records[start + 1:]),
+        max_levels,
+    )
+
+
+class OrderBookManager:
+    """Maintains local books for a set of symbols from the diff-depth streams.
+
+    While a book is being (re-)seeded its diffs are buffered, then replayed on top of
+    the REST snapshot. A gap or a reconnect triggers a fresh snapshot.
+    """
+
+    def __init__(
+        self,
+        symbols: List[str],
+        http_client,
+        base_url: str = BINANCE_WS_URL,
+        max_levels: int = 1000,
+        snapshot_limit: int = 1000,
+        max_buffered: int = 1000,
+        record_dir: Optional[str] = None,
+        record_flush_interval: float = 1.0,
+    ):
+        self.symbols = [s.upper() for s in symbols]
+        self.http_client = http_client
+        self.snapshot_limit = snapshot_limit
+        self.max_buffered = max_buffered
+        self.record_dir = record_dir
+        self.record_flush_interval = record_flush_interval
+        if record_dir:
+            os.makedirs(record_dir, exist_ok=True)
+        # symbol -> (truncate the file first, lines to write)
+        self._records: Dict[str, Tuple[bool, List[str]]] = {}
+        self.books = {s: OrderBook(s, max_levels) for s in self.symbols}
+        self.resyncs = 0
+        self._buffers: Dict[str, List[Dict[str, Any]]] = {s: [] for s in self.symbols}
+        self._syncing: set = set()
+
+        self.clients = []
+        for i in range(0, len(self.symbols), STREAMS_PER_CONNECTION):
+            chunk = self.symbols[i:i + STREAMS_PER_CONNECTION]
+            self.clients.append(CombinedStreamClient(
+                name=f"depth-{len(self.clients)}",
+                streams=[f"{s.lower()}@depth@100ms" for s in chunk],
+                on_message=self._handle_message,
+                on_connect=lambda chunk=chunk: self._resync_all(chunk),
+                base_url=base_url,
+            ))
+
+    def _resync_all(self, symbols: List[str]):
+        for symbol in symbols:
+            self._schedule_resync(symbol)
+
+    def _schedule_resync(self, symbol: str):
+        self.books[symbol].synced = False
+        if symbol not in self._syncing:
+            self._syncing.add(symbol)
+            asyncio.ensure_future(self._resync(symbol))
+
+    async def _resync(self, symbol: str):
+        try:
+            while True:
+                try:
+                    response = await self.http_client.get(
+                        "/api/v3/depth", params={"symbol": symbol, "limit": self.snapshot_limit}
+                    )
+                    response.raise_for_status()
+                    snapshot = response.json()
+                    break
+                except Exception as e:
+                    logger.warning(f"Order book snapshot for {symbol} failed: {e}")
+                    await asyncio.sleep(5)
+
+            book = self.books[symbol]
+            book.load_snapshot(snapshot)
+            self.resyncs += 1
+            self._record(symbol, "snapshot", snapshot, truncate=True)
+
+            buffered, self._buffers[symbol] = self._buffers[symbol], []
+            for event in buffered:
+                if not self._apply(book, event):
+                    break
+        finally:
+            self._syncing.discard(symbol)
+
+        if not self.books[symbol].synced:
+            self._schedule_resync(symbol)
+
+    def _handle_message(self, stream: str, data: Dict[str, Any]):
+        if not data or data.get("e") != "depthUpdate":
+            return
+        symbol = data["s"]
+        book = self.books.get(symbol)
+        if book is None:
+            return
+
+        if symbol in self._syncing:
+            buffer = self._buffers[symbol]
+            buffer.append(data)
+            if len(buffer) > self.max_buffered:
+                del buffer[0]
+            return
+        if self._apply(book, data) is False:
+            self._schedule_resync(symbol)
+
+    def _apply(self, book: OrderBook, event: Dict[str, Any]) -> bool:
+        try:
+            book.apply_diff(event)
+        except OrderBookGap as e:
+            logger.warning(str(e))
+            return False
+        except Exception as e:
+            # A malformed diff only costs this book a resync, not the shared connection
+            logger.error(f"Error applying depth update for {book.symbol}: {e}")
+            book.synced = False
+            return False
+        self._record(book.symbol, "diff", event)
+        return True
+
+    def _record(self, symbol: str, record_type: str, data: Dict[str, Any], truncate: bool = False):
+        """Buffer a recording line; files are written off the event loop by _flush_records"""
+        if not self.record_dir:
+            return
+        line = json.dumps({"type": record_type, "symbol": symbol, "data": data}) + "\n"
+        if truncate:
+            # A snapshot restarts the file, so whatever was still pending is superseded
+            self._records[symbol] = (True, [line])
+        else:
+            self._records.setdefault(symbol, (False, []))[1].append(line)
+
+    def _write_records(self, records: Dict[str, Tuple[bool, List[str]]]):
+        for symbol, (truncate, lines) in records.items():
+            with open(os.path.join(self.record_dir, f"{symbol}.jsonl"), "w" if truncate else "a") as f:
+                f.writelines(lines)
+
+    async def _flush_records(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.record_flush_interval)
+            if not self._records:
+                continue
+            records, self._records = self._records, {}
+            try:
+                await loop.run_in_executor(None, self._write_records, records)
+            except Exception as e:
+                logger.error(f"Error writing order book recordings: {e}")
+
+    async def run(self):
+        tasks = [client.run() for client in self.clients]
+        if self.record_dir:
+            tasks.append(self._flush_records())
+        await asyncio.gather(*tasks)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "books": len(self.books),
+            "synced": sum(1 for b in self.books.values() if b.synced),
+            "resyncs": self.resyncs,
+        }
@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import math
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Approximate Binance request weights of the endpoints polled by the service
+WEIGHT_TICKER_PRICE_BATCH = 4
+WEIGHT_TICKER_24HR_ALL = 80
+WEIGHT_EXCHANGE_INFO = 20
+
+
+class WeightBudget:
+    """Tracks the upstream request-weight budget of the current minute.
+
+    The exchange reports the weight used so far in ``X-MBX-USED-WEIGHT-1M`` on every
+    response; between responses, planned requests are charged optimistically. A 429
+    or 418 blocks all scheduled requests until its ``Retry-After`` has passed.
+    """
+
+    def __init__(self, limit_per_minute: int = 1200, reserve: float = 0.2):
+        self.limit_per_minute = limit_per_minute
+        # Headroom left for on-demand cache misses and order book snapshots
+        self.reserve = reserve
+        self.used = 0
+        self.rate_limited = 0
+        self._minute = self._current_minute()
+        self._blocked_until = 0.0
+
+    @staticmethod
+    def _current_minute() -> int:
+        return int(time.time() // 60)
+
+    def _roll(self):
+        minute = self._current_minute()
+        if minute != self._minute:
+            self._minute = minute
+            self.used = 0
+
+    async def observe(self, response):
+        """httpx response hook"""
+        self._roll()
+        used = response.headers.get("x-mbx-used-weight-1m")
+        if used is not None:
+            self.used = int(used)
+        if response.status_code in (418, 429):
+            self.rate_limited += 1
+            retry_after = float(response.headers.get("retry-after", 60))
+            self._blocked_until = time.monotonic() + retry_after
+            logger.warning(f"Upstream rate limit hit, pausing scheduled requests for {retry_after}s")
+
+    def available(self) -> int:
+        self._roll()
+        if time.monotonic() < self._blocked_until:
+            return 0
+        return max(0, int(self.limit_per_minute * (1 - self.reserve)) - self.used)
+
+    def spend(self, weight: int):
+        self._roll()
+        self.used += weight
+
+
+class PeriodicJob:
+    """A job run on a monotonic timer, so wall-clock jumps cannot skip or repeat it"""
+
+    def __init__(self, name: str, interval: float, run: Callable[[], Awaitable[Any]], weight: int):
+        self.name = name
+        self.interval = interval
+        self.run = run
+        self.weight = weight
+        self.next_run = time.monotonic()
+        self.runs = 0
+        self.failures = 0
+
+
+class UpstreamScheduler:
+    """Spends the upstream weight budget where it buys the most freshness.
+
+    Symbols kept current by the WebSocket streams cost nothing. Any symbol whose last
+    update is older than ``stale_after`` is polled through bulk ticker calls, most
+    valuable first: staleness weighted by the number of streaming subscribers and by
+    recent volatility. Periodic jobs run on monotonic timers against the same budget.
+    """
+
+    def __init__(
+        self,
+        symbols: List[str],
+        poll: Callable[[List[str]], Awaitable[Any]],
+        budget: WeightBudget,
+        demand: Callable[[str], int],
+        stale_after: float = 2.0,
+        batch_size: int = 100,
+        tick: float = 0.5,
+        volatility_halflife: int = 20,
+    ):
+        self.symbols = symbols
+        self.poll = poll
+        self.budget = budget
+        self.demand = demand
+        self.stale_after = stale_after
+        self.batch_size = batch_size
+        self.tick = tick
+        self.jobs: List[PeriodicJob] = []
+        self.polled = 0
+        self.skipped_for_budget = 0
+        self._alpha = 1 - 0.5 ** (1 / volatility_halflife)
+        self._updated_at: Dict[str, float] = {}
+        self._last_price: Dict[str, float] = {}
+        self._volatility: Dict[str, float] = {}
+
+    def every(self, name: str, interval: float, run: Callable[[], Awaitable[Any]], weight: int):
+        self.jobs.append(PeriodicJob(name, interval, run, weight))
+
+    def observe(self, price_data: Dict[str, Any]):
+        """Record a fresh price, from the streams or from polling"""
+        symbol = price_data["symbol"]
+        price = price_data["price"]
+        self._updated_at[symbol] = time.monotonic()
+        last = self._last_price.get(symbol)
+        if last and price > 0:
+            change = abs(math.log(price / last))
+            previous = self._volatility.get(symbol, change)
+            self._volatility[symbol] = previous + self._alpha * (change - previous)
+        self._last_price[symbol] = price
+
+    def _priority(self, symbol: str, now: float) -> float:
+        age = now - self._updated_at.get(symbol, 0.0)
+        # Volatility is a per-update log return; scale it so 10bps counts as 1
+        return age * (1 + self.demand(symbol)) * (1 + self._volatility.get(symbol, 0.0) * 1000)
+
+    async def _run_jobs(self):
+        now = time.monotonic()
+        for job in self.jobs:
+            if now < job.next_run or self.budget.available() < job.weight:
+                continue
+            # Next run is planned from now, not from the missed deadline, so a stall
+            # does not cause a burst of catch-up runs
+            job.next_run = now + job.interval
+            self.budget.spend(job.weight)
+            try:
+                await job.run()
+                job.runs += 1
+            except Exception as e:
+                job.failures += 1
+                logger.error(f"Scheduled job {job.name} failed: {e}")
+
+    async def _poll_stale(self):
+        now = time.monotonic()
+        stale = [s for s in self.symbols if now - self._updated_at.get(s, 0.0) >= self.stale_after]
+        if not stale:
+            return
+
+        stale.sort(key=lambda s: self._priority(s, now), reverse=True)
+        affordable = self.budget.available() // WEIGHT_TICKER_PRICE_BATCH
+        batches = min(affordable, math.ceil(len(stale) / self.batch_size))
+        self.skipped_for_budget += max(0, len(stale) - batches * self.batch_size)
+
+        for i in range(batches):
+            batch = stale[i * self.batch_size:(i + 1) * self.batch_size]
+            self.budget.spend(WEIGHT_TICKER_PRICE_BATCH)
+            try:
+                await self.poll(batch)
+                self.polled += len(batch)
+            except Exception as e:
+                logger.error(f"Error polling {len(batch)} prices: {e}")
+
+    async def run(self):
+        while True:
+            started = time.monotonic()
+            try:
+                await self._run_jobs()
+                await self._poll_stale()
+            except Exception as e:
+                logger.error(f"Error in upstream scheduler: {e}")
+            await asyncio.sleep(max(0.0, self.tick - (time.monotonic() - started)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "weight_used": self.budget.used,
+            "weight_available": self.budget.available(),
+            "rate_limited": self.budget.rate_limited,
+            "polled": self.polled,
+            "skipped_for_budget": self.skipped_for_budget,
+            "jobs": {j.name: {"runs": j.runs, "failures": j.failures} for j in self.jobs},
+        }
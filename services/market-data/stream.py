@@ -0,0 +1,107 @@
+import asyncio
+import json
+from typing import Any, Dict, Iterable, List, Set
+
+
+class Subscriber:
+    """A streaming client's pending updates, conflated to the latest per symbol.
+
+    A slow client never queues more than one message per subscribed symbol: a newer
+    price replaces the undelivered one, so memory per connection is bounded by the
+    subscription limit regardless of how far behind the client falls.
+    """
+
+    __slots__ = ("symbols", "pending", "wakeup")
+
+    def __init__(self):
+        self.symbols: Set[str] = set()
+        self.pending: Dict[str, str] = {}
+        self.wakeup = asyncio.Event()
+
+    def offer(self, symbol: str, payload: str) -> bool:
+        """Queue an update, returning True if it replaced an undelivered one"""
+        conflated = symbol in self.pending
+        self.pending[symbol] = payload
+        self.wakeup.set()
+        return conflated
+
+    async def next_batch(self) -> List[str]:
+        await self.wakeup.wait()
+        self.wakeup.clear()
+        batch, self.pending = self.pending, {}
+        return list(batch.values())
+
+
+class PriceHub:
+    """Fans the internal price stream out to streaming subscribers.
+
+    Each update is serialized once and handed to every subscriber of its symbol;
+    delivery to the socket happens in the subscriber's own writer task, so a slow
+    client only ever delays itself.
+    """
+
+    def __init__(self, max_symbols_per_client: int = 200):
+        self.max_symbols_per_client = max_symbols_per_client
+        self._subscribers: Dict[str, Set[Subscriber]] = {}
+        self.clients = 0
+        self.published = 0
+        self.fanned_out = 0
+        self.conflated = 0
+
+    def connect(self) -> Subscriber:
+        self.clients += 1
+        return Subscriber()
+
+    def disconnect(self, subscriber: Subscriber):
+        self.unsubscribe(subscriber, list(subscriber.symbols))
+        self.clients -= 1
+
+    def subscribe(self, subscriber: Subscriber, symbols: Iterable[str]) -> List[str]:
+        added = []
+        for symbol in symbols:
+            if len(subscriber.symbols) >= self.max_symbols_per_client:
+                break
+            if symbol not in subscriber.symbols:
+                subscriber.symbols.add(symbol)
+                self._subscribers.setdefault(symbol, set()).add(subscriber)
+                added.append(symbol)
+        return added
+
+    def unsubscribe(self, subscriber: Subscriber, symbols: Iterable[str]):
+        for symbol in symbols:
+            subscriber.symbols.discard(symbol)
+            subscriber.pending.pop(symbol, None)
+            subscribers = self._subscribers.get(symbol)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[symbol]
+
+    def publish(self, price_data: Dict[str, Any]):
+        subscribers = self._subscribers.get(price_data["symbol"])
+        if not subscribers:
+            return
+        payload = json.dumps(price_data)
+        for subscriber in subscribers:
+            if subscriber.offer(price_data["symbol"], payload):
+                self.conflated += 1
+        self.published += 1
+        self.fanned_out += len(subscribers)
+
+    def demand(self, symbol: str) -> int:
+        """Number of clients currently subscribed to a symbol"""
+        return len(self._subscribers.get(symbol, ()))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "clients": self.clients,
+            "symbols": len(self._subscribers),
+            "published": self.published,
+            "fanned_out": self.fanned_out,
+            "conflated": self.conflated,
+        }
+
+
+def encode_batch(batch: List[str]) -> str:
+    """Wrap pre-serialized price payloads into one stream message"""
+    return '{"type":"prices","data":[' + ",".join(batch) + "]}"
@@ -0,0 +1,116 @@
+"""Load generator for the price stream fan-out.
+
+Against a running service, opens many WebSocket clients and reports delivered
+updates per second and end-to-end latency (trade time to client receipt):
+
+    python stream_loadgen.py --url ws://localhost:8000/api/v1/market-data/stream --clients 2000
+
+With ``--local`` it drives a PriceHub in-process with synthetic ticks instead,
+which measures the fan-out itself without the network or the exchange:
+
+    python stream_loadgen.py --local --clients 5000 --symbols 200 --rate 2000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from stream import PriceHub, encode_batch
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+async def run_remote(args):
+    import websockets
+
+    received = [0]
+    latencies = []
+    symbols = ",".join(args.symbol_list)
+
+    async def client():
+        async with websockets.connect(f"{args.url}?symbols={symbols}", max_size=2 ** 22) as ws:
+            async for raw in ws:
+                now = time.time() * 1000
+                for update in json.loads(raw)["data"]:
+                    received[0] += 1
+                    # Sample latency so the generator does not become the bottleneck
+                    if random.random() < 0.01:
+                        latencies.append(now - update["timestamp"])
+
+    tasks = [asyncio.create_task(client()) for _ in range(args.clients)]
+    await asyncio.sleep(args.duration)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    print(f"clients={args.clients} updates/s={received[0] / args.duration:,.0f} "
+          f"latency_ms p50={percentile(latencies, 50):.1f} p99={percentile(latencies, 99):.1f}")
+
+
+async def run_local(args):
+    hub = PriceHub(max_symbols_per_client=args.symbols)
+    symbols = [f"SYM{i}USDT" for i in range(args.symbols)]
+    delivered = [0]
+    latencies = []
+
+    async def client():
+        subscriber = hub.connect()
+        hub.subscribe(subscriber, random.sample(symbols, min(args.per_client, len(symbols))))
+        while True:
+            batch = await subscriber.next_batch()
+            encode_batch(batch)
+            delivered[0] += len(batch)
+            # Stand in for a slow socket on a fraction of the clients
+            if args.slow and random.random() < args.slow:
+                await asyncio.sleep(0.05)
+            latencies.append(time.perf_counter() - sent_at[0])
+
+    sent_at = [time.perf_counter()]
+    tasks = [asyncio.create_task(client()) for _ in range(args.clients)]
+    await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    ticks = 0
+    while time.perf_counter() - started < args.duration:
+        sent_at[0] = time.perf_counter()
+        for _ in range(max(1, args.rate // 100)):
+            hub.publish({"symbol": random.choice(symbols), "price": random.random(), "timestamp": 0})
+            ticks += 1
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    stats = hub.stats()
+    print(f"clients={args.clients} ticks/s={ticks / elapsed:,.0f} "
+          f"fanned_out/s={stats['fanned_out'] / elapsed:,.0f} delivered/s={delivered[0] / elapsed:,.0f} "
+          f"conflated={stats['conflated']:,} "
+          f"wake_latency_ms p50={percentile(latencies, 50) * 1000:.2f} p99={percentile(latencies, 99) * 1000:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="ws://localhost:8000/api/v1/market-data/stream")
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--symbol-list", type=lambda v: v.split(","), default=["BTCUSDT", "ETHUSDT", "BNBUSDT"])
+    parser.add_argument("--local", action="store_true", help="benchmark the in-process hub")
+    parser.add_argument("--symbols", type=int, default=200, help="local: symbols in the tick stream")
+    parser.add_argument("--per-client", type=int, default=20, help="local: subscriptions per client")
+    parser.add_argument("--rate", type=int, default=2000, help="local: ticks per second")
+    parser.add_argument("--slow", type=float, default=0.0, help="local: fraction of slow client reads")
+    args = parser.parse_args()
+
+    asyncio.run(run_local(args) if args.local else run_remote(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""PriceIngestor against a local fake of the Binance combined-stream endpoint.
+
+Run from services/market-data with ``python -m pytest tests``.
+"""
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+import websockets
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ingest  # noqa: E402
+
+
+def agg_trade(symbol, trade_id, price=100.0):
+    return json.dumps({
+        "stream": f"{symbol.lower()}@aggTrade",
+        "data": {"e": "aggTrade", "s": symbol, "a": trade_id, "p": str(price), "q": "1", "T": 1000 + trade_id},
+    })
+
+
+class FakeBinance:
+    """Serves one scripted list of messages per connection, then closes it"""
+
+    def __init__(self, sessions):
+        self.sessions = list(sessions)
+        self.connections = 0
+        self.paths = []
+
+    async def handler(self, ws, *args):
+        self.connections += 1
+        self.paths.append(ws.request.path if hasattr(ws, "request") else ws.path)
+        messages = self.sessions.pop(0) if self.sessions else []
+        for message in messages:
+            await ws.send(message)
+        await ws.close()
+
+    async def __aenter__(self):
+        self.server = await websockets.serve(self.handler, "127.0.0.1", 0)
+        port = self.server.sockets[0].getsockname()[1]
+        self.url = f"ws://127.0.0.1:{port}"
+        return self
+
+    async def __aexit__(self, *exc):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+async def run_until(condition, *tasks, timeout=5.0):
+    running = [asyncio.ensure_future(task) for task in tasks]
+    try:
+        deadline = asyncio.get_running_loop().time() + timeout
+        while not condition():
+            assert asyncio.get_running_loop().time() < deadline, "condition not reached"
+            await asyncio.sleep(0.01)
+    finally:
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+
+
+@pytest.fixture
+def fast_backoff(monkeypatch):
+    """Records each backoff ceiling and sleeps only briefly"""
+    ceilings = []
+
+    def uniform(low, high):
+        ceilings.append(high)
+        return 0.01
+
+    monkeypatch.setattr(ingest.random, "uniform", uniform)
+    return ceilings
+
+
+def test_gap_detection_and_reconnect(fast_backoff):
+    async def scenario():
+        batches = []
+
+        async def sink(batch):
+            batches.append(batch)
+
+        # Trade 3 is missing in the first session; the second starts over after a
+        # reconnect, which must not count as a gap
+        sessions = [
+            [agg_trade("BTCUSDT", 1), agg_trade("BTCUSDT", 2), agg_trade("BTCUSDT", 4), agg_trade("BTCUSDT", 4)],
+            [agg_trade("BTCUSDT", 50, price=101.5)],
+        ]
+        async with FakeBinance(sessions) as fake:
+            ingestor = ingest.PriceIngestor(["btcusdt"], sink, base_url=fake.url, flush_interval=0.01)
+            await run_until(
+                lambda: ingestor.latest.get("BTCUSDT", {}).get("price") == 101.5 and batches,
+                ingestor.run(),
+            )
+
+        assert fake.paths[0] == "/stream?streams=btcusdt@aggTrade"
+        assert ingestor.gaps == {"BTCUSDT": 1}
+        assert ingestor.clients[0].connects >= 2
+        assert ingestor.stats()["messages"] == 5
+        assert ingestor.latest["BTCUSDT"] == {"symbol": "BTCUSDT", "price": 101.5, "timestamp": 1050}
+
+    asyncio.run(scenario())
+
+
+def test_backoff_grows_until_a_message_arrives(fast_backoff):
+    async def scenario():
+        # Four connections accepted and closed without data, then one that delivers
+        sessions = [[], [], [], [], [agg_trade("ETHUSDT", 1)], []]
+        async with FakeBinance(sessions) as fake:
+            client = ingest.CombinedStreamClient(
+                "test", ["ethusdt@aggTrade"], on_message=lambda stream, data: None,
+                base_url=fake.url, min_backoff=1.0, max_backoff=4.0,
+            )
+            await run_until(lambda: len(fast_backoff) >= 6, client.run())
+
+        # Doubling up to max_backoff, then back to min_backoff once the stream delivered
+        assert fast_backoff[:6] == [1.0, 2.0, 4.0, 4.0, 1.0, 2.0]
+
+    asyncio.run(scenario())
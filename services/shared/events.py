@@ -0,0 +1,191 @@
+import json
+import logging
+import os
+import struct
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import msgpack
+from kafka import KafkaProducer
+
+logger = logging.getLogger(__name__)
+
+# Envelope header: version, codec, publish time (ms since epoch)
+ENVELOPE_VERSION = 1
+HEADER = struct.Struct(">BBQ")
+CODECS = {"json": 0, "msgpack": 1}
+_CODEC_NAMES = {v: k for k, v in CODECS.items()}
+
+
+def encode_event(value: Any, codec: str = "msgpack") -> bytes:
+    """Serialize an event behind a versioned binary envelope"""
+    if codec == "msgpack":
+        payload = msgpack.packb(value, use_bin_type=True)
+    else:
+        payload = json.dumps(value, separators=(",", ":")).encode("utf-8")
+    return HEADER.pack(ENVELOPE_VERSION, CODECS[codec], int(time.time() * 1000)) + payload
+
+
+def decode_event(raw: bytes) -> Tuple[Any, Dict[str, Any]]:
+    """Deserialize an event, returning ``(value, envelope metadata)``.
+
+    Plain JSON messages from producers that predate the envelope are accepted too.
+    """
+    if raw[:1] in (b"{", b"["):
+        return json.loads(raw.decode("utf-8")), {"version": 0, "codec": "json"}
+
+    version, codec, published_at = HEADER.unpack_from(raw)
+    if version != ENVELOPE_VERSION:
+        raise ValueError(f"Unsupported event envelope version {version}")
+    payload = raw[HEADER.size:]
+    if _CODEC_NAMES.get(codec) == "msgpack":
+        value = msgpack.unpackb(payload, raw=False)
+    else:
+        value = json.loads(payload.decode("utf-8"))
+    return value, {"version": version, "codec": _CODEC_NAMES.get(codec), "published_at": published_at}
+
+
+class KafkaTransport:
+    """Batched, compressed delivery through kafka-python"""
+
+    def __init__(
+        self,
+        bootstrap_servers: str,
+        linger_ms: int = 20,
+        batch_size: int = 64 * 1024,
+        compression_type: Optional[str] = "gzip",
+        acks: Any = 1,
+    ):
+        self.producer = KafkaProducer(
+            bootstrap_servers=bootstrap_servers,
+            linger_ms=linger_ms,
+            batch_size=batch_size,
+            compression_type=compression_type,
+            acks=acks,
+        )
+
+    def send(self, topic: str, value: bytes, key: Optional[bytes], on_delivery: Callable[[Optional[Exception]], None]):
+        future = self.producer.send(topic, value=value, key=key)
+        future.add_callback(lambda _: on_delivery(None))
+        future.add_errback(on_delivery)
+
+    def flush(self, timeout: Optional[float] = None):
+        self.producer.flush(timeout)
+
+    def close(self, timeout: Optional[float] = None):
+        self.producer.close(timeout)
+
+
+class InMemoryTransport:
+    """Broker stand-in for tests: keeps messages per topic and partition"""
+
+    def __init__(self, partitions: int = 3):
+        self.partitions = partitions
+        self.topics: Dict[str, List[List[Tuple[Optional[bytes], bytes]]]] = {}
+
+    def partition_for(self, key: Optional[bytes]) -> int:
+        # Stable hash so the same key always maps to the same partition
+        return sum(key) % self.partitions if key else 0
+
+    def send(self, topic: str, value: bytes, key: Optional[bytes], on_delivery: Callable[[Optional[Exception]], None]):
+        partitions = self.topics.setdefault(topic, [[] for _ in range(self.partitions)])
+        partitions[self.partition_for(key)].append((key, value))
+        on_delivery(None)
+
+    def messages(self, topic: str) -> List[Any]:
+        """Decoded values of a topic, partition by partition"""
+        return [
+            decode_event(value)[0]
+            for partition in self.topics.get(topic, [])
+            for _, value in partition
+        ]
+
+    def flush(self, timeout: Optional[float] = None):
+        pass
+
+    def close(self, timeout: Optional[float] = None):
+        pass
+
+
+class EventPublisher:
+    """Encodes events and publishes them keyed for partition locality.
+
+    Delivery latency (publish call to broker acknowledgement) is tracked per topic
+    over a sliding window of recent messages.
+    """
+
+    def __init__(self, transport, codec: str = "msgpack", latency_window: int = 1024):
+        if codec not in CODECS:
+            raise ValueError(f"Unknown event codec {codec}")
+        self.transport = transport
+        self.codec = codec
+        self.latency_window = latency_window
+        # Delivery callbacks run on the producer's I/O thread
+        self._lock = threading.Lock()
+        self._topics: Dict[str, Dict[str, Any]] = {}
+
+    def publish(self, topic: str, value: Any, key: Optional[str] = None):
+        payload = encode_event(value, self.codec)
+        sent_at = time.perf_counter()
+        with self._lock:
+            metrics = self._topic_metrics(topic)
+            metrics["sent"] += 1
+            metrics["bytes"] += len(payload)
+
+        def on_delivery(error: Optional[Exception]):
+            latency_ms = (time.perf_counter() - sent_at) * 1000
+            with self._lock:
+                if error is None:
+                    metrics["delivered"] += 1
+                    metrics["latencies"].append(latency_ms)
+                else:
+                    metrics["errors"] += 1
+            if error is not None:
+                logger.error(f"Failed to deliver event to {topic}: {error}")
+
+        self.transport.send(topic, payload, key.encode("utf-8") if key else None, on_delivery)
+
+    def flush(self, timeout: Optional[float] = None):
+        self.transport.flush(timeout)
+
+    def close(self, timeout: Optional[float] = None):
+        self.transport.close(timeout)
+
+    def _topic_metrics(self, topic: str) -> Dict[str, Any]:
+        metrics = self._topics.get(topic)
+        if metrics is None:
+            metrics = self._topics[topic] = {
+                "sent": 0, "delivered": 0, "errors": 0, "bytes": 0,
+                "latencies": deque(maxlen=self.latency_window),
+            }
+        return metrics
+
+    def metrics(self) -> Dict[str, Any]:
+        result = {}
+        with self._lock:
+            for topic, metrics in self._topics.items():
+                latencies = sorted(metrics["latencies"])
+                result[topic] = {
+                    "sent": metrics["sent"],
+                    "delivered": metrics["delivered"],
+                    "errors": metrics["errors"],
+                    "bytes": metrics["bytes"],
+                    "delivery_ms_p50": latencies[len(latencies) // 2] if latencies else None,
+                    "delivery_ms_p99": latencies[int(len(latencies) * 0.99)] if latencies else None,
+                    "delivery_ms_max": latencies[-1] if latencies else None,
+                }
+        return result
+
+
+def publisher_from_env() -> EventPublisher:
+    """Build a Kafka-backed publisher configured from the environment"""
+    compression = os.getenv("KAFKA_COMPRESSION", "gzip")
+    transport = KafkaTransport(
+        bootstrap_servers=os.getenv("KAFKA_SERVERS", "localhost:9092"),
+        linger_ms=int(os.getenv("KAFKA_LINGER_MS", 20)),
+        batch_size=int(os.getenv("KAFKA_BATCH_SIZE", 64 * 1024)),
+        compression_type=None if compression == "none" else compression,
+    )
+    return EventPublisher(transport, codec=os.getenv("EVENT_CODEC", "msgpack"))